@@ -11,13 +11,52 @@ import os
 import sys
 import time
 import logging
+import json
+import re
+import hashlib
+import argparse
+import zipfile
 import pandas as pd
 import numpy as np
-from openpyxl import load_workbook
-from openpyxl.styles import Alignment
+from openpyxl import Workbook, load_workbook
+from openpyxl.styles import Alignment, Font, PatternFill
+from openpyxl.styles.cell_style import StyleArray
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.formatting.rule import CellIsRule, DataBarRule, FormulaRule
 from datetime import datetime
 from pathlib import Path
 import traceback
+from concurrent.futures import ProcessPoolExecutor
+from metrics_kernels import (
+    growth, growth_percent, tempo, conditions_met, effectiveness_flag, kod_vyvoda, kod_vyvoda_grid,
+    fused_segment_stats, FUSED_KERNEL_JIT
+)
+
+# Пиковая память процесса (модуль resource есть только в Unix)
+try:
+    import resource
+except ImportError:
+    resource = None
+
+# Доступная память для планировщика выполнения (без psutil - /proc/meminfo или sysconf)
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+# Строки на Arrow (string[pyarrow]) - только при установленном pyarrow
+try:
+    import pyarrow  # noqa: F401
+    ARROW_STRING_DTYPE = "string[pyarrow]"
+except ImportError:
+    ARROW_STRING_DTYPE = None
+
+# Быстрое чтение .xlsx (Rust-движок calamine, pandas >= 2.2) - только при установленном python-calamine
+try:
+    import python_calamine  # noqa: F401
+    EXCEL_READ_ENGINE = "calamine" if tuple(int(part) for part in pd.__version__.split('.')[:2]) >= (2, 2) else None
+except ImportError:
+    EXCEL_READ_ENGINE = None
 
 # =============================================================================
 # КОНСТАНТЫ И НАСТРОЙКИ ПРОГРАММЫ
@@ -44,6 +83,261 @@ OUTPUT_FILES = [
     # {"name": "processed_data", "extension": ".csv", "suffix_format": "_YYYYMMDD-HHMMSS"}
 ]
 
+# Настройки проверки входных данных (выполняется после загрузки, до обработки)
+# - 'fail_threshold': доля строк с нарушениями, при превышении которой обработка останавливается
+#                     (None - только отчет, без остановки)
+# - 'save_report': сохранять отчет в OUTPUT (CSV с разделителем ";")
+# - 'examples': количество примеров ТН для каждого вида нарушений
+VALIDATION_SETTINGS = {
+    "enabled": True,
+    "fail_threshold": None,
+    "save_report": True,
+    "report_name": "validation_report",
+    "suffix_format": "_YYYYMMDD-HHMMSS",
+    "examples": 5
+}
+
+# Настройки сводных листов результата
+# - сводка по ТБ и по ГОСБ: численность, доля эффективных, сумма и медиана ОД, распределение КОД вывода
+# - лидеры: top_n КМ по темпу в каждом ТБ
+SUMMARY_SHEETS = {
+    "enabled": True,
+    "tb_sheet_name": "Сводка ТБ",
+    "gosb_sheet_name": "Сводка ГОСБ",
+    "top_sheet_name": "Лидеры по темпу",
+    "top_n": 10
+}
+
+# Настройки разбиения Excel результата на части
+# Лист Excel вмещает не более 1 048 575 строк данных, а один большой лист долго пишется
+# - 'enabled': True / False / "auto" (разбивать, только если строк больше 'max_rows_per_sheet')
+# - 'split_by': 'tb' - по ТБ (большие ТБ дополнительно делятся по строкам), 'rows' - только по строкам
+# - 'target': 'workbooks' - отдельная книга на часть (пишутся параллельно),
+#             'sheets' - отдельный лист на часть в одной книге + лист-оглавление
+# - 'workers': число процессов (None - по числу ядер)
+EXCEL_SHARDING = {
+    "enabled": "auto",
+    "split_by": "tb",
+    "target": "workbooks",
+    "max_rows_per_sheet": 1048575,
+    "workers": None,
+    "index_sheet_name": "Оглавление"
+}
+
+# Настройки рассылочных книг по подразделениям (пишутся вместе с основным результатом)
+# Результат один раз разбивается на части по ГОСБ (или ТБ), и книги всех подразделений пишутся
+# параллельно в пуле процессов с общим планом оформления колонок (ширина, формат, выравнивание
+# вычисляются один раз). Книги оформлены как основная: автофильтр, закрепленный заголовок, цвета
+# - 'split_by': 'gosb' - книга на ГОСБ, 'tb' - книга на ТБ, 'tb_gosb' - папка на ТБ с книгами его ГОСБ
+# - 'folder': папка внутри OUTPUT (к имени добавляется временная метка)
+# - 'workers': число процессов (None - по плану выполнения или по числу ядер)
+# Рядом с книгами пишется манифест: файл, ТБ, ГОСБ, строк, размер файла
+DISTRIBUTION_SETTINGS = {
+    "enabled": False,
+    "split_by": "gosb",
+    "folder": "DISTRIBUTION",
+    "suffix_format": "_YYYYMMDD-HHMMSS",
+    "workers": None,
+    "manifest_name": "manifest.json"
+}
+
+# Типы текстовых колонок входных данных и результата (от загрузки до вывода)
+# - 'categorical_columns': колонки с малым числом значений -> category (коды + словарь)
+# - 'string_columns': колонки с большим числом значений -> строки Arrow (string[pyarrow]),
+#                     если установлен pyarrow; иначе колонки остаются как есть
+# Экономия памяти текстовых колонок пишется в сводку выполнения
+# При включенном планировщике компактные типы используются с PLANNER_SETTINGS['compact_min_rows'] строк
+# на входе; на меньших данных (в том числе на данных генератора по умолчанию) преобразования и строки
+# экономии в сводке нет, причина пишется в лог (включить: --plan compact_text=true)
+TEXT_COLUMN_TYPES = {
+    "enabled": True,
+    "categorical_columns": ['ТБ', 'ГОСБ', 'Эффективный КМ', 'вывод'],
+    "string_columns": ['ТН 10', 'КМ', 'ФИО']
+}
+
+# Настройки панельного режима (PROGRAM_MODE = "panel")
+# Обрабатывается история выгрузок за N дат: все файлы INPUT, подходящие под 'input_pattern',
+# читаются в одну длинную таблицу по (ТН, дата). Темп, ранги, процентили и КОД вывода
+# считаются для всех дат за один сгруппированный проход (дата - корневой уровень иерархии)
+# Каждая выгрузка имеет формат файла 1: текущий ОД - '2025, тыс. руб.',
+# прошлый ОД - '2024, тыс. руб. на конец месяца', эффективность - 'Эффективный КМ'
+# - 'date_regex' / 'date_format': как извлечь дату из имени файла
+# - 'top_share': доля лучших по темпу в стране для признака "серия топ" (0.25 - топ-25%)
+# - 'rolling_window': число последних выгрузок КМ для скользящего темпа
+# - 'output_extension': формат истории ('.csv', '.parquet' или '.xlsx' для небольших историй)
+PANEL_SETTINGS = {
+    "input_pattern": "snapshot_*.csv",
+    "date_regex": r"(\d{8})",
+    "date_format": "%Y%m%d",
+    "date_column": "ДАТА",
+    "top_share": 0.25,
+    "top_streak_column": "серия топ-25%",
+    "rolling_window": 3,
+    "rolling_tempo_column": "темп скользящий",
+    "output_name": "panel_history",
+    "output_extension": ".csv",
+    "suffix_format": "_YYYYMMDD-HHMMSS"
+}
+
+# Настройки бинарного снимка результата (memory-mapped)
+# Снимок - это папка с manifest.json и отдельным .bin файлом на каждую колонку:
+# - числовые колонки пишутся как "сырые" массивы фиксированной ширины
+# - колонки из 'dictionary_columns' пишутся как целочисленные коды + словарь в manifest.json
+# - остальные текстовые колонки (ТН 10, ФИО) пишутся как байтовые строки фиксированной ширины
+# Читатель ResultSnapshotReader отображает файлы через numpy.memmap без копирования,
+# поэтому несколько процессов на одном узле делят общий page cache
+SNAPSHOT_SETTINGS = {
+    "enabled": False,                                   # Создавать снимок вместе с Excel
+    "name": "processed_snapshot",                       # Имя папки снимка
+    "suffix_format": "_YYYYMMDD-HHMMSS",                # Суффикс с временной меткой
+    "dictionary_columns": ['ТБ', 'ГОСБ', 'вывод'],      # Колонки со словарным кодированием
+    "manifest_name": "manifest.json"                    # Имя файла описания снимка
+}
+
+# Настройки контрольных точек этапов обработки (папка WORK/CHECKPOINTS)
+# Результат этапа 'load' (загруженные файлы) и этапа 'process' (результат расчета) сохраняется
+# в двоичном виде с ключом = хэш входных файлов (имя, размер, время изменения) и настроек расчета.
+# Повторный запуск продолжает с последнего успешно завершенного этапа (например, после ошибки
+# в save_outputs пересчет не нужен). Настройки, входящие в ключ, перечислены в CHECKPOINT_KEY_SETTINGS
+# - 'format': 'feather' / 'parquet' (нужен pyarrow) или 'pickle'; 'auto' - feather при наличии pyarrow
+#             (таблицы, которые feather/parquet записать не может, пишутся в pickle)
+# - 'from_stage': запуск с этапа ('load', 'process', 'save'), предыдущие этапы берутся из контрольных
+#                 точек; None - автоматически. То же задается аргументом командной строки --from-stage
+# - 'keep': сколько последних контрольных точек каждого этапа хранить
+CHECKPOINT_SETTINGS = {
+    "enabled": False,
+    "folder": "CHECKPOINTS",
+    "format": "auto",
+    "from_stage": None,
+    "keep": 3,
+    "manifest_name": "manifest.json"
+}
+
+# Этапы обработки в порядке выполнения
+PIPELINE_STAGES = ['load', 'process', 'save']
+
+# Настройки, от которых зависит результат этапа (имена глобальных настроек этого файла)
+# Ключ контрольной точки - хэш значений всех перечисленных настроек; ключ 'process' включает ключ 'load'.
+# Новая настройка, влияющая на загрузку или расчет, должна быть добавлена сюда, иначе после ее
+# изменения будет взята устаревшая контрольная точка. Форматы Excel (COLUMN_FORMAT_GROUPS,
+# CONDITIONAL_FORMAT_RULES) в ключ не входят
+CHECKPOINT_KEY_SETTINGS = {
+    'load': ['CSV_SETTINGS', 'TEXT_COLUMN_TYPES'],
+    'process': [
+        'BANK_STRUCTURE', 'PERCENTILES', 'HIERARCHY_LEVELS', 'RANK_POPULATIONS', 'KOD_VYVODA_THRESHOLDS',
+        'KOD_VYVOD_TEXTS', 'RESULT_COLUMNS_LAYOUT', 'COLUMN_SPECIAL_FORMATS', 'TN_KEY_COLUMN', 'HIERARCHY_STATS_KERNEL'
+    ]
+}
+
+# Настройки режима сценариев порогов КОД вывода (PROGRAM_MODE = "scenarios")
+# Данные загружаются и считаются один раз, затем все наборы порогов оцениваются за один
+# векторный проход по готовым местам по темпу и размерам групп (metrics_kernels.kod_vyvoda_grid)
+# - 'grid': ключ порога -> список значений; сценарии - все сочетания значений,
+#           незаданные ключи берутся из KOD_VYVODA_THRESHOLDS
+# - 'scenarios': дополнительные сценарии списком наборов порогов (например, {"tb": 0.3})
+# - 'per_tn_columns': True - лист с КОД вывода каждого КМ по каждому сценарию (колонка на сценарий)
+# Первым всегда идет сценарий с текущими порогами
+SCENARIO_SETTINGS = {
+    "grid": {
+        "tb": [0.15, 0.25, 0.3],
+        "gosb": [0.15, 0.25, 0.3]
+    },
+    "scenarios": [],
+    "per_tn_columns": False,
+    "output_name": "kod_scenarios",
+    "suffix_format": "_YYYYMMDD-HHMMSS"
+}
+
+# Настройки сравнения двух результатов по ТН 10 (PROGRAM_MODE = "diff")
+# Результаты читаются самым быстрым доступным способом: снимок (memory-mapped) -> .parquet -> .csv -> .xlsx
+# и сравниваются по колонкам векторно: добавленные и удаленные КМ, переходы КОД вывода по ТБ
+# (матрица было -> стало), изменения значений сверх допуска
+# - 'previous' / 'current': файл или папка снимка (путь от папки OUTPUT или абсолютный);
+#                           None - два последних результата в OUTPUT одного формата
+# - 'tolerance': допуск для числовых колонок (|стало - было| <= допуска - без изменений)
+# - 'column_tolerances': допуски отдельных колонок (например, {"ОД ТЕКУЩИЙ": 0.5})
+# - 'detail_columns': колонки, изменения которых выводятся построчно (лист "Изменения");
+#                     места и ранги меняются почти у всех КМ, по ним - только счетчики (лист "По колонкам")
+# - 'max_detail_rows': ограничение строк листа "Изменения" (запись Excel - самая долгая часть сравнения)
+DIFF_SETTINGS = {
+    "previous": None,
+    "current": None,
+    "tolerance": 0.005,
+    "column_tolerances": {},
+    "detail_columns": ['ТБ', 'ГОСБ', 'КОД вывода'],
+    "max_detail_rows": 200000,
+    "output_name": "processed_diff",
+    "suffix_format": "_YYYYMMDD-HHMMSS"
+}
+
+# Настройки пакетной обработки нескольких пар входных файлов (PROGRAM_MODE = "batch")
+# Пары ищутся в папке INPUT: '{first_prefix}<ключ><расширение>' + '{second_prefix}<ключ><расширение>'
+# с одинаковым ключом (например data1_20250731.xlsx + data2_20250731.xlsx) и обрабатываются
+# по возрастанию ключа. Ключ добавляется к именам выходных файлов пары
+# - 'pipelined': конвейер - следующая пара загружается, а результат предыдущей пишется
+#                в отдельных процессах одновременно с расчетом текущей пары;
+#                False - пары обрабатываются по очереди в одном процессе
+# - 'queue_size': сколько пар может ждать между этапами конвейера (ограничивает память)
+BATCH_SETTINGS = {
+    "first_prefix": "data1",
+    "second_prefix": "data2",
+    "extensions": ['.xlsx', '.csv', '.parquet'],
+    "pipelined": True,
+    "queue_size": 1
+}
+
+# Настройки планировщика выполнения (шаг в начале DataProcessor.run)
+# Планировщик оценивает число строк входных файлов, доступную память и число ядер и выбирает план:
+# - 'strategy': 'serial' (без пула процессов) или 'parallel_tb' (Excel книги по ТБ пишутся параллельно)
+# - 'excel_parts': писать Excel частями по ТБ (EXCEL_SHARDING) вместо одной книги
+#                  (при EXCEL_SHARDING['enabled'] = True / False задается этой настройкой)
+# - 'load': 'memory' (файл читается целиком) или 'chunked' (частями по 'chunk_rows' строк,
+#           текстовые колонки каждой части сразу переводятся в компактные типы)
+# - 'workers': число процессов записи частей Excel (не больше EXCEL_SHARDING['workers'], если задано)
+# - 'compact_text': компактные типы текстовых колонок (TEXT_COLUMN_TYPES), на малых данных не нужны
+# Если оценка пиковой памяти больше доли 'memory_budget_share' доступной памяти, план по шагам
+# облегчается: компактные типы -> чтение частями -> Excel частями -> меньше процессов
+# Оценка памяти - по байтам на строку из 'row_bytes' (замеры на данных генератора)
+# План и оценка пишутся в лог. Пункт плана задается явно в 'override' (например {"workers": 2})
+# или аргументом командной строки --plan ключ=значение; явные пункты планировщик не меняет
+PLANNER_SETTINGS = {
+    "enabled": True,
+    "parallel_min_rows": 500000,        # Строк результата, с которых выгоден пул процессов
+    "compact_min_rows": 100000,         # Строк на входе, с которых нужны компактные типы
+    "chunk_rows": 250000,               # Строк в части при чтении 'chunked'
+    "memory_budget_share": 0.6,         # Доля доступной памяти для обработки
+    "row_bytes": {
+        "input": 600,                   # Строка входного файла (текст - объекты Python)
+        "input_compact": 260,           # Строка входного файла с компактными типами
+        "result": 740,                  # Строка результата
+        "result_compact": 370,          # Строка результата с компактными типами
+        "processing": 760,              # Временные массивы расчета на строку результата
+        "excel": 12000                  # Строка книги openpyxl при записи Excel
+    },
+    "override": {}
+}
+
+# Пункты плана выполнения и их типы (для --plan ключ=значение)
+PLAN_KEYS = {
+    "strategy": ('serial', 'parallel_tb'),
+    "excel_parts": bool,
+    "load": ('memory', 'chunked'),
+    "workers": int,
+    "compact_text": bool
+}
+
+# Настройки метрик выполнения в текстовом формате Prometheus (для node-exporter textfile collector)
+# После каждого запуска файл '{prefix}_{режим}{extension}' перезаписывается целиком (через временный
+# файл и переименование, чтобы коллектор не прочитал его наполовину). Метрики помечены метками
+# mode (process / panel / create-test) и input (пара входных файлов или профиль генерации)
+# - 'folder': папка внутри WORK_DIR или абсолютный путь к каталогу textfile collector
+METRICS_SETTINGS = {
+    "enabled": True,
+    "folder": "METRICS",
+    "prefix": "reaction_effectiv",
+    "extension": ".prom"
+}
+
 # Настройки лог-файла
 LOG_FILE = {
     "name": "processing_log",
@@ -54,6 +348,10 @@ LOG_FILE = {
 # Режим работы программы
 # "process" - обработка данных (основная работа)
 # "create-test" - создание тестовых данных
+# "panel" - обработка истории выгрузок за N дат (см. PANEL_SETTINGS)
+# "batch" - обработка нескольких пар входных файлов конвейером (см. BATCH_SETTINGS)
+# "scenarios" - распределение КОД вывода при разных порогах (см. SCENARIO_SETTINGS)
+# "diff" - сравнение двух результатов по ТН (см. DIFF_SETTINGS)
 #PROGRAM_MODE = "process"
 PROGRAM_MODE = "create-test"
 
@@ -70,12 +368,190 @@ DATA_PARAMS = {
     "operational_income_current_max": 220000000, # Максимальный операционный доход на 20 августа 2025 (текущий период, тыс. руб.)
     "employee_overlap": 0.90,       # Доля одинаковых сотрудников в двух файлах (90%)
     "new_employees_share": 0.05,    # Доля новых сотрудников (5%)
-    "removed_employees_share": 0.05 # Доля убранных сотрудников (5%)
+    "removed_employees_share": 0.05, # Доля убранных сотрудников (5%)
+    "distribution_profile": "uniform" # Профиль распределения (ключ DISTRIBUTION_PROFILES)
+}
+
+# Профили распределения тестовых данных (переопределяют параметры генерации)
+# Нужны для нагрузочной проверки групповых расчетов на неудобных данных:
+# - 'group_distribution': 'uniform' - ТБ и ГОСБ внутри него равномерно,
+#                         'zipf' - вес ГОСБ ~ 1 / номер^zipf_exponent (один огромный ГОСБ и много мелких)
+# - 'od_tie_values': число различных значений ОД (None - без ограничения); мало значений - много равных ОД и темпов
+# - 'zero_previous_share': доля КМ с нулевым ОД прошлого периода
+# - 'negative_od_share': доля КМ с отрицательным ОД (текущим и прошлым)
+# - 'employee_overlap' / 'new_employees_share': переопределение долей из DATA_PARAMS (текучесть между файлами)
+DISTRIBUTION_PROFILES = {
+    "uniform": {},
+    "zipf_groups": {"group_distribution": "zipf", "zipf_exponent": 1.5},
+    "heavy_ties": {"od_tie_values": 20},
+    "zero_negative_od": {"zero_previous_share": 0.10, "negative_od_share": 0.05},
+    "high_churn": {"employee_overlap": 0.50, "new_employees_share": 0.40}
+}
+
+# Значения параметров генерации, если профиль их не задает
+GENERATION_PROFILE_DEFAULTS = {
+    "group_distribution": "uniform",
+    "zipf_exponent": 1.5,
+    "od_tie_values": None,
+    "zero_previous_share": 0.0,
+    "negative_od_share": 0.0
+}
+
+# Настройки параллельной генерации тестовых данных
+# Сотрудники делятся на части фиксированного размера, каждая часть генерируется своим
+# генератором случайных чисел с дочерним зерном из np.random.SeedSequence(seed).spawn().
+# Результат зависит только от 'seed' и 'shard_size', но не от числа процессов.
+# ТН уникальны между частями: диапазон номеров делится на непересекающиеся отрезки по частям
+# - 'seed': главное зерно (None - случайное, значение пишется в лог для повторения)
+# - 'shard_size': сотрудников в одной части
+# - 'workers': число процессов (None - по числу ядер, 1 - без пула)
+# - 'output': 'merged' - два файла data1/data2, 'shards' - файлы частей data1_..._part001 и т.д.
+#             (загрузчик собирает части, если файла из INPUT_FILES нет)
+# - 'file_format': '.xlsx' (потоковая запись openpyxl write_only), '.csv' (разделитель ";"),
+#                  '.parquet' (нужен pyarrow или fastparquet); файлы 1 и 2 пишутся одновременно
+GENERATION_SETTINGS = {
+    "seed": None,
+    "shard_size": 250000,
+    "workers": None,
+    "output": "merged",
+    "file_format": ".xlsx"
+}
+
+# Настройки CSV файлов (входные файлы и тестовые данные)
+CSV_SETTINGS = {
+    "sep": ";",
+    "encoding": "utf-8-sig"     # BOM - чтобы Excel правильно открывал кириллицу
+}
+
+# Части ФИО для генерации тестовых данных
+FIO_NAME_PARTS = {
+    "first_names_male": [
+        "Александр", "Сергей", "Владимир", "Дмитрий", "Андрей", "Алексей", "Максим", "Иван", "Михаил", "Николай",
+        "Артем", "Денис", "Евгений", "Даниил", "Роман", "Тимур", "Владислав", "Павел", "Константин", "Игорь"
+    ],
+    "first_names_female": [
+        "Анна", "Мария", "Елена", "Ольга", "Татьяна", "Наталья", "Ирина", "Светлана", "Юлия", "Екатерина",
+        "Анастасия", "Дарья", "Ксения", "Виктория", "Полина", "Алиса", "София", "Вероника", "Арина", "Диана"
+    ],
+    "last_names": [
+        "Иванов", "Смирнов", "Кузнецов", "Попов", "Васильев", "Петров", "Соколов", "Михайлов", "Новиков", "Федоров",
+        "Морозов", "Волков", "Алексеев", "Лебедев", "Семенов", "Егоров", "Павлов", "Козлов", "Степанов", "Николаев"
+    ],
+    "middle_names_male": [
+        "Александрович", "Сергеевич", "Владимирович", "Дмитриевич", "Андреевич", "Алексеевич", "Максимович", "Иванович", "Михайлович", "Николаевич"
+    ],
+    "middle_names_female": [
+        "Александровна", "Сергеевна", "Владимировна", "Дмитриевна", "Андреевна", "Алексеевна", "Максимовна", "Ивановна", "Михайловна", "Николаевна"
+    ]
 }
 
 # Процентили для ранжирования (25%, 50%, 75%)
 PERCENTILES = [25, 50, 75]
 
+# Уровни иерархии для расчета статистик (от корня к листьям)
+# Каждый уровень вложен в предыдущий, новые уровни (например, "регион", "ВСП")
+# добавляются в конец списка - колонки и форматы для них формируются автоматически
+#
+# ПАРАМЕТРЫ УРОВНЯ:
+# - 'column': колонка группировки (None - вся страна)
+# - 'percentile_prefix': префикс колонок процентилей ОД ("ТБ" -> "ТБ 25", "ТБ 50", ...)
+# - 'percentiles': список процентилей ОД для уровня
+# - 'od_rank_column': колонка ранга ОД ("доля КМ уровня со строго меньшим ОД", %), None - не считать
+# - 'tempo_rank_column': колонка места по темпу (min-ранг по убыванию), None - не считать
+# - 'size_column': колонка с числом КМ в группе уровня, None - не выводить
+HIERARCHY_LEVELS = [
+    {
+        'column': None,
+        'percentile_prefix': 'СТРАНА',
+        'percentiles': [50, 75, 90],
+        'od_rank_column': 'ранг ОД BANK',
+        'tempo_rank_column': 'число страна',
+        'size_column': None
+    },
+    {
+        'column': 'ТБ',
+        'percentile_prefix': 'ТБ',
+        'percentiles': PERCENTILES,
+        'od_rank_column': 'ранг ОД TB',
+        'tempo_rank_column': 'число ТБ',
+        'size_column': None
+    },
+    {
+        'column': 'ГОСБ',
+        'percentile_prefix': 'ГОСБ',
+        'percentiles': PERCENTILES,
+        'od_rank_column': None,
+        'tempo_rank_column': 'число подразделение',
+        'size_column': None
+    }
+]
+
+# Места по темпу внутри подвыборок КМ (считаются в том же проходе, что и места среди всех КМ)
+# Коды 4 и 2 описаны как "среди эффективных", а 'число ТБ' и 'число подразделение' - места среди всех КМ
+# - 'condition': 'effective' (ЭФ.КМ = 1), 'positive_growth' (прирост > 0) или 'effective_positive' (оба)
+# - 'columns': колонка уровня -> (колонка места в подвыборке, колонка числа КМ подвыборки в группе);
+#              место КМ вне подвыборки - пусто
+# - 'classify': True - коды 4 и 2 считаются по местам и численности подвыборки в ТБ и ГОСБ
+#               (используется первая подвыборка с 'classify'; имеет смысл для 'effective')
+RANK_POPULATIONS = {
+    "эфф": {
+        "enabled": True,
+        "condition": "effective",
+        "columns": {
+            "ТБ": ("число ТБ эфф", "КМ в ТБ эфф"),
+            "ГОСБ": ("число подразделение эфф", "КМ в подразделении эфф")
+        },
+        "classify": False
+    }
+}
+
+# Пороги КОД вывода: доля группы по месту по темпу
+# - 'country_top': код 6 (топ-10% страны), 'country': код 5 (топ-25% страны)
+# - 'tb': коды 4 и 3 (топ-25% ТБ), 'gosb': коды 2 и 1 (топ-25% ГОСБ)
+KOD_VYVODA_THRESHOLDS = {
+    "country_top": 0.1,
+    "country": 0.25,
+    "tb": 0.25,
+    "gosb": 0.25
+}
+
+# Ядро расчета статистик уровней иерархии (ранг ОД, процентили, места по темпу)
+# - 'fused': False - векторный путь NumPy (по умолчанию);
+#            "auto" - один проход по каждой группе уровня ядром metrics_kernels.fused_segment_stats,
+#            если установлен numba (JIT, группы считаются параллельно), иначе векторный путь NumPy;
+#            True - всегда ядро (без numba - медленно, только для проверки)
+#   Перед включением ядра на новом окружении: python metrics_kernels.py - все расхождения должны быть 0
+#   (при установленном numba сверяется и скомпилированное ядро)
+HIERARCHY_STATS_KERNEL = {
+    "fused": False
+}
+
+# Тексты колонки "вывод" по значению "КОД вывода"
+KOD_VYVOD_TEXTS = {
+    6: "выше, чем у 90% КМ в стране",
+    5: "выше, чем у 75% КМ в стране",
+    4: "выше, чем у 75% КМ в тербанке (среди эффективных)",
+    3: "выше, чем у 75% КМ в тербанке",
+    2: "выше, чем у 75% КМ в ГОСБ/аппарате (среди эффективных)",
+    1: "ниже, чем у 75% КМ в ГОСБ/аппарате",
+    0: "обычный результат"
+}
+KOD_VYVOD_TEXTS_ARRAY = np.array([KOD_VYVOD_TEXTS[kod] for kod in range(len(KOD_VYVOD_TEXTS))], dtype=object)
+
+# Порядок колонок результата
+# Элементы в фигурных скобках раскрываются в колонки всех уровней HIERARCHY_LEVELS
+RESULT_COLUMNS_LAYOUT = [
+    'ТН 10', 'ТБ', 'ГОСБ', 'ФИО', 'ЭФ.КМ', 'ОД ТЕКУЩИЙ',
+    '{od_rank}',
+    'ОД ПРОШЛЫЙ', 'прирост', 'темп', 'вып условий',
+    '{percentiles}',
+    'КОД вывода',
+    '{tempo_rank}',
+    '{population_rank}',
+    '{size}',
+    'вывод'
+]
+
 # Настройки форматирования колонок Excel
 # Универсальная система управления форматированием через параметры
 # 
@@ -131,7 +607,7 @@ COLUMN_FORMAT_GROUPS = {
     
     # ПРОЦЕНТИЛИ (с разделителями разрядов, 1 знак после запятой)
     'percentiles': {
-        'columns': ['СТРАНА 50', 'СТРАНА 75', 'СТРАНА 90', 'ТБ 25', 'ТБ 50', 'ТБ 75', 'ГОСБ 25', 'ГОСБ 50', 'ГОСБ 75'],
+        'columns': [f"{level['percentile_prefix']} {p}" for level in HIERARCHY_LEVELS for p in level['percentiles']],
         'format': 'number',
         'number_format': '#,##0.0',
         'width': 15,
@@ -140,16 +616,44 @@ COLUMN_FORMAT_GROUPS = {
     
     # РАНГИ (1 знак после запятой)
     'ranks': {
-        'columns': ['ранг ОД BANK', 'ранг ОД TB', 'темп'],
+        'columns': [level['od_rank_column'] for level in HIERARCHY_LEVELS if level['od_rank_column']] + ['темп'],
         'format': 'number',
         'number_format': '0.0',
         'width': 15,
         'alignment': 'right'
     },
     
+    # СВОДНЫЕ ЛИСТЫ: численность, место и распределение кодов вывода
+    'summary_integers': {
+        'columns': ['Численность', 'Место'] + [f"КОД {kod}" for kod in range(7)],
+        'format': 'number',
+        'number_format': '0',
+        'width': 12,
+        'alignment': 'right'
+    },
+    
+    # СВОДНЫЕ ЛИСТЫ: суммы и медианы ОД
+    'summary_financial': {
+        'columns': ['Сумма ОД', 'Медиана ОД'],
+        'format': 'number',
+        'number_format': '#,##0.0',
+        'width': 20,
+        'alignment': 'right'
+    },
+    
+    # СВОДНЫЕ ЛИСТЫ: доли
+    'summary_share': {
+        'columns': ['Доля эффективных'],
+        'format': 'number',
+        'number_format': '0.0%',
+        'width': 14,
+        'alignment': 'right'
+    },
+    
     # ЦЕЛЫЕ ЧИСЛА
     'integers': {
-        'columns': ['число страна', 'число ТБ', 'число подразделение'],
+        'columns': [level[key] for key in ('tempo_rank_column', 'size_column') for level in HIERARCHY_LEVELS if level[key]]
+                   + [column for population in RANK_POPULATIONS.values() for columns in population['columns'].values() for column in columns],
         'format': 'number',
         'number_format': '0',
         'width': 15,
@@ -157,6 +661,55 @@ COLUMN_FORMAT_GROUPS = {
     }
 }
 
+# Правила условного форматирования листа (цветовая разметка результата)
+# Правила задаются один раз на диапазон колонки/строк, а не на каждую ячейку,
+# поэтому время записи и размер книги не зависят от числа строк
+#
+# ПАРАМЕТРЫ ПРАВИЛА:
+# - 'column': колонка, по значению которой применяется правило
+# - 'type': 'cell_is' - сравнение значения ячейки, 'data_bar' - гистограмма в ячейке
+# - 'apply_to': 'cell' - только ячейки колонки, 'row' - вся строка данных (для 'cell_is')
+# - 'styles': для 'cell_is' - значение -> {'fill': цвет фона, 'font': цвет шрифта} (RGB без #)
+# - 'color': для 'data_bar' - цвет гистограммы
+# - 'enabled': включить/выключить правило
+CONDITIONAL_FORMAT_RULES = {
+    # Цвет строки по коду вывода (чем выше код, тем насыщеннее зеленый)
+    'kod_vyvoda': {
+        'column': 'КОД вывода',
+        'type': 'cell_is',
+        'apply_to': 'row',
+        'styles': {
+            6: {'fill': '63BE7B', 'font': '000000'},
+            5: {'fill': '8CCB8F', 'font': '000000'},
+            4: {'fill': 'B5D9A3', 'font': '000000'},
+            3: {'fill': 'D8E9B4', 'font': '000000'},
+            2: {'fill': 'FFF2CC', 'font': '000000'},
+            1: {'fill': 'FCE4D6', 'font': '000000'}
+        },
+        'enabled': True
+    },
+    
+    # Выполнение условий: 1 - зеленый, 0 - красный
+    'vyp_usloviy': {
+        'column': 'вып условий',
+        'type': 'cell_is',
+        'apply_to': 'cell',
+        'styles': {
+            1: {'fill': 'C6EFCE', 'font': '006100'},
+            0: {'fill': 'FFC7CE', 'font': '9C0006'}
+        },
+        'enabled': True
+    },
+    
+    # Гистограмма текущего ОД
+    'od_current_bar': {
+        'column': 'ОД ТЕКУЩИЙ',
+        'type': 'data_bar',
+        'color': '638EC6',
+        'enabled': True
+    }
+}
+
 # Специальные настройки для отдельных колонок (переопределяют групповые)
 # 
 # СПЕЦИАЛЬНЫЕ ТИПЫ ФОРМАТИРОВАНИЯ:
@@ -352,15 +905,20 @@ LOG_MESSAGES = {
     "directory_ready": "Директория {} готова к работе",
     "tb_mapping_created": "Создано распределение ГОСБ по ТБ: {} ТБ",
     "progress_employees": "Сгенерировано сотрудников: {}",
+    "generation_planned": "Генерация: {} сотрудников в {} частях, процессов: {}, зерно: {}",
+    "generation_profile": "Профиль распределения тестовых данных: {} {}",
+    "generation_shard_files": "Сохранено файлов частей: {}, шаблон имени: {}",
     "unique_tn_fio": "Уникальных ТН: {}, Уникальных ФИО: {}",
     "duplicate_tn_error": "ОШИБКА: Дублирование табельных номеров!",
     "duplicate_fio_error": "ОШИБКА: Дублирование ФИО!",
+    "duplicate_fio_info": "ФИО повторяются (ФИО не является ключом): файл 1 - {}, файл 2 - {}",
     "file_saved_debug": "Файл сохранен: {}",
     "file_size_debug": "Размер файла: {} строк, {} столбцов",
     "generation_error": "Ошибка при генерации тестовых данных: {}",
     "save_error": "Ошибка при сохранении файла: {}",
     "details_error": "Детали ошибки: {}",
     "file_not_found": "Файл {} не найден",
+    "file_parts_loaded": "Файл {} собран из частей: {}",
     "load_file_error": "Ошибка при загрузке файла {}: {}",
     "no_data_to_process": "Нет данных для обработки",
     "no_data_to_save": "Нет данных для сохранения",
@@ -396,6 +954,7 @@ LOG_MESSAGES = {
     "files_loaded_debug": "Загружены файлы: data1 ({} строк), data2 ({} строк)",
     "unique_tn_created": "Создан список из {} уникальных ТН",
     "ranks_calculation": "Рассчитываем ранги ОД...",
+    "hierarchy_kernel": "Статистики уровней иерархии: {}",
     "percentiles_calculation": "Рассчитываем процентили...",
     "ranking_calculation": "Рассчитываем ранжирование по процентилям...",
     "data_processed_debug": "Обработано данных: {} строк, {} колонок",
@@ -416,7 +975,67 @@ LOG_MESSAGES = {
     "columns_formatted": "Отформатированы {} колонок по содержимому",
     "group_formatting_applied": "Применено групповое форматирование: {} групп, {} колонок",
     "special_formats_applied": "Специальные настройки применены к {} колонкам",
-    "padded_number_formatted": "Применено специальное форматирование к {} колонкам (padded_number)"
+    "padded_number_formatted": "Применено специальное форматирование к {} колонкам (padded_number)",
+    "snapshot_saved": "Бинарный снимок сохранен: {} ({} строк, {} колонок)",
+    "snapshot_loaded": "Бинарный снимок открыт: {} ({} строк, {} колонок)",
+    "snapshot_error": "Ошибка при сохранении бинарного снимка: {}",
+    "hierarchy_mismatch": "ГОСБ не входит в указанный ТБ по BANK_STRUCTURE: {} строк (статистики ГОСБ для них считаются внутри пары ТБ/ГОСБ)",
+    "hierarchy_mismatch_examples": "Примеры несоответствий ТБ/ГОСБ: {}",
+    "hierarchy_unknown": "ТБ или ГОСБ отсутствуют в BANK_STRUCTURE: {} строк",
+    "hierarchy_level_skipped": "Уровень иерархии {} пропущен: колонка отсутствует во входных данных",
+    "shards_planned": "Excel результат разбит на {} частей ({} строк, режим: {})",
+    "shards_saved": "Сохранено частей Excel: {}, манифест: {}",
+    "distribution_planned": "Рассылочные книги: {} книг по {} ({} строк, процессов: {})",
+    "distribution_saved": "Рассылочные книги сохранены: {} книг, {} в папке {}, манифест: {}",
+    "distribution_error": "Ошибка создания рассылочных книг: {}",
+    "conditional_formats_applied": "Применены правила условного форматирования: {} групп",
+    "summary_tables_built": "Построены сводные таблицы: {}",
+    "validation_issue": "Проверка входных данных: {} (файл {}): {} строк, примеры ТН: {}",
+    "validation_done": "Проверка входных данных завершена: строк с нарушениями {} из {} ({:.2f}%)",
+    "validation_failed": "Доля строк с нарушениями {:.2f}% превышает порог {:.2f}%, обработка остановлена",
+    "validation_time": "Время проверки входных данных: {}",
+    "text_columns_optimized": "Текстовые колонки ({}): {} -> {}",
+    "text_memory_saved": "Память текстовых колонок: {} -> {} (экономия {:.1f}%)",
+    "mode_panel": "Режим: Обработка истории выгрузок (панель)",
+    "mode_batch": "Режим: Пакетная обработка пар входных файлов",
+    "mode_scenarios": "Режим: Сценарии порогов КОД вывода",
+    "mode_diff": "Режим: Сравнение двух результатов",
+    "diff_no_sources": "Для сравнения нужны два результата одного формата в папке {}",
+    "diff_sources": "Сравнение: {} -> {}",
+    "diff_loaded": "Результаты загружены за {}: {} и {} строк",
+    "diff_done": "Сравнение за {}: добавлено КМ {}, удалено {}, изменился КОД вывода у {}, изменения у {} КМ",
+    "diff_saved": "Сравнение сохранено: {}",
+    "api_missing_columns": "Во входных данных файла {} нет колонок: {}",
+    "api_validation_failed": "Входные данные не прошли проверку: {}",
+    "scenarios_evaluated": "Сценарии порогов КОД вывода: {} сценариев по {} строкам за {}",
+    "scenarios_tn_sheet_skipped": "Лист КОД вывода по ТН не записан: {} строк больше лимита листа {}",
+    "scenarios_saved": "Сценарии порогов сохранены: {}",
+    "scenarios_error": "Ошибка расчета сценариев порогов: {}",
+    "batch_pairs_found": "Найдено пар входных файлов: {} ({})",
+    "batch_no_pairs": "Не найдены пары входных файлов {}*/{}* в папке {}",
+    "batch_pair_incomplete": "Для файла {} нет парного файла {}, файл пропущен",
+    "batch_pair_start": "Пара {} ({} из {}): расчет",
+    "batch_pair_skipped": "Пара {} пропущена: нет данных для сохранения",
+    "batch_pair_error": "Ошибка обработки пары {}: {}",
+    "batch_done": "Обработано пар: {} из {} за {} (в среднем {} на пару; загрузка {}, расчет {}, запись {})",
+    "panel_snapshots_found": "Найдено выгрузок для панели: {} ({} - {})",
+    "panel_snapshot_skipped": "Файл {} пропущен: в имени нет даты по шаблону {}",
+    "panel_no_snapshots": "Не найдены выгрузки по шаблону {}",
+    "panel_processed": "Панель рассчитана: {} строк, {} дат, {} уникальных ТН",
+    "panel_saved": "История сохранена: {}",
+    "checkpoint_saved": "Контрольная точка этапа {} сохранена: {}",
+    "checkpoint_loaded": "Этап {} пропущен: результат взят из контрольной точки {} (ключ {})",
+    "checkpoint_missing": "Нет контрольной точки этапа {} для текущих входных данных и настроек, этап выполняется заново",
+    "checkpoint_error": "Ошибка контрольной точки этапа {}: {}",
+    "pipeline_start_stage": "Обработка начинается с этапа {}",
+    "arrow_strings_unavailable": "pyarrow не установлен: колонки {} остаются без преобразования в строки Arrow",
+    "metrics_written": "Метрики выполнения записаны: {}",
+    "execution_plan": "План выполнения: {} (строк на входе: {}, ядер: {}, доступно памяти: {}, оценка пиковой памяти: {})",
+    "execution_plan_override": "Пункты плана заданы явно: {}",
+    "execution_plan_compact_off": "Компактные типы текстовых колонок не используются: {}",
+    "execution_plan_over_budget": "Оценка пиковой памяти {} больше бюджета {}: возможна нехватка памяти",
+    "file_read_chunked": "Файл {} прочитан частями: {}",
+    "metrics_error": "Ошибка записи метрик выполнения: {}"
 }
 
 # =============================================================================
@@ -440,1075 +1059,3978 @@ def format_execution_time(seconds):
         remaining_seconds = seconds % 60
         return f"{minutes:02d}:{remaining_seconds:06.3f}"
 
+def format_timestamp_suffix(suffix_format):
+    """
+    Формирует суффикс имени файла с временной меткой
+    
+    Первое вхождение "MM" трактуется как месяц, второе - как минуты
+    (формат вида "_YYYYMMDD-HHMMSS").
+    
+    Args:
+        suffix_format (str): Формат суффикса (например, "_YYYYMMDD-HHMMSS")
+        
+    Returns:
+        str: Суффикс с подставленной текущей датой и временем
+    """
+    strftime_format = (
+        suffix_format
+        .replace("YYYY", "%Y")
+        .replace("DD", "%d")
+        .replace("HH", "%H")
+        .replace("SS", "%S")
+        .replace("MM", "%m", 1)
+        .replace("MM", "%M", 1)
+    )
+    return datetime.now().strftime(strftime_format)
+
 # =============================================================================
-# КЛАСС ДЛЯ ЛОГИРОВАНИЯ
+# ЦЕЛОЧИСЛЕННЫЕ КЛЮЧИ ТАБЕЛЬНЫХ НОМЕРОВ
 # =============================================================================
 
-class DataProcessorLogger:
-    """Класс для управления логированием программы"""
+# Служебная колонка с int64 ключом ТН (добавляется при загрузке, в результат не попадает)
+TN_KEY_COLUMN = "_ТН ключ"
+
+def parse_tn_keys(values):
+    """
+    Разбор ТН в целочисленные ключи int64
     
-    def __init__(self, log_dir, log_name, log_extension, suffix_format, level="INFO"):
-        """
-        Инициализация логгера
-        
-        Args:
-            log_dir (str): Директория для логов
-            log_name (str): Имя лог-файла без расширения
-            log_extension (str): Расширение лог-файла
-            suffix_format (str): Формат суффикса для имени файла
-            level (str): Уровень логирования (INFO/DEBUG)
-        """
-        self.log_dir = Path(log_dir)
-        self.log_name = log_name
-        self.log_extension = log_extension
-        self.suffix_format = suffix_format
-        self.level = level.upper()
-        
-        # Создаем директорию для логов если её нет
-        self.log_dir.mkdir(parents=True, exist_ok=True)
-        
-        # Формируем имя лог-файла с суффиксом
-        timestamp = datetime.now().strftime(suffix_format.replace("YYYY", "%Y").replace("MM", "%m").replace("DD", "%d"))
-        self.log_filename = f"{log_name}-{level}{timestamp}{log_extension}"
-        self.log_filepath = self.log_dir / self.log_filename
-        
-        # Настраиваем логирование
-        self._setup_logging()
+    Принимаются строки вида "TN_0012345678", "0012345678" и числа.
+    Некорректные ТН получают отрицательный ключ из хэша строки, поэтому
+    одинаковые некорректные ТН в разных файлах по-прежнему совпадают.
     
-    def _setup_logging(self):
-        """Настройка системы логирования"""
-        # Определяем уровень логирования
-        log_level = logging.DEBUG if self.level == "DEBUG" else logging.INFO
-        
-        # Настраиваем форматтер
-        formatter = logging.Formatter(
-            '%(asctime)s - %(levelname)s - %(message)s',
-            datefmt='%Y-%m-%d %H:%M:%S'
-        )
-        
-        # Настраиваем файловый хендлер
-        file_handler = logging.FileHandler(self.log_filepath, encoding='utf-8')
-        file_handler.setLevel(log_level)
-        file_handler.setFormatter(formatter)
-        
-        # Настраиваем консольный хендлер
-        console_handler = logging.StreamHandler()
-        console_handler.setLevel(log_level)
-        console_handler.setFormatter(formatter)
+    Args:
+        values (pd.Series): Значения колонки ТН 10
         
-        # Настраиваем корневой логгер
-        self.logger = logging.getLogger(__name__)
-        self.logger.setLevel(log_level)
-        self.logger.addHandler(file_handler)
-        self.logger.addHandler(console_handler)
+    Returns:
+        np.ndarray: Ключи int64
+    """
+    values = pd.Series(values).reset_index(drop=True)
+    if pd.api.types.is_integer_dtype(values):
+        return values.to_numpy(dtype=np.int64)
+    
+    text = values.astype(str).str.replace('TN_', '', regex=False).str.strip()
+    text = text.str.replace(r'\.0$', '', regex=True)  # ТН, прочитанный Excel как число с плавающей точкой
+    valid = text.str.fullmatch(r'\d{1,18}').to_numpy(dtype=bool)
+    
+    keys = np.empty(len(text), dtype=np.int64)
+    keys[valid] = text[valid].astype(np.int64).to_numpy()
+    if not valid.all():
+        hashes = pd.util.hash_array(text[~valid].to_numpy(dtype=object))
+        keys[~valid] = -(hashes >> np.uint64(1)).astype(np.int64) - 1
+    return keys
+
+def format_tn_keys(keys, raw_values=None):
+    """
+    Отображаемая форма ТН: число с лидирующими нулями до total_digits знаков
+    
+    Args:
+        keys (np.ndarray): Ключи int64
+        raw_values (pd.Series): Исходные ТН (для некорректных ключей выводятся как есть, без префикса TN_)
         
-        # Очищаем хендлеры чтобы избежать дублирования
-        self.logger.handlers.clear()
-        self.logger.addHandler(file_handler)
-        self.logger.addHandler(console_handler)
+    Returns:
+        np.ndarray: Строки ТН
+    """
+    total_digits = COLUMN_SPECIAL_FORMATS.get('ТН 10', {}).get('total_digits', 10)
+    keys = np.asarray(keys, dtype=np.int64)
+    result = pd.Series(keys).astype(str).str.zfill(total_digits).to_numpy(dtype=object)
+    invalid = keys < 0
+    if invalid.any() and raw_values is not None:
+        raw = pd.Series(raw_values).reset_index(drop=True).astype(str).str.replace('TN_', '', regex=False)
+        result[invalid] = raw[invalid].to_numpy(dtype=object)
+    return result
+
+# =============================================================================
+# ТИПЫ ТЕКСТОВЫХ КОЛОНОК
+# =============================================================================
+
+def format_memory_size(size_bytes):
+    """
+    Форматирование размера памяти в читаемый вид
     
-    def log_info(self, message):
-        """Логирование информационного сообщения"""
-        self.logger.info(message)
+    Args:
+        size_bytes (int): Размер в байтах
+        
+    Returns:
+        str: Размер в КБ / МБ
+    """
+    if size_bytes < 1024 * 1024:
+        return f"{size_bytes / 1024:.1f} КБ"
+    return f"{size_bytes / (1024 * 1024):.1f} МБ"
+
+def optimize_text_columns(df):
+    """
+    Перевод текстовых колонок в компактные типы по TEXT_COLUMN_TYPES (на месте)
     
-    def log_debug(self, message):
-        """Логирование отладочного сообщения"""
-        self.logger.debug(message)
+    Колонки с малым числом значений становятся category, с большим - строками
+    Arrow (если доступен pyarrow). Преобразуются только текстовые колонки.
     
-    def log_error(self, message):
-        """Логирование ошибки"""
-        self.logger.error(message)
+    Args:
+        df (pd.DataFrame): Данные
+        
+    Returns:
+        tuple: (преобразованные колонки, байт до, байт после)
+    """
+    converted = []
+    memory_before = 0
+    memory_after = 0
     
-    def log_start(self):
-        """Логирование начала работы программы"""
-        self.log_info(LOG_MESSAGES["start"])
+    for column_name in df.columns:
+        series = df[column_name]
+        if not (pd.api.types.is_object_dtype(series) or pd.api.types.is_string_dtype(series)):
+            continue
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            continue
+        if column_name in TEXT_COLUMN_TYPES["categorical_columns"]:
+            target_dtype = 'category'
+        elif column_name in TEXT_COLUMN_TYPES["string_columns"] and ARROW_STRING_DTYPE is not None:
+            target_dtype = ARROW_STRING_DTYPE
+        else:
+            continue
+        
+        memory_before += int(series.memory_usage(index=False, deep=True))
+        df[column_name] = series.astype(target_dtype)
+        memory_after += int(df[column_name].memory_usage(index=False, deep=True))
+        converted.append(column_name)
     
-    def log_end(self):
-        """Логирование завершения работы программы"""
-        self.log_info(LOG_MESSAGES["end"])
+    return converted, memory_before, memory_after
 
 # =============================================================================
-# КЛАСС ДЛЯ СОЗДАНИЯ ТЕСТОВЫХ ДАННЫХ
+# ИНДЕКС ИЕРАРХИИ ТБ -> ГОСБ
 # =============================================================================
 
-class TestDataGenerator:
-    """Класс для создания тестовых данных для анализа эффективности"""
+# Подпись группы с пропущенным значением (ТБ / ГОСБ) в сводных таблицах
+MISSING_GROUP_LABEL = "(пусто)"
+
+def factorize_with_missing(values, sort=False, missing_label=np.nan):
+    """
+    Целые коды значений, где пропуск (NaN / None) - отдельное значение с последним кодом
     
-    def __init__(self, work_dir, logger):
+    То же, что pd.factorize(..., use_na_sentinel=False) в новых версиях pandas:
+    кода -1 нет, поэтому коды можно передавать в np.bincount и брать ими элементы массивов.
+    
+    Args:
+        values (array-like): Значения
+        sort (bool): Упорядочить уникальные значения
+        missing_label: Значение для пропуска в списке уникальных значений
+        
+    Returns:
+        tuple: (коды int64, уникальные значения np.ndarray; пропуск - последним, если есть)
+    """
+    codes, uniques = pd.factorize(np.asarray(values, dtype=object), sort=sort)
+    codes = codes.astype(np.int64)
+    uniques = np.asarray(uniques, dtype=object)
+    missing = codes < 0
+    if missing.any():
+        codes[missing] = len(uniques)
+        uniques = np.append(uniques, np.array([missing_label], dtype=object))
+    return codes, uniques
+
+class BankHierarchyIndex:
+    """
+    Скомпилированный индекс иерархии ТБ -> ГОСБ с целочисленными кодами
+    
+    Строится один раз из BANK_STRUCTURE. ГОСБ каждого ТБ получают
+    последовательные коды, поэтому ГОСБ одного ТБ занимают непрерывный
+    диапазон [gosb_offsets[tb], gosb_offsets[tb] + tb_gosb_counts[tb]).
+    """
+    
+    def __init__(self, bank_structure):
         """
-        Инициализация генератора тестовых данных
+        Построение индекса
         
         Args:
-            work_dir (str): Рабочая директория
-            logger (DataProcessorLogger): Объект логгера
+            bank_structure (dict): Вложенный словарь ТБ -> список ГОСБ
         """
-        self.work_dir = Path(work_dir)
-        self.logger = logger
-        self.start_time = None
-        self.errors_count = 0
-        self.files_created = 0
-        self.employees_created = 0
+        self.tb_names = np.array(list(bank_structure.keys()), dtype=object)
+        self.gosb_names = np.array([gosb for gosb_list in bank_structure.values() for gosb in gosb_list], dtype=object)
         
-        # Создаем необходимые директории
-        self._create_directories()
+        # Количество ГОСБ в каждом ТБ и смещение первого ГОСБ ТБ в общем списке
+        self.tb_gosb_counts = np.array([len(gosb_list) for gosb_list in bank_structure.values()], dtype=np.int64)
+        self.gosb_offsets = np.concatenate(([0], np.cumsum(self.tb_gosb_counts)[:-1])).astype(np.int64)
         
-        # Создаем распределение ГОСБ по ТБ
-        self._create_tb_gosb_mapping()
-    
-    def _create_directories(self):
-        """Создание необходимых директорий"""
-        directories = [
-            self.work_dir / INPUT_FOLDER,
-            self.work_dir / OUTPUT_FOLDER,
-            self.work_dir / LOGS_FOLDER
-        ]
+        # Родительский ТБ для каждого ГОСБ
+        self.gosb_parent = np.repeat(np.arange(len(self.tb_names), dtype=np.int64), self.tb_gosb_counts)
         
-        for directory in directories:
-            directory.mkdir(parents=True, exist_ok=True)
-            self.logger.log_debug(LOG_MESSAGES["directory_ready"].format(directory))
-    
-    def _create_tb_gosb_mapping(self):
-        """Создание распределения ГОСБ по ТБ"""
-        self.tb_gosb_mapping = {}
-        current_index = 0
-        
-        for tb in TERRITORIAL_BANKS:
-            # Определяем количество ГОСБ для данного ТБ
-            if tb == "Байкальский банк":
-                gosb_count = 5
-            elif tb == "Волго-Вятский банк":
-                gosb_count = 12
-            elif tb == "Дальневосточный банк":
-                gosb_count = 9
-            elif tb == "Московский банк":
-                gosb_count = 5
-            elif tb == "Поволжский банк":
-                gosb_count = 8
-            elif tb == "Северо-Западный банк":
-                gosb_count = 10
-            elif tb == "Сибирский банк":
-                gosb_count = 8
-            elif tb == "Среднерусский банк":
-                gosb_count = 13
-            elif tb == "Уральский банк":
-                gosb_count = 7
-            elif tb == "Центрально-Черноземный банк":
-                gosb_count = 8
-            elif tb == "Юго-Западный банк":
-                gosb_count = 12
-            else:
-                gosb_count = 10
-            
-            # Берем ГОСБ для данного ТБ
-            self.tb_gosb_mapping[tb] = HEAD_OFFICES[current_index:current_index + gosb_count]
-            current_index += gosb_count
+        # Размеры уровней иерархии
+        self.level_sizes = {'ТБ': len(self.tb_names), 'ГОСБ': len(self.gosb_names)}
         
-        self.logger.log_debug(LOG_MESSAGES["tb_mapping_created"].format(len(self.tb_gosb_mapping)))
+        self._tb_categories = pd.Index(self.tb_names)
+        self._gosb_categories = pd.Index(self.gosb_names)
     
-    def _generate_tn(self):
-        """Генерация табельного номера с настраиваемым форматом"""
-        # Получаем настройки форматирования для ТН 10
-        tn_format = COLUMN_SPECIAL_FORMATS.get('ТН 10', {})
-        total_digits = tn_format.get('total_digits', 10)
-        leading_zeros = tn_format.get('leading_zeros', 10)
-        min_value = tn_format.get('min_value', 1)
-        max_value = tn_format.get('max_value', 9999999999)
-        
-        # Генерируем случайное число с ограничением по количеству знаков
-        # Чтобы гарантировать, что zfill() добавит лидирующие нули
-        max_digits_for_generation = total_digits - 1  # Оставляем место для лидирующих нулей
-        max_value_for_generation = 10 ** max_digits_for_generation - 1
-        
-        # Генерируем случайное число в ограниченном диапазоне
-        tn_number = np.random.randint(min_value, max_value_for_generation + 1)
-        
-        # Форматируем с лидирующими нулями до общего количества знаков
-        # Принудительно создаем строку с лидирующими нулями
-        formatted_tn = str(tn_number).zfill(total_digits)
-        
-        # Добавляем префикс 'TN_' чтобы pandas НЕ преобразовал в число
-        # Это гарантирует сохранение лидирующих нулей
-        return f"TN_{formatted_tn}"
-    
-    def _generate_fio(self):
-        """Генерация уникального ФИО"""
-        # Списки имен, фамилий и отчеств
-        first_names_male = [
-            "Александр", "Сергей", "Владимир", "Дмитрий", "Андрей", "Алексей", "Максим", "Иван", "Михаил", "Николай",
-            "Артем", "Денис", "Евгений", "Даниил", "Роман", "Тимур", "Владислав", "Павел", "Константин", "Игорь"
-        ]
+    @staticmethod
+    def _encode(values, categories):
+        """
+        Кодирование значений в целые коды по списку категорий
         
-        first_names_female = [
-            "Анна", "Мария", "Елена", "Ольга", "Татьяна", "Наталья", "Ирина", "Светлана", "Юлия", "Екатерина",
-            "Анастасия", "Дарья", "Ксения", "Виктория", "Полина", "Алиса", "София", "Вероника", "Арина", "Диана"
-        ]
+        Неизвестные значения и пропуски получают коды за пределами справочника
+        (len(categories), len(categories) + 1, ...), чтобы группировка
+        по кодам оставалась корректной и для них.
+        """
+        if isinstance(getattr(values, 'dtype', None), pd.CategoricalDtype) and not values.isna().any():
+            # Категориальная колонка: кодируется словарь, строки - взятием по кодам
+            return BankHierarchyIndex._encode(values.cat.categories, categories)[values.cat.codes.to_numpy()]
+        
+        codes = categories.get_indexer(pd.Index(values)).astype(np.int64)
+        unknown_mask = codes < 0
+        if unknown_mask.any():
+            unknown_codes, _ = factorize_with_missing(np.asarray(values, dtype=object)[unknown_mask])
+            codes[unknown_mask] = len(categories) + unknown_codes
+        return codes
+    
+    def encode_tb(self, values):
+        """Целочисленные коды ТБ для массива названий"""
+        return self._encode(values, self._tb_categories)
+    
+    def encode_gosb(self, values):
+        """Целочисленные коды ГОСБ для массива названий"""
+        return self._encode(values, self._gosb_categories)
+    
+    def gosb_codes_of_tb(self, tb_code):
+        """Диапазон кодов ГОСБ, входящих в ТБ"""
+        start = self.gosb_offsets[tb_code]
+        return np.arange(start, start + self.tb_gosb_counts[tb_code])
+    
+    def hierarchy_mismatch_mask(self, tb_codes, gosb_codes):
+        """
+        Векторная проверка принадлежности ГОСБ указанному ТБ
+        
+        Args:
+            tb_codes (np.ndarray): Коды ТБ
+            gosb_codes (np.ndarray): Коды ГОСБ
+            
+        Returns:
+            np.ndarray: True для строк, где известный ГОСБ не входит в известный указанный ТБ
+        """
+        known = (tb_codes < len(self.tb_names)) & (gosb_codes < len(self.gosb_names))
+        parent = self.gosb_parent[np.where(known, gosb_codes, 0)]
+        return known & (parent != tb_codes)
+    
+    def unknown_mask(self, tb_codes, gosb_codes):
+        """True для строк с ТБ или ГОСБ, отсутствующими в BANK_STRUCTURE"""
+        return (tb_codes >= len(self.tb_names)) | (gosb_codes >= len(self.gosb_names))
+
+# Индекс иерархии строится один раз при загрузке модуля
+BANK_HIERARCHY = BankHierarchyIndex(BANK_STRUCTURE)
+
+# =============================================================================
+# ДВИЖОК СТАТИСТИК ПО УРОВНЯМ ИЕРАРХИИ
+# =============================================================================
+
+def sorted_run_starts(sorted_codes, sorted_values):
+    """
+    Позиция начала серии одинаковых (код, значение) для каждого элемента
+    
+    Массивы должны быть отсортированы по коду группы, а внутри группы - по значению.
+    Для элемента i возвращается индекс первого элемента с тем же кодом и тем же значением.
+    """
+    n = len(sorted_codes)
+    if n == 0:
+        return np.empty(0, dtype=np.int64)
+    new_run = np.ones(n, dtype=bool)
+    new_run[1:] = (sorted_codes[1:] != sorted_codes[:-1]) | (sorted_values[1:] != sorted_values[:-1])
+    return np.maximum.accumulate(np.where(new_run, np.arange(n), 0))
+
+def segment_starts(sorted_codes):
+    """Позиции начала групп в массиве, отсортированном по коду группы"""
+    n = len(sorted_codes)
+    if n == 0:
+        return np.empty(0, dtype=np.int64)
+    return np.flatnonzero(np.r_[True, sorted_codes[1:] != sorted_codes[:-1]])
+
+def segment_quantiles(sorted_values, starts, sizes, quantiles):
+    """
+    Квантили внутри отсортированных сегментов (линейная интерполяция, как pandas.quantile)
+    
+    Args:
+        sorted_values (np.ndarray): Значения, отсортированные внутри каждого сегмента
+        starts (np.ndarray): Начала сегментов
+        sizes (np.ndarray): Размеры сегментов
+        quantiles (list): Квантили в долях (0.25, 0.5, ...)
+        
+    Returns:
+        np.ndarray: Матрица [число сегментов x число квантилей]
+    """
+    sorted_values = np.asarray(sorted_values, dtype=np.float64)
+    result = np.empty((len(starts), len(quantiles)), dtype=np.float64)
+    for index, q in enumerate(quantiles):
+        position = (sizes - 1) * q
+        lower = np.floor(position).astype(np.int64)
+        upper = np.minimum(lower + 1, sizes - 1)
+        fraction = position - lower
+        low_values = sorted_values[starts + lower]
+        high_values = sorted_values[starts + upper]
+        result[:, index] = low_values + (high_values - low_values) * fraction
+    return result
+
+def grouped_summary(codes, effective, od_values, kod_values, kod_count=7):
+    """
+    Агрегаты по группам за один проход по данным
+    
+    Args:
+        codes (np.ndarray): Коды групп (0..G-1)
+        effective (np.ndarray): Признак эффективности (0/1)
+        od_values (np.ndarray): ОД
+        kod_values (np.ndarray): КОД вывода (0..kod_count-1)
+        kod_count (int): Количество различных кодов вывода
+        
+    Returns:
+        dict: Массивы по группам: 'count', 'effective_share', 'od_sum', 'od_median', 'kod_counts' [G x kod_count]
+    """
+    groups = int(codes.max()) + 1 if len(codes) else 0
+    od_values = np.asarray(od_values, dtype=np.float64)
+    counts = np.bincount(codes, minlength=groups)
+    
+    # Медиана по отсортированным сегментам (группы без строк не попадают в сегменты)
+    order = np.lexsort((od_values, codes))
+    starts = segment_starts(codes[order])
+    medians = np.full(groups, np.nan)
+    if len(starts):
+        present = codes[order][starts]
+        medians[present] = segment_quantiles(od_values[order], starts, counts[present], [0.5])[:, 0]
+    
+    kod_values = np.clip(np.asarray(kod_values, dtype=np.int64), 0, kod_count - 1)
+    return {
+        'count': counts,
+        'effective_share': np.bincount(codes, weights=effective, minlength=groups) / np.maximum(counts, 1),
+        'od_sum': np.bincount(codes, weights=od_values, minlength=groups),
+        'od_median': medians,
+        'kod_counts': np.bincount(codes * kod_count + kod_values, minlength=groups * kod_count).reshape(groups, kod_count)
+    }
+
+def top_n_within_groups(codes, values, n):
+    """
+    Позиции top-n строк по убыванию values внутри каждой группы
+    
+    Внутри группы используется частичный отбор (argpartition), полностью
+    сортируются только отобранные n строк.
+    
+    Args:
+        codes (np.ndarray): Коды групп
+        values (np.ndarray): Значения для отбора (NaN не попадают в топ)
+        n (int): Размер топа
+        
+    Returns:
+        list: Пары (код группы, позиции строк в порядке убывания значения)
+    """
+    values = np.asarray(values, dtype=np.float64)
+    keys = np.where(np.isnan(values), np.inf, -values)
+    order = np.argsort(codes, kind='stable')
+    starts = segment_starts(codes[order])
+    stops = np.r_[starts[1:], len(order)]
+    
+    result = []
+    for start, stop in zip(starts, stops):
+        rows = order[start:stop]
+        segment_keys = keys[rows]
+        if len(rows) > n:
+            selected = np.argpartition(segment_keys, n - 1)[:n]
+        else:
+            selected = np.arange(len(rows))
+        selected = selected[np.argsort(segment_keys[selected], kind='stable')]
+        selected = selected[np.isfinite(segment_keys[selected])]
+        result.append((codes[rows[0]], rows[selected]))
+    return result
+
+def panel_trend_features(tn_keys, period_codes, top_flags, tempo_values, window):
+    """
+    Признаки динамики КМ по истории выгрузок
+    
+    - серия: число выгрузок подряд (включая текущую), в которых КМ был в топе;
+      пропуск выгрузки или выход из топа обнуляет серию
+    - скользящий темп: средний темп по последним window выгрузкам КМ
+    
+    Args:
+        tn_keys (np.ndarray): Ключи ТН
+        period_codes (np.ndarray): Номера выгрузок (0, 1, ... по возрастанию даты)
+        top_flags (np.ndarray): Признак топа в выгрузке (bool)
+        tempo_values (np.ndarray): Темп
+        window (int): Окно скользящего темпа
+        
+    Returns:
+        tuple: (серия, скользящий темп) в исходном порядке строк
+    """
+    rows = len(tn_keys)
+    if rows == 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float64)
+    order = np.lexsort([period_codes, tn_keys])
+    keys = tn_keys[order]
+    periods = period_codes[order]
+    flags = top_flags[order]
+    positions = np.arange(rows)
+    
+    # Начала историй КМ и разрывы серии (новый КМ или пропущенная выгрузка)
+    new_tn = np.r_[True, keys[1:] != keys[:-1]]
+    gap = new_tn | np.r_[True, np.diff(periods) != 1]
+    # Серия начинается с текущей строки при разрыве и со следующей - при выходе из топа
+    run_start = np.maximum.accumulate(np.where(~flags, positions + 1, np.where(gap, positions, 0)))
+    streak = np.where(flags, positions - run_start + 1, 0)
+    
+    # Скользящее среднее через накопленные суммы внутри истории КМ
+    tn_start = np.maximum.accumulate(np.where(new_tn, positions, 0))
+    cumulative = np.r_[0.0, np.cumsum(np.asarray(tempo_values, dtype=np.float64)[order])]
+    window_start = np.maximum(tn_start, positions - window + 1)
+    rolling = (cumulative[positions + 1] - cumulative[window_start]) / (positions + 1 - window_start)
+    
+    streak_original = np.empty(rows, dtype=np.int64)
+    streak_original[order] = streak
+    rolling_original = np.empty(rows, dtype=np.float64)
+    rolling_original[order] = np.round(rolling, 2)
+    return streak_original, rolling_original
+
+def population_mask(df, condition):
+    """
+    Маска подвыборки КМ для мест по темпу (см. RANK_POPULATIONS)
+    
+    Args:
+        df (pd.DataFrame): Показатели КМ (ЭФ.КМ, прирост)
+        condition (str): 'effective', 'positive_growth' или 'effective_positive'
+        
+    Returns:
+        np.ndarray: bool для каждой строки
+    """
+    effective = df['ЭФ.КМ'].to_numpy() == 1
+    positive_growth = df['прирост'].to_numpy() > 0
+    masks = {
+        'effective': effective,
+        'positive_growth': positive_growth,
+        'effective_positive': effective & positive_growth
+    }
+    if condition not in masks:
+        raise ValueError(f"Неизвестное условие подвыборки: {condition}")
+    return masks[condition]
+
+class SortedPartitionLayout:
+    """
+    Отсортированная раскладка строк по уровням иерархии
+    
+    Строки один раз сортируются по (коды уровней от корня к листу, ОД),
+    после чего группы каждого уровня занимают непрерывные диапазоны.
+    Для каждого уровня хранятся смещения начала групп, а перестановка
+    order/inverse позволяет вернуть исходный порядок строк в конце.
+    """
+    
+    def __init__(self, level_codes, od_values):
+        """
+        Args:
+            level_codes (list): Коды групп по уровням (от корня к листу), в исходном порядке строк
+            od_values (np.ndarray): Значения ОД в исходном порядке строк
+        """
+        self.rows = len(od_values)
+        od_values = np.asarray(od_values, dtype=np.float64)
+        
+        # Единственная сортировка: последний ключ lexsort - главный
+        self.order = np.lexsort([od_values] + [np.asarray(codes) for codes in reversed(level_codes)])
+        self.inverse = np.empty_like(self.order)
+        self.inverse[self.order] = np.arange(self.rows)
+        
+        self.od_values = od_values[self.order]
+        self.level_codes = [np.asarray(codes)[self.order] for codes in level_codes]
+        self.offsets = [segment_starts(codes) for codes in self.level_codes]
+        self._value_orders = {}
+    
+    def segment_sizes(self, level_index):
+        """Размеры групп уровня (в порядке раскладки)"""
+        return np.diff(np.r_[self.offsets[level_index], self.rows])
+    
+    def segment_ids(self, level_index):
+        """Номер группы уровня для каждой строки раскладки"""
+        return np.repeat(np.arange(len(self.offsets[level_index])), self.segment_sizes(level_index))
+    
+    def row_sizes(self, level_index):
+        """Размер группы уровня для каждой строки раскладки"""
+        return self.segment_sizes(level_index)[self.segment_ids(level_index)]
+    
+    def to_layout(self, values):
+        """Перевод массива из исходного порядка строк в порядок раскладки"""
+        return np.asarray(values)[self.order]
+    
+    def to_original(self, values):
+        """Перевод массива из порядка раскладки в исходный порядок строк"""
+        return np.asarray(values)[self.inverse]
+    
+    def sorted_within_segments(self, level_index, key, values):
+        """
+        Перестановка строк раскладки, упорядочивающая values внутри каждой группы уровня
+        
+        Глобальный порядок значений считается один раз на ключ, а для каждого
+        уровня выполняется только устойчивое разбиение по номеру группы
+        (поразрядная сортировка целых кодов), поэтому группы остаются
+        на своих местах раскладки.
+        
+        Args:
+            level_index (int): Индекс уровня
+            key (str): Ключ кэша глобального порядка (например, 'od' или '-tempo')
+            values (np.ndarray): Значения в порядке раскладки
+            
+        Returns:
+            np.ndarray: Позиции раскладки
+        """
+        if key == 'od' and level_index == len(self.level_codes) - 1:
+            # Внутри групп листового уровня ОД уже отсортирован
+            return np.arange(self.rows)
+        if key not in self._value_orders:
+            self._value_orders[key] = np.argsort(values, kind='stable')
+        value_order = self._value_orders[key]
+        
+        segment_ids = self.segment_ids(level_index)
+        codes_dtype = np.int16 if len(self.offsets[level_index]) <= np.iinfo(np.int16).max else np.int64
+        partition = np.argsort(segment_ids[value_order].astype(codes_dtype), kind='stable')
+        return value_order[partition]
+
+class HierarchyStats:
+    """Результат расчета статистик по уровням иерархии (в порядке раскладки)"""
+    
+    def __init__(self):
+        self.columns = {}        # имя колонки -> массив значений
+        self.group_sizes = {}    # колонка уровня -> размер группы по строкам
+
+class HierarchyStatsEngine:
+    """
+    Расчет статистик для произвольного числа уровней иерархии
+    
+    Работает поверх SortedPartitionLayout: для каждого уровня считаются
+    размеры групп, ранг ОД (доля КМ группы со строго меньшим ОД, %),
+    min-ранг по темпу (по убыванию) и процентили ОД как операции над
+    непрерывными сегментами. Стоимость линейна по числу уровней.
+    Статистики уровня считаются либо векторно (NumPy), либо ядром
+    fused_segment_stats за один проход по каждой группе (numba JIT).
+    Места по темпу внутри подвыборок (RANK_POPULATIONS) считаются той же
+    раскладкой: строки вне подвыборки уходят в конец своей группы.
+    """
+    
+    def __init__(self, levels, populations=None, kernel=None):
+        """
+        Args:
+            levels (list): Конфигурация уровней (см. HIERARCHY_LEVELS)
+            populations (dict): Подвыборки для мест по темпу (см. RANK_POPULATIONS)
+            kernel (dict): Выбор ядра расчета (см. HIERARCHY_STATS_KERNEL)
+        """
+        self.levels = levels
+        self.kernel = kernel if kernel is not None else {}
+        self.populations = {
+            name: population for name, population in (populations or {}).items() if population['enabled']
+        }
+    
+    def output_columns(self, kind):
+        """Имена колонок заданного вида для всех уровней ('od_rank', 'percentiles', 'tempo_rank', 'population_rank', 'size')"""
+        if kind == 'percentiles':
+            return [f"{level['percentile_prefix']} {p}" for level in self.levels for p in level['percentiles']]
+        if kind == 'population_rank':
+            return [
+                column for level in self.levels for population in self.populations.values()
+                for column in population['columns'].get(level['column'], ())
+            ]
+        key = {'od_rank': 'od_rank_column', 'tempo_rank': 'tempo_rank_column', 'size': 'size_column'}[kind]
+        return [level[key] for level in self.levels if level.get(key)]
+    
+    def column_order(self, layout, available_columns):
+        """Порядок колонок результата по шаблону RESULT_COLUMNS_LAYOUT"""
+        ordered = []
+        for item in layout:
+            if item.startswith('{') and item.endswith('}'):
+                ordered.extend(self.output_columns(item[1:-1]))
+            else:
+                ordered.append(item)
+        ordered = [column for column in ordered if column in available_columns]
+        return ordered + [column for column in available_columns if column not in ordered]
+    
+    def level_codes(self, df, known_codes=None, root_codes=None):
+        """
+        Коды групп для уровней, присутствующих в данных
+        
+        Args:
+            df (pd.DataFrame): Данные по КМ
+            known_codes (dict): Готовые коды групп по колонкам уровней (например, из BANK_HIERARCHY)
+            root_codes (np.ndarray): Коды корневых групп (например, период в панельном режиме);
+                все уровни вкладываются в них. None - одна корневая группа
+            
+        Returns:
+            tuple: (список активных уровней, список массивов кодов, список пропущенных колонок)
+        """
+        known_codes = known_codes or {}
+        active_levels, codes_list, skipped = [], [], []
+        if root_codes is None:
+            root_codes = np.zeros(len(df), dtype=np.int64)
+        root_codes = np.asarray(root_codes, dtype=np.int64)
+        parent_codes = root_codes
+        
+        for level in self.levels:
+            column = level['column']
+            if column is None:
+                codes = root_codes
+            elif column in known_codes:
+                codes = np.asarray(known_codes[column], dtype=np.int64)
+                if len(codes):
+                    # Готовые коды уникальны внутри справочника - вкладываем их в группы родительского
+                    # уровня: ГОСБ под разными ТБ - разные группы, даже если в раскладке они соседние
+                    codes = parent_codes * (int(codes.max()) + 1) + codes
+            elif column in df.columns:
+                own_codes, _ = pd.factorize(df[column].astype(str).to_numpy())
+                # Вложенность: одинаковые названия в разных родителях - разные группы
+                _, codes = np.unique(np.stack([parent_codes, own_codes]), axis=1, return_inverse=True)
+                codes = codes.reshape(-1).astype(np.int64)
+            else:
+                skipped.append(column)
+                continue
+            
+            active_levels.append(level)
+            codes_list.append(codes)
+            parent_codes = codes
+        
+        return active_levels, codes_list, skipped
+    
+    def use_fused_kernel(self):
+        """Считать статистики уровней ядром fused_segment_stats (см. HIERARCHY_STATS_KERNEL)"""
+        fused = self.kernel.get('fused', False)
+        return FUSED_KERNEL_JIT if fused == 'auto' else bool(fused)
+    
+    def _segment_stats(self, layout, level_index, rank_specs, quantiles, with_od_rank):
+        """
+        Ранг ОД, квантили ОД и места уровня векторными операциями NumPy над сегментами
+        
+        Args:
+            layout (SortedPartitionLayout): Раскладка строк
+            level_index (int): Индекс уровня
+            rank_specs (list): [(колонка, ключ кэша порядка, ключ сортировки)] для мест
+            quantiles (list): Квантили в долях
+            with_od_rank (bool): Считать ранг ОД
+            
+        Returns:
+            tuple: (ранг ОД или None, квантили [группы x квантили], список мест) - как fused_segment_stats
+        """
+        starts = layout.offsets[level_index]
+        sizes = layout.segment_sizes(level_index)
+        segment_ids = layout.segment_ids(level_index)
+        od_rank, quantile_values = None, np.empty((len(starts), 0), dtype=np.float64)
+        
+        if with_od_rank or quantiles:
+            od_order = layout.sorted_within_segments(level_index, 'od', layout.od_values)
+            sorted_od = layout.od_values[od_order]
+        
+        if with_od_rank:
+            # Число КМ группы со строго меньшим ОД = начало серии равных значений - начало группы
+            less_count = sorted_run_starts(segment_ids, sorted_od) - starts[segment_ids]
+            od_rank = np.empty(layout.rows, dtype=np.float64)
+            od_rank[od_order] = less_count / sizes[segment_ids] * 100
+        
+        if quantiles:
+            quantile_values = segment_quantiles(sorted_od, starts, sizes, quantiles)
+        
+        ranks = []
+        for _, order_key, key in rank_specs:
+            # min-ранг по возрастанию ключа (убыванию темпа) внутри группы
+            key_order = layout.sorted_within_segments(level_index, order_key, key)
+            run_starts = sorted_run_starts(segment_ids, key[key_order])
+            rank = np.empty(layout.rows, dtype=np.float64)
+            rank[key_order] = run_starts - starts[segment_ids] + 1
+            rank[np.isinf(key)] = np.nan
+            ranks.append(rank)
+        
+        return od_rank, quantile_values, ranks
+    
+    def compute(self, layout, levels, tempo_values, population_masks=None):
+        """
+        Расчет статистик всех уровней
+        
+        Args:
+            layout (SortedPartitionLayout): Раскладка строк
+            levels (list): Активные уровни (в том же порядке, что и коды раскладки)
+            tempo_values (np.ndarray): Темп в порядке раскладки
+            population_masks (dict): Имя подвыборки -> маска строк в порядке раскладки
+            
+        Returns:
+            HierarchyStats: Колонки статистик и размеры групп в порядке раскладки
+        """
+        population_masks = population_masks or {}
+        fused = self.use_fused_kernel()
+        stats = HierarchyStats()
+        tempo_values = np.asarray(tempo_values, dtype=np.float64)
+        # NaN темпа сортируются в конец группы и получают NaN ранга
+        tempo_key = np.where(np.isnan(tempo_values), np.inf, -tempo_values)
+        
+        for level_index, level in enumerate(levels):
+            level_key = level['column'] if level['column'] is not None else '__root__'
+            starts = layout.offsets[level_index]
+            sizes = layout.segment_sizes(level_index)
+            segment_ids = layout.segment_ids(level_index)
+            row_sizes = sizes[segment_ids]
+            stats.group_sizes[level_key] = row_sizes
+            
+            # Места по темпу: (колонка, ключ кэша порядка, ключ сортировки); ключ +inf - место пустое
+            # Строки вне подвыборки получают ключ +inf и не влияют на места строк подвыборки
+            rank_specs = []
+            if level.get('tempo_rank_column'):
+                rank_specs.append((level['tempo_rank_column'], '-tempo', tempo_key))
+            level_populations = [
+                (name, population) for name, population in self.populations.items()
+                if level['column'] in population['columns'] and name in population_masks
+            ]
+            for name, population in level_populations:
+                rank_specs.append((
+                    population['columns'][level['column']][0], f"-tempo {name}",
+                    np.where(population_masks[name], tempo_key, np.inf)
+                ))
+            quantiles = [p / 100 for p in level.get('percentiles') or []]
+            
+            if fused:
+                # Один проход по каждой группе уровня (metrics_kernels.fused_segment_stats)
+                od_rank, quantile_values, ranks = fused_segment_stats(
+                    starts, layout.od_values, [key for _, _, key in rank_specs], quantiles,
+                    with_od_rank=bool(level.get('od_rank_column'))
+                )
+            else:
+                od_rank, quantile_values, ranks = self._segment_stats(layout, level_index, rank_specs, quantiles,
+                                                                      bool(level.get('od_rank_column')))
+            
+            if level.get('od_rank_column'):
+                stats.columns[level['od_rank_column']] = np.round(od_rank, 2)
+            for index, p in enumerate(level.get('percentiles') or []):
+                stats.columns[f"{level['percentile_prefix']} {p}"] = quantile_values[segment_ids, index]
+            for (column, _, _), rank in zip(rank_specs, ranks):
+                stats.columns[column] = rank
+            for name, population in level_populations:
+                size_column = population['columns'][level['column']][1]
+                stats.columns[size_column] = np.add.reduceat(population_masks[name].astype(np.int64), starts)[segment_ids]
+            
+            if level.get('size_column'):
+                stats.columns[level['size_column']] = row_sizes
+        
+        return stats
+
+# Движок статистик для уровней из HIERARCHY_LEVELS
+HIERARCHY_STATS_ENGINE = HierarchyStatsEngine(HIERARCHY_LEVELS, RANK_POPULATIONS, HIERARCHY_STATS_KERNEL)
+
+# =============================================================================
+# КЛАСС ДЛЯ ЛОГИРОВАНИЯ
+# =============================================================================
+
+class DataProcessorLogger:
+    """Класс для управления логированием программы"""
+    
+    def __init__(self, log_dir, log_name, log_extension, suffix_format, level="INFO"):
+        """
+        Инициализация логгера
+        
+        Args:
+            log_dir (str): Директория для логов
+            log_name (str): Имя лог-файла без расширения
+            log_extension (str): Расширение лог-файла
+            suffix_format (str): Формат суффикса для имени файла
+            level (str): Уровень логирования (INFO/DEBUG)
+        """
+        self.log_dir = Path(log_dir)
+        self.log_name = log_name
+        self.log_extension = log_extension
+        self.suffix_format = suffix_format
+        self.level = level.upper()
+        
+        # Создаем директорию для логов если её нет
+        self.log_dir.mkdir(parents=True, exist_ok=True)
+        
+        # Формируем имя лог-файла с суффиксом
+        timestamp = datetime.now().strftime(suffix_format.replace("YYYY", "%Y").replace("MM", "%m").replace("DD", "%d"))
+        self.log_filename = f"{log_name}-{level}{timestamp}{log_extension}"
+        self.log_filepath = self.log_dir / self.log_filename
+        
+        # Настраиваем логирование
+        self._setup_logging()
+    
+    def _setup_logging(self):
+        """Настройка системы логирования"""
+        # Определяем уровень логирования
+        log_level = logging.DEBUG if self.level == "DEBUG" else logging.INFO
+        
+        # Настраиваем форматтер
+        formatter = logging.Formatter(
+            '%(asctime)s - %(levelname)s - %(message)s',
+            datefmt='%Y-%m-%d %H:%M:%S'
+        )
+        
+        # Настраиваем файловый хендлер
+        file_handler = logging.FileHandler(self.log_filepath, encoding='utf-8')
+        file_handler.setLevel(log_level)
+        file_handler.setFormatter(formatter)
+        
+        # Настраиваем консольный хендлер
+        console_handler = logging.StreamHandler()
+        console_handler.setLevel(log_level)
+        console_handler.setFormatter(formatter)
+        
+        # Настраиваем корневой логгер
+        self.logger = logging.getLogger(__name__)
+        self.logger.setLevel(log_level)
+        self.logger.addHandler(file_handler)
+        self.logger.addHandler(console_handler)
+        
+        # Очищаем хендлеры чтобы избежать дублирования
+        self.logger.handlers.clear()
+        self.logger.addHandler(file_handler)
+        self.logger.addHandler(console_handler)
+    
+    def log_info(self, message):
+        """Логирование информационного сообщения"""
+        self.logger.info(message)
+    
+    def log_debug(self, message):
+        """Логирование отладочного сообщения"""
+        self.logger.debug(message)
+    
+    def log_error(self, message):
+        """Логирование ошибки"""
+        self.logger.error(message)
+    
+    def log_start(self):
+        """Логирование начала работы программы"""
+        self.log_info(LOG_MESSAGES["start"])
+    
+    def log_end(self):
+        """Логирование завершения работы программы"""
+        self.log_info(LOG_MESSAGES["end"])
+
+class NullLogger:
+    """Логгер без вывода и файлов (интерфейс DataProcessorLogger) для расчета в памяти"""
+    
+    level = "INFO"
+    
+    def log_info(self, message):
+        pass
+    
+    def log_debug(self, message):
+        pass
+    
+    def log_error(self, message):
+        pass
+    
+    def log_start(self):
+        pass
+    
+    def log_end(self):
+        pass
+
+# =============================================================================
+# МЕТРИКИ ВЫПОЛНЕНИЯ (ФОРМАТ PROMETHEUS)
+# =============================================================================
+
+def peak_rss_bytes():
+    """
+    Пиковая резидентная память процесса и его дочерних процессов (пулов)
+    
+    Returns:
+        dict: {'main': байт, 'workers': байт}; пустой, если модуль resource недоступен
+    """
+    if resource is None:
+        return {}
+    # ru_maxrss в Linux - в килобайтах, в macOS - в байтах
+    scale = 1 if sys.platform == 'darwin' else 1024
+    return {
+        'main': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale,
+        'workers': resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * scale
+    }
+
+def input_pair_label(input_files=None):
+    """Метка input для режима обработки: имена входных файлов через '|'"""
+    return "|".join(f"{file_config['name']}{file_config['extension']}" for file_config in (input_files or INPUT_FILES))
+
+class RunMetrics:
+    """
+    Метрики одного запуска (этапы, строки, пропускная способность, память)
+    
+    Значения накапливаются методами обработки, а в конце запуска выводятся
+    в текстовом формате Prometheus. Все метрики - gauge: файл описывает
+    последний запуск и перезаписывается целиком.
+    """
+    
+    def __init__(self, mode, input_label):
+        """
+        Args:
+            mode (str): Режим программы (метка mode)
+            input_label (str): Входные данные (метка input)
+        """
+        self.labels = {'mode': mode, 'input': input_label}
+        self.stage_seconds = {}
+        self.rows_loaded = {}
+        self.rows_output = 0
+        self.unique_tn = None
+    
+    def record_stage(self, stage, seconds):
+        """Длительность этапа (повторные вызовы суммируются)"""
+        self.stage_seconds[stage] = self.stage_seconds.get(stage, 0.0) + seconds
+    
+    def record_rows_loaded(self, file_name, rows):
+        """Количество строк, загруженных из файла"""
+        self.rows_loaded[file_name] = rows
+    
+    @staticmethod
+    def _escape(value):
+        """Экранирование значения метки (обратная косая черта, кавычка, перевод строки)"""
+        return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+    
+    def _sample(self, name, value, **extra_labels):
+        """Строка значения метрики с общими и дополнительными метками"""
+        labels = dict(self.labels, **extra_labels)
+        label_text = ",".join(f'{key}="{self._escape(label)}"' for key, label in labels.items())
+        value = float(value)
+        value_text = str(int(value)) if value.is_integer() else repr(round(value, 6))
+        return f"{name}{{{label_text}}} {value_text}"
+    
+    def render(self, prefix, duration, errors_count, outputs_created):
+        """
+        Текст метрик в формате Prometheus
+        
+        Args:
+            prefix (str): Префикс имен метрик
+            duration (float): Длительность запуска, сек
+            errors_count (int): Количество ошибок
+            outputs_created (int): Количество созданных файлов
+        
+        Returns:
+            str: Текст метрик (заканчивается переводом строки)
+        """
+        metrics = [
+            ('run_duration_seconds', "Длительность запуска", [self._sample(f"{prefix}_run_duration_seconds", duration)]),
+            ('stage_duration_seconds', "Длительность этапа запуска",
+             [self._sample(f"{prefix}_stage_duration_seconds", seconds, stage=stage) for stage, seconds in self.stage_seconds.items()]),
+            ('rows_loaded', "Строк загружено из входного файла",
+             [self._sample(f"{prefix}_rows_loaded", rows, file=file_name) for file_name, rows in self.rows_loaded.items()]),
+            ('rows_output', "Строк в результате", [self._sample(f"{prefix}_rows_output", self.rows_output)]),
+            ('unique_tn', "Уникальных ТН",
+             [self._sample(f"{prefix}_unique_tn", self.unique_tn)] if self.unique_tn is not None else []),
+            ('rows_per_second', "Строк результата в секунду за весь запуск",
+             [self._sample(f"{prefix}_rows_per_second", self.rows_output / duration if duration > 0 else 0)]),
+            ('peak_rss_bytes', "Пиковая резидентная память (main - основной процесс, workers - процессы пулов)",
+             [self._sample(f"{prefix}_peak_rss_bytes", size, process=process) for process, size in peak_rss_bytes().items()]),
+            ('errors_count', "Количество ошибок запуска", [self._sample(f"{prefix}_errors_count", errors_count)]),
+            ('outputs_created', "Количество созданных файлов", [self._sample(f"{prefix}_outputs_created", outputs_created)]),
+            ('last_run_timestamp_seconds', "Время завершения запуска (unix time)",
+             [self._sample(f"{prefix}_last_run_timestamp_seconds", time.time())])
+        ]
+        
+        lines = []
+        for name, help_text, samples in metrics:
+            if not samples:
+                continue
+            lines.append(f"# HELP {prefix}_{name} {help_text}")
+            lines.append(f"# TYPE {prefix}_{name} gauge")
+            lines.extend(samples)
+        return "\n".join(lines) + "\n"
+    
+    def write(self, work_dir, duration, errors_count, outputs_created):
+        """
+        Запись файла метрик по METRICS_SETTINGS (через временный файл и переименование)
+        
+        Returns:
+            Path: Путь к файлу метрик
+        """
+        metrics_dir = Path(work_dir) / METRICS_SETTINGS["folder"]
+        metrics_dir.mkdir(parents=True, exist_ok=True)
+        file_path = metrics_dir / f"{METRICS_SETTINGS['prefix']}_{self.labels['mode']}{METRICS_SETTINGS['extension']}"
+        temp_path = file_path.with_name(f".{file_path.name}.{os.getpid()}.tmp")
+        temp_path.write_text(
+            self.render(METRICS_SETTINGS["prefix"], duration, errors_count, outputs_created), encoding='utf-8'
+        )
+        os.replace(temp_path, file_path)
+        return file_path
+
+# =============================================================================
+# ПАРАЛЛЕЛЬНАЯ ГЕНЕРАЦИЯ ТЕСТОВЫХ ДАННЫХ
+# =============================================================================
+
+def build_fio_table():
+    """
+    Все сочетания ФИО (мужские, затем женские) одним массивом
+    
+    Равномерный выбор из таблицы дает тот же 50/50 выбор пола и равномерный
+    выбор имени, отчества и фамилии, что и построчная генерация.
+    
+    Returns:
+        np.ndarray: Массив строк ФИО (object)
+    """
+    fio_list = []
+    for gender in ("male", "female"):
+        for last_name in FIO_NAME_PARTS["last_names"]:
+            for first_name in FIO_NAME_PARTS[f"first_names_{gender}"]:
+                for middle_name in FIO_NAME_PARTS[f"middle_names_{gender}"]:
+                    fio_list.append(f"{last_name} {first_name} {middle_name}")
+    return np.array(fio_list, dtype=object)
+
+def split_counts(total, parts):
+    """
+    Разбиение количества на части, отличающиеся не более чем на 1
+    
+    Returns:
+        list: Размеры частей
+    """
+    quotient, remainder = divmod(total, parts)
+    return [quotient + (1 if index < remainder else 0) for index in range(parts)]
+
+def resolve_generation_params(profile_name=None):
+    """
+    Параметры генерации: DATA_PARAMS + значения по умолчанию + переопределения профиля
+    
+    Args:
+        profile_name (str): Имя профиля из DISTRIBUTION_PROFILES (None - из DATA_PARAMS)
+        
+    Returns:
+        dict: Параметры генерации
+    """
+    profile_name = profile_name or DATA_PARAMS.get("distribution_profile", "uniform")
+    if profile_name not in DISTRIBUTION_PROFILES:
+        raise ValueError(f"Неизвестный профиль распределения: {profile_name}")
+    
+    params = dict(DATA_PARAMS)
+    params.update(GENERATION_PROFILE_DEFAULTS)
+    params.update(DISTRIBUTION_PROFILES[profile_name])
+    params["distribution_profile"] = profile_name
+    return params
+
+def draw_income(rng, low, high, size, tie_values=None):
+    """
+    Случайный ОД в диапазоне [low, high]
+    
+    При заданном tie_values значения берутся из сетки tie_values равноотстоящих
+    точек диапазона - много одинаковых ОД и, как следствие, темпов.
+    
+    Returns:
+        np.ndarray: int64
+    """
+    if tie_values is None:
+        return rng.integers(low, high + 1, size=size)
+    steps = rng.integers(tie_values, size=size)
+    return low + (high - low) * steps // max(tie_values - 1, 1)
+
+def plan_generation_shards(total_employees, seed, shard_size, params=None):
+    """
+    План частей генерации: размеры, дочерние зерна и диапазоны ТН
+    
+    План зависит только от total_employees, seed и shard_size, поэтому
+    результат генерации не зависит от числа процессов.
+    
+    Args:
+        total_employees (int): Количество сотрудников в файле 1
+        seed (int): Главное зерно
+        shard_size (int): Сотрудников в одной части
+        params (dict): Параметры генерации (None - resolve_generation_params())
+        
+    Returns:
+        list: Задачи для generate_employee_shard
+    """
+    params = params or resolve_generation_params()
+    shard_count = max(1, -(-total_employees // shard_size))
+    overlap_total = int(total_employees * params["employee_overlap"])
+    new_total = int(total_employees * params["new_employees_share"])
+    
+    # Диапазон ТН: номера короче total_digits, чтобы у ТН всегда были лидирующие нули
+    tn_format = COLUMN_SPECIAL_FORMATS.get('ТН 10', {})
+    total_digits = tn_format.get('total_digits', 10)
+    tn_min = tn_format.get('min_value', 1)
+    tn_max = 10 ** (total_digits - 1) - 1
+    tn_space = tn_max - tn_min + 1
+    
+    child_seeds = np.random.SeedSequence(seed).spawn(shard_count)
+    
+    tasks = []
+    for index, (base_count, overlap_count, new_count) in enumerate(zip(
+        split_counts(total_employees, shard_count),
+        split_counts(overlap_total, shard_count),
+        split_counts(new_total, shard_count)
+    )):
+        tasks.append({
+            'seed': child_seeds[index],
+            'tn_range': (tn_min + tn_space * index // shard_count, tn_min + tn_space * (index + 1) // shard_count),
+            'tn_digits': total_digits,
+            'base_count': base_count,
+            'overlap_count': overlap_count,
+            'new_count': new_count,
+            'params': params,
+            'file_paths': None
+        })
+    return tasks
+
+def generate_employee_shard(task):
+    """
+    Генерация одной части сотрудников (используется в пуле процессов)
+    
+    Часть возвращается компактными массивами кодов и чисел (строки ТН, ФИО,
+    ТБ и ГОСБ собираются в build_generation_frames), чтобы передача результата
+    между процессами была дешевой. Если в задаче задан 'file_paths', часть
+    сразу собирается в DataFrame'ы и пишется в эти файлы.
+    
+    Args:
+        task (dict): Задача из plan_generation_shards
+            
+    Returns:
+        dict: Массивы части или (строк в файле 1, строк в файле 2), если часть записана в файлы
+    """
+    rng = np.random.default_rng(task['seed'])
+    params = task['params']
+    base_count = task['base_count']
+    employee_count = base_count + task['new_count']
+    hierarchy = BANK_HIERARCHY
+    
+    # Уникальные ТН внутри отрезка части (отрезки частей не пересекаются)
+    tn_start, tn_stop = task['tn_range']
+    tn_numbers = tn_start + rng.choice(tn_stop - tn_start, size=employee_count, replace=False)
+    fio_codes = rng.integers(len(build_fio_table()), size=employee_count)
+    
+    if params["group_distribution"] == 'zipf':
+        # ГОСБ по закону Ципфа (по порядку BANK_STRUCTURE), ТБ - родитель ГОСБ
+        weights = 1.0 / np.arange(1, len(hierarchy.gosb_names) + 1) ** params["zipf_exponent"]
+        gosb_codes = rng.choice(len(hierarchy.gosb_names), size=employee_count, p=weights / weights.sum())
+        tb_codes = hierarchy.gosb_parent[gosb_codes]
+    else:
+        # ТБ равномерно, ГОСБ равномерно внутри выбранного ТБ
+        tb_codes = rng.integers(len(hierarchy.tb_names), size=employee_count)
+        gosb_codes = hierarchy.gosb_offsets[tb_codes] + rng.integers(hierarchy.tb_gosb_counts[tb_codes])
+    effective = rng.random(employee_count) < params["effective_share"]
+    
+    # Базовый доход - от 60% до 90% минимального финального дохода
+    final_min = params["operational_income_final_min"]
+    tie_values = params["od_tie_values"]
+    base_income = draw_income(rng, int(final_min * 0.6), int(final_min * 0.9), base_count, tie_values)
+    income_july = draw_income(rng, final_min, params["operational_income_final_max"], employee_count, tie_values)
+    
+    # Нулевой прошлый ОД и отрицательный ОД (особые случаи темпа)
+    if params["zero_previous_share"] > 0:
+        base_income[rng.random(base_count) < params["zero_previous_share"]] = 0
+    if params["negative_od_share"] > 0:
+        negative = rng.random(employee_count) < params["negative_od_share"]
+        income_july[negative] = -income_july[negative]
+        base_income[negative[:base_count]] = -base_income[negative[:base_count]]
+    
+    # Файл 2: оставшиеся сотрудники (в случайном порядке), затем новые
+    rows2 = np.concatenate([
+        rng.choice(base_count, size=task['overlap_count'], replace=False),
+        np.arange(base_count, employee_count)
+    ])
+    # Доход на 20 августа не меньше дохода на 31 июля
+    current_max = params["operational_income_current_max"]
+    if tie_values is None:
+        income_august = rng.integers(income_july[rows2], current_max + 1)
+    else:
+        income_august = np.maximum(income_july[rows2], draw_income(rng, final_min, current_max, len(rows2), tie_values))
+    
+    part = {
+        'tn_numbers': tn_numbers,
+        'fio_codes': fio_codes,
+        'tb_codes': tb_codes,
+        'gosb_codes': gosb_codes,
+        'effective': effective,
+        'base_income': base_income,
+        'income_july': income_july,
+        'rows2': rows2,
+        'income_august': income_august,
+        'tn_digits': task['tn_digits']
+    }
+    if task['file_paths'] is None:
+        return part
+    
+    df1, df2 = build_generation_frames([part])
+    for df, file_path in zip((df1, df2), task['file_paths']):
+        write_table_file(df, file_path)
+    return len(df1), len(df2)
+
+def build_generation_frames(parts):
+    """
+    Сборка DataFrame'ов файлов 1 и 2 из частей generate_employee_shard
+    
+    Части склеиваются в порядке плана, поэтому результат не зависит от числа процессов.
+    
+    Args:
+        parts (list): Массивы частей
+        
+    Returns:
+        tuple: (df1, df2) - данные на 31 июля и на 20 августа 2025 года
+    """
+    def joined(key):
+        return np.concatenate([part[key] for part in parts])
+    
+    # Номера строк файла 2 внутри части -> номера строк всех сотрудников
+    employee_offsets = np.cumsum([0] + [len(part['tn_numbers']) for part in parts[:-1]])
+    rows2 = np.concatenate([part['rows2'] + offset for part, offset in zip(parts, employee_offsets)])
+    base_rows = np.concatenate([
+        offset + np.arange(len(part['base_income'])) for part, offset in zip(parts, employee_offsets)
+    ])
+    
+    hierarchy = BANK_HIERARCHY
+    tn_values = ("TN_" + pd.Series(joined('tn_numbers')).astype(str).str.zfill(parts[0]['tn_digits'])).to_numpy(dtype=object)
+    fio_values = build_fio_table()[joined('fio_codes')]
+    tb_values = hierarchy.tb_names[joined('tb_codes')]
+    gosb_values = hierarchy.gosb_names[joined('gosb_codes')]
+    effective_values = np.where(joined('effective'), "👍", "👎").astype(object)
+    income_july = joined('income_july')
+    income_august = joined('income_august')
+    
+    df1 = pd.DataFrame({
+        'ТН 10': tn_values[base_rows],
+        'ТБ': tb_values[base_rows],
+        'ГОСБ': gosb_values[base_rows],
+        'КМ': fio_values[base_rows],
+        'Эффективный КМ': effective_values[base_rows],
+        '2025, тыс. руб.': income_july[base_rows],
+        '2024, тыс. руб. на конец месяца': joined('base_income'),
+        'ОД конец квартала, тыс. руб.': income_july[base_rows]
+    })
+    df2 = pd.DataFrame({
+        'ТН 10': tn_values[rows2],
+        'ТБ': tb_values[rows2],
+        'ГОСБ': gosb_values[rows2],
+        'КМ': fio_values[rows2],
+        'Эффективный КМ': effective_values[rows2],
+        '2025, тыс. руб.': income_august,
+        '2024, тыс. руб. на конец месяца': income_july[rows2],
+        'ОД конец квартала, тыс. руб.': income_august
+    })
+    
+    # Прирост считается векторно по всем строкам файла
+    add_growth_columns(df1)
+    add_growth_columns(df2)
+    return df1, df2
+
+def add_growth_columns(df):
+    """
+    Добавление колонок 'Прирост, %' и 'Прирост, тыс. руб.' (векторно, по всему DataFrame)
+    
+    Args:
+        df (pd.DataFrame): Данные файла с колонками дохода
+    """
+    income_current = df['2025, тыс. руб.'].to_numpy()
+    income_base = df['2024, тыс. руб. на конец месяца'].to_numpy()
+    position = df.columns.get_loc('2024, тыс. руб. на конец месяца') + 1
+    df.insert(position, 'Прирост, %', growth_percent(income_current, income_base))
+    df.insert(position + 1, 'Прирост, тыс. руб.', growth(income_current, income_base))
+
+def write_table_file(df, file_path):
+    """
+    Запись таблицы в файл, формат - по расширению
+    
+    .xlsx пишется потоково (openpyxl write_only: строки не держатся в памяти
+    как объекты ячеек), .csv - с разделителем и кодировкой из CSV_SETTINGS,
+    .parquet - через pandas (нужен pyarrow или fastparquet).
+    
+    Args:
+        df (pd.DataFrame): Данные
+        file_path (str | Path): Путь к файлу
+        
+    Returns:
+        str: Путь к записанному файлу
+    """
+    extension = Path(file_path).suffix.lower()
+    if extension == '.csv':
+        df.to_csv(file_path, sep=CSV_SETTINGS["sep"], encoding=CSV_SETTINGS["encoding"], index=False)
+    elif extension == '.parquet':
+        df.to_parquet(file_path, index=False)
+    elif extension == '.xlsx':
+        workbook = Workbook(write_only=True)
+        worksheet = workbook.create_sheet()
+        worksheet.append(list(df.columns))
+        for row in df.itertuples(index=False, name=None):
+            worksheet.append(row)
+        workbook.save(file_path)
+    else:
+        raise ValueError(f"Неподдерживаемый формат файла: {extension}")
+    return str(file_path)
+
+def write_table_task(task):
+    """Запись одной таблицы (используется в пуле процессов): task = (DataFrame, путь)"""
+    return write_table_file(*task)
+
+def read_table_file(file_path):
+    """
+    Чтение таблицы из файла, формат - по расширению (.xlsx, .csv, .parquet)
+    
+    ТН 10 в CSV читается как текст, чтобы сохранить лидирующие нули.
+    
+    Args:
+        file_path (Path): Путь к файлу
+        
+    Returns:
+        pd.DataFrame: Данные файла
+    """
+    extension = Path(file_path).suffix.lower()
+    if extension == '.csv':
+        return pd.read_csv(file_path, sep=CSV_SETTINGS["sep"], encoding=CSV_SETTINGS["encoding"], dtype={'ТН 10': str})
+    if extension == '.parquet':
+        return pd.read_parquet(file_path)
+    return pd.read_excel(file_path)
+
+def read_table_chunks(file_path, chunk_rows):
+    """
+    Чтение таблицы частями по chunk_rows строк (формат - по расширению)
+    
+    .xlsx читается потоково через openpyxl read_only, .csv - через chunksize,
+    .parquet - по группам строк (нужен pyarrow; без него - одной частью).
+    
+    Args:
+        file_path (Path): Путь к файлу
+        chunk_rows (int): Строк в части
+    
+    Yields:
+        pd.DataFrame: Очередная часть
+    """
+    extension = Path(file_path).suffix.lower()
+    if extension == '.csv':
+        yield from pd.read_csv(file_path, sep=CSV_SETTINGS["sep"], encoding=CSV_SETTINGS["encoding"],
+                               dtype={'ТН 10': str}, chunksize=chunk_rows)
+    elif extension == '.parquet':
+        if ARROW_STRING_DTYPE is None:
+            yield pd.read_parquet(file_path)
+            return
+        import pyarrow.parquet as pq
+        for batch in pq.ParquetFile(file_path).iter_batches(batch_size=chunk_rows):
+            yield batch.to_pandas()
+    else:
+        workbook = load_workbook(file_path, read_only=True, data_only=True)
+        try:
+            rows = workbook.worksheets[0].iter_rows(values_only=True)
+            header = list(next(rows, ()))
+            chunk = []
+            for row in rows:
+                chunk.append(row)
+                if len(chunk) == chunk_rows:
+                    yield pd.DataFrame(chunk, columns=header)
+                    chunk = []
+            if chunk or not header:
+                yield pd.DataFrame(chunk, columns=header)
+        finally:
+            workbook.close()
+
+def concat_compact_frames(frames):
+    """
+    Объединение частей таблицы с сохранением category (словари частей объединяются)
+    
+    Args:
+        frames (list): Части (pd.DataFrame) с одинаковыми колонками
+    
+    Returns:
+        pd.DataFrame: Объединенная таблица
+    """
+    if len(frames) == 1:
+        return frames[0]
+    for column_name in frames[0].columns:
+        if all(isinstance(frame[column_name].dtype, pd.CategoricalDtype) for frame in frames):
+            categories = pd.api.types.union_categoricals([frame[column_name] for frame in frames]).categories
+            for frame in frames:
+                frame[column_name] = frame[column_name].cat.set_categories(categories)
+    return pd.concat(frames, ignore_index=True)
+
+def count_table_rows(file_path):
+    """
+    Число строк данных файла без полной загрузки
+    
+    .csv - подсчет переводов строк, .xlsx - размер первого листа из тега
+    dimension или подсчет тегов строк в XML листа (без разбора ячеек),
+    .parquet - метаданные (нужен pyarrow). Если быстро узнать нельзя -
+    оценка по размеру файла (PLANNER_SETTINGS['row_bytes']['input'] на строку).
+    
+    Args:
+        file_path (Path): Путь к файлу
+    
+    Returns:
+        int: Число строк данных (без заголовка)
+    """
+    extension = Path(file_path).suffix.lower()
+    if extension == '.csv':
+        newlines = 0
+        with open(file_path, 'rb') as table_file:
+            for block in iter(lambda: table_file.read(1 << 24), b''):
+                newlines += block.count(b'\n')
+        return max(newlines - 1, 0)
+    if extension == '.parquet' and ARROW_STRING_DTYPE is not None:
+        import pyarrow.parquet as pq
+        return pq.ParquetFile(file_path).metadata.num_rows
+    if extension == '.xlsx':
+        with zipfile.ZipFile(file_path) as archive:
+            sheet_names = [name for name in archive.namelist() if re.fullmatch(r'xl/worksheets/sheet\d+\.xml', name)]
+            if sheet_names:
+                first_sheet = min(sheet_names, key=lambda name: int(re.search(r'(\d+)\.xml$', name).group(1)))
+                with archive.open(first_sheet) as sheet:
+                    head = sheet.read(4096)
+                    dimension = re.search(rb'<(?:\w+:)?dimension ref="[A-Z]+\d+:[A-Z]+(\d+)"', head)
+                    if dimension:
+                        return max(int(dimension.group(1)) - 1, 0)
+                    # Лист без dimension (потоковая запись) - считаем теги <row> блоками
+                    rows, rest = 0, head
+                    for block in iter(lambda: sheet.read(1 << 24), b''):
+                        data = rest + block
+                        cut = data.rfind(b'<')
+                        rows += len(re.findall(rb'<(?:\w+:)?row[\s>/]', data[:cut]))
+                        rest = data[cut:]
+                    rows += len(re.findall(rb'<(?:\w+:)?row[\s>/]', rest))
+                    return max(rows - 1, 0)
+    return Path(file_path).stat().st_size // PLANNER_SETTINGS["row_bytes"]["input"]
+
+# =============================================================================
+# КЛАСС ДЛЯ СОЗДАНИЯ ТЕСТОВЫХ ДАННЫХ
+# =============================================================================
+
+class TestDataGenerator:
+    """Класс для создания тестовых данных для анализа эффективности"""
+    
+    def __init__(self, work_dir, logger):
+        """
+        Инициализация генератора тестовых данных
+        
+        Args:
+            work_dir (str): Рабочая директория
+            logger (DataProcessorLogger): Объект логгера
+        """
+        self.work_dir = Path(work_dir)
+        self.logger = logger
+        self.start_time = None
+        self.errors_count = 0
+        self.files_created = 0
+        self.employees_created = 0
+        self.metrics = RunMetrics('create-test', DATA_PARAMS["distribution_profile"])
+        
+        # Создаем необходимые директории
+        self._create_directories()
+        
+        # Создаем распределение ГОСБ по ТБ
+        self._create_tb_gosb_mapping()
+    
+    def _create_directories(self):
+        """Создание необходимых директорий"""
+        directories = [
+            self.work_dir / INPUT_FOLDER,
+            self.work_dir / OUTPUT_FOLDER,
+            self.work_dir / LOGS_FOLDER
+        ]
+        
+        for directory in directories:
+            directory.mkdir(parents=True, exist_ok=True)
+            self.logger.log_debug(LOG_MESSAGES["directory_ready"].format(directory))
+    
+    def _create_tb_gosb_mapping(self):
+        """Создание распределения ГОСБ по ТБ из индекса иерархии"""
+        self.hierarchy = BANK_HIERARCHY
+        self.tb_gosb_mapping = {
+            tb: list(self.hierarchy.gosb_names[self.hierarchy.gosb_codes_of_tb(tb_code)])
+            for tb_code, tb in enumerate(self.hierarchy.tb_names)
+        }
+        
+        self.logger.log_debug(LOG_MESSAGES["tb_mapping_created"].format(len(self.tb_gosb_mapping)))
+    
+    def create_sample_data(self):
+        """Создание тестовых данных для анализа эффективности"""
+        self.start_time = time.time()
+        
+        try:
+            self.logger.log_info(LOG_MESSAGES["data_generation_start"])
+            
+            # Главное зерно: заданное или случайное (пишется в лог для повторения генерации)
+            seed = GENERATION_SETTINGS["seed"]
+            if seed is None:
+                seed = np.random.SeedSequence().entropy
+            params = resolve_generation_params()
+            self.logger.log_info(LOG_MESSAGES["generation_profile"].format(
+                params["distribution_profile"], DISTRIBUTION_PROFILES[params["distribution_profile"]]
+            ))
+            tasks = plan_generation_shards(DATA_PARAMS["total_employees"], seed, GENERATION_SETTINGS["shard_size"], params)
+            workers = min(len(tasks), GENERATION_SETTINGS["workers"] or os.cpu_count() or 1)
+            self.logger.log_info(LOG_MESSAGES["generation_planned"].format(
+                DATA_PARAMS["total_employees"], len(tasks), workers, seed
+            ))
+            
+            if GENERATION_SETTINGS["output"] == 'shards':
+                # Каждая часть сразу пишется в свои файлы в процессе-исполнителе
+                timestamp = datetime.now().strftime("_%Y%m%d_%H%M%S")
+                file_format = GENERATION_SETTINGS["file_format"]
+                for number, task in enumerate(tasks, start=1):
+                    task['file_paths'] = tuple(
+                        str(self.work_dir / INPUT_FOLDER / f"{prefix}{timestamp}_part{number:03d}{file_format}")
+                        for prefix in ("data1", "data2")
+                    )
+            
+            stage_start = time.time()
+            results = self._run_shard_tasks(tasks, workers)
+            self.metrics.record_stage('generate', time.time() - stage_start)
+            
+            if GENERATION_SETTINGS["output"] == 'shards':
+                self.employees_created = sum(rows1 + rows2 for rows1, rows2 in results)
+                self.files_created += 2 * len(tasks)
+                self.logger.log_info(LOG_MESSAGES["generation_shard_files"].format(
+                    2 * len(tasks), f"data1{timestamp}_partNNN{file_format}, data2{timestamp}_partNNN{file_format}"
+                ))
+            else:
+                # Данные на 31 июля и на 20 августа 2025 года
+                df1, df2 = build_generation_frames(results)
+                self.employees_created = len(df1) + len(df2)
+                self.metrics.unique_tn = pd.concat([df1['ТН 10'], df2['ТН 10']], ignore_index=True).nunique()
+                
+                # Анализируем распределение
+                self._analyze_distribution(df1, df2)
+                
+                # Сохраняем файлы
+                stage_start = time.time()
+                self._save_data_files(df1, df2)
+                self.metrics.record_stage('save', time.time() - stage_start)
+            
+            self.logger.log_info(LOG_MESSAGES["data_generation_end"])
+            
+        except Exception as e:
+            error_msg = LOG_MESSAGES["generation_error"].format(str(e))
+            self.logger.log_error(error_msg)
+            self.logger.log_debug(LOG_MESSAGES["details_error"].format(traceback.format_exc()))
+            self.errors_count += 1
+        
+        finally:
+            # Генерируем сводку
+            self._generate_summary()
+    
+    def _run_shard_tasks(self, tasks, workers):
+        """
+        Выполнение задач генерации частей (в пуле процессов, если процессов больше одного)
+        
+        Returns:
+            list: Результаты generate_employee_shard в порядке задач
+        """
+        if workers > 1:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                return list(executor.map(generate_employee_shard, tasks))
+        return [generate_employee_shard(task) for task in tasks]
+    
+    def _analyze_distribution(self, df1, df2):
+        """Анализ распределения данных по двум файлам"""
+        # Анализ файла 1 (31 июля 2025 года)
+        self.logger.log_info(LOG_MESSAGES["analysis_file1"])
+        tb_distribution_1 = df1['ТБ'].value_counts()
+        self.logger.log_info(LOG_MESSAGES["tb_distribution"].format(dict(tb_distribution_1)))
+        
+        effective_distribution_1 = df1['Эффективный КМ'].value_counts()
+        self.logger.log_info(LOG_MESSAGES["effective_distribution"].format(dict(effective_distribution_1)))
+        
+        # Анализ файла 2 (20 августа 2025 года)
+        self.logger.log_info(LOG_MESSAGES["analysis_file2"])
+        tb_distribution_2 = df2['ТБ'].value_counts()
+        self.logger.log_info(LOG_MESSAGES["tb_distribution"].format(dict(tb_distribution_2)))
+        
+        effective_distribution_2 = df2['Эффективный КМ'].value_counts()
+        self.logger.log_info(LOG_MESSAGES["effective_distribution"].format(dict(effective_distribution_2)))
+        
+        # Анализ перекрытия сотрудников
+        self.logger.log_info(LOG_MESSAGES["analysis_overlap"])
+        employees_july = set(df1['ТН 10'])
+        employees_august = set(df2['ТН 10'])
+        
+        overlap_employees = employees_july.intersection(employees_august)
+        new_employees = employees_august - employees_july
+        removed_employees = employees_july - employees_august
+        
+        self.logger.log_info(LOG_MESSAGES["employees_july_count"].format(len(employees_july)))
+        self.logger.log_info(LOG_MESSAGES["employees_august_count"].format(len(employees_august)))
+        self.logger.log_info(LOG_MESSAGES["overlap_info_detailed"].format(len(overlap_employees), len(overlap_employees)/len(employees_july)*100))
+        self.logger.log_info(LOG_MESSAGES["new_employees_info_detailed"].format(len(new_employees), len(new_employees)/len(employees_august)*100))
+        self.logger.log_info(LOG_MESSAGES["removed_employees_info_detailed"].format(len(removed_employees), len(removed_employees)/len(employees_july)*100))
+        
+        # Проверяем уникальность ТН и ФИО в каждом файле
+        unique_tn_1 = df1['ТН 10'].nunique()
+        unique_fio_1 = df1['КМ'].nunique()
+        unique_tn_2 = df2['ТН 10'].nunique()
+        unique_fio_2 = df2['КМ'].nunique()
+        
+        self.logger.log_debug(LOG_MESSAGES["file1_info"].format(unique_tn_1, unique_fio_1))
+        self.logger.log_debug(LOG_MESSAGES["file2_info"].format(unique_tn_2, unique_fio_2))
+        
+        if unique_tn_1 != len(df1):
+            self.logger.log_error(LOG_MESSAGES["duplicate_tn_error"])
+        if unique_tn_2 != len(df2):
+            self.logger.log_error(LOG_MESSAGES["duplicate_tn_error"])
+        # ФИО выбираются из конечного набора сочетаний и могут повторяться
+        if unique_fio_1 != len(df1) or unique_fio_2 != len(df2):
+            self.logger.log_debug(LOG_MESSAGES["duplicate_fio_info"].format(len(df1) - unique_fio_1, len(df2) - unique_fio_2))
+    
+    def _save_data_files(self, df1, df2):
+        """Сохранение данных в два файла (файлы пишутся одновременно в двух процессах)"""
+        try:
+            # Формируем имена файлов с временной меткой
+            timestamp = datetime.now().strftime("_%Y%m%d_%H%M%S")
+            file_format = GENERATION_SETTINGS["file_format"]
+            filename1 = f"data1{timestamp}{file_format}"  # Файл на 31 июля 2025 года
+            filename2 = f"data2{timestamp}{file_format}"  # Файл на 20 августа 2025 года
+            
+            file_path1 = self.work_dir / INPUT_FOLDER / filename1
+            file_path2 = self.work_dir / INPUT_FOLDER / filename2
+            tasks = [(df1, file_path1), (df2, file_path2)]
+            
+            if GENERATION_SETTINGS["workers"] == 1:
+                for task in tasks:
+                    write_table_task(task)
+            else:
+                with ProcessPoolExecutor(max_workers=len(tasks)) as executor:
+                    list(executor.map(write_table_task, tasks))
+            
+            for df, file_path in tasks:
+                self.logger.log_info(LOG_MESSAGES["test_file_created"].format(file_path.name))
+                self.logger.log_debug(LOG_MESSAGES["file_saved_debug"].format(file_path))
+                self.logger.log_debug(LOG_MESSAGES["file_size_debug"].format(len(df), len(df.columns)))
+                self.files_created += 1
+            
+        except Exception as e:
+            error_msg = LOG_MESSAGES["save_error"].format(str(e))
+            self.logger.log_error(error_msg)
+            self.logger.log_debug(LOG_MESSAGES["details_error"].format(traceback.format_exc()))
+            self.errors_count += 1
+    
+    def _generate_summary(self):
+        """Генерация сводки создания тестовых данных"""
+        end_time = time.time()
+        execution_time = end_time - self.start_time
+        
+        summary = {
+            'execution_time': format_execution_time(execution_time),
+            'employees_created': self.employees_created,
+            'files_created': self.files_created,
+            'errors_count': self.errors_count
+        }
+        
+        # Логируем сводку
+        self.logger.log_info(LOG_MESSAGES["summary"].format(summary))
+        self.logger.log_info(LOG_MESSAGES["time_elapsed"].format(format_execution_time(execution_time)))
+        self.logger.log_info(LOG_MESSAGES["employees_created"].format(self.employees_created))
+        self.logger.log_info(LOG_MESSAGES["outputs_created"].format(self.files_created))
+        self.logger.log_info(LOG_MESSAGES["errors_count"].format(self.errors_count))
+        
+        # Метрики для мониторинга
+        if METRICS_SETTINGS["enabled"]:
+            self.metrics.rows_output = self.employees_created
+            try:
+                metrics_path = self.metrics.write(self.work_dir, execution_time, self.errors_count, self.files_created)
+                self.logger.log_debug(LOG_MESSAGES["metrics_written"].format(metrics_path))
+            except Exception as e:
+                self.logger.log_error(LOG_MESSAGES["metrics_error"].format(str(e)))
+        
+        return summary
+
+# =============================================================================
+# БИНАРНЫЙ СНИМОК РЕЗУЛЬТАТА (MEMORY-MAPPED)
+# =============================================================================
+
+def write_result_snapshot(result_df, snapshot_dir, dictionary_columns=None):
+    """
+    Сохранение результата в виде memory-mappable снимка
+    
+    Каждая колонка пишется в отдельный .bin файл, описание колонок
+    (тип, ширина, словарь) - в manifest.json. Пропуски словарной колонки
+    пишутся кодом -1, пропуски текстовой колонки - маской заполненности
+    (отдельный .mask.bin файл, 1 - значение есть).
+    
+    Args:
+        result_df (pd.DataFrame): Обработанные данные
+        snapshot_dir (str | Path): Папка снимка (будет создана)
+        dictionary_columns (list): Колонки со словарным кодированием
+        
+    Returns:
+        dict: Описание снимка (содержимое manifest.json)
+    """
+    snapshot_dir = Path(snapshot_dir)
+    snapshot_dir.mkdir(parents=True, exist_ok=True)
+    
+    if dictionary_columns is None:
+        dictionary_columns = SNAPSHOT_SETTINGS["dictionary_columns"]
+    
+    manifest = {
+        'version': 1,
+        'rows': int(len(result_df)),
+        'columns': []
+    }
+    
+    for index, column_name in enumerate(result_df.columns):
+        series = result_df[column_name]
+        file_name = f"col_{index:03d}.bin"
+        file_path = snapshot_dir / file_name
+        column_meta = {'name': column_name, 'file': file_name}
+        
+        if column_name in dictionary_columns:
+            # Словарное кодирование: коды минимальной ширины + словарь в manifest, пропуск - код -1
+            # (ширина кодов как у pandas.Categorical, иначе from_codes при чтении копирует коды)
+            codes, categories = pd.factorize(series.astype(str).where(series.notna()), sort=True)
+            if len(categories) < np.iinfo(np.int8).max:
+                codes_dtype = np.dtype(np.int8)
+            elif len(categories) < np.iinfo(np.int16).max:
+                codes_dtype = np.dtype(np.int16)
+            else:
+                codes_dtype = np.dtype(np.int32)
+            np.ascontiguousarray(codes, dtype=codes_dtype.newbyteorder('<')).tofile(file_path)
+            column_meta.update({
+                'kind': 'dictionary',
+                'dtype': codes_dtype.newbyteorder('<').str,
+                'dictionary': [str(value) for value in categories]
+            })
+        elif pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series):
+            # Числовые колонки: "сырой" массив фиксированной ширины
+            values = series.to_numpy()
+            dtype = values.dtype.newbyteorder('<')
+            np.ascontiguousarray(values, dtype=dtype).tofile(file_path)
+            column_meta.update({'kind': 'numeric', 'dtype': dtype.str})
+        else:
+            # Текстовые колонки: UTF-8 байтовые строки фиксированной ширины,
+            # пропуски - пустые строки + маска заполненности
+            present = series.notna().to_numpy()
+            encoded = series.astype(str).str.encode('utf-8').where(present, b'')
+            width = max(int(encoded.str.len().max()) if len(encoded) else 0, 1)
+            values = np.array(encoded.tolist(), dtype=f"S{width}")
+            values.tofile(file_path)
+            column_meta.update({'kind': 'fixed_bytes', 'dtype': f"|S{width}", 'width': width})
+            if not present.all():
+                mask_name = f"col_{index:03d}.mask.bin"
+                present.astype(np.uint8).tofile(snapshot_dir / mask_name)
+                column_meta['mask'] = mask_name
+        
+        manifest['columns'].append(column_meta)
+    
+    manifest_path = snapshot_dir / SNAPSHOT_SETTINGS["manifest_name"]
+    with open(manifest_path, 'w', encoding='utf-8') as manifest_file:
+        json.dump(manifest, manifest_file, ensure_ascii=False, indent=2)
+    
+    return manifest
+
+class ResultSnapshotReader:
+    """Класс для чтения бинарного снимка результата через numpy.memmap"""
+    
+    def __init__(self, snapshot_dir):
+        """
+        Открытие снимка (данные не читаются, а отображаются в память)
+        
+        Args:
+            snapshot_dir (str | Path): Папка снимка
+        """
+        self.snapshot_dir = Path(snapshot_dir)
+        manifest_path = self.snapshot_dir / SNAPSHOT_SETTINGS["manifest_name"]
+        with open(manifest_path, 'r', encoding='utf-8') as manifest_file:
+            self.manifest = json.load(manifest_file)
+        
+        self.rows = self.manifest['rows']
+        self.columns = {}
+        self.masks = {}
+        for column_meta in self.manifest['columns']:
+            self.columns[column_meta['name']] = self._map_column(column_meta['file'], column_meta['dtype'])
+            if 'mask' in column_meta:
+                self.masks[column_meta['name']] = self._map_column(column_meta['mask'], '|u1').view(np.bool_)
+    
+    def _map_column(self, file_name, dtype):
+        """Отображение файла колонки в память (только чтение)"""
+        dtype = np.dtype(dtype)
+        if self.rows == 0:
+            # numpy.memmap не умеет отображать пустые файлы
+            return np.empty(0, dtype=dtype)
+        return np.memmap(self.snapshot_dir / file_name, dtype=dtype, mode='r', shape=(self.rows,))
+    
+    def to_dataframe(self, decode_text=True):
+        """
+        Представление снимка в виде DataFrame без копирования
+        
+        Числовые колонки и коды словарных колонок ссылаются на memmap напрямую.
+        Текстовые колонки фиксированной ширины при decode_text=True
+        декодируются в строки (единственная копия, пропуски по маске - NaN),
+        иначе остаются байтами (пропуски - пустые байтовые строки, маска
+        заполненности - в self.masks).
+        
+        Args:
+            decode_text (bool): Декодировать ли текстовые колонки в str
+            
+        Returns:
+            pd.DataFrame: Данные снимка
+        """
+        data = {}
+        for column_meta in self.manifest['columns']:
+            name = column_meta['name']
+            values = self.columns[name]
+            
+            if column_meta['kind'] == 'dictionary':
+                data[name] = pd.Categorical.from_codes(values, categories=column_meta['dictionary'])
+            elif column_meta['kind'] == 'fixed_bytes' and decode_text:
+                text = np.char.decode(values, 'utf-8').astype(object)
+                if name in self.masks:
+                    text[~self.masks[name]] = np.nan
+                data[name] = text
+            else:
+                data[name] = values
+        
+        return pd.DataFrame(data, copy=False)
+
+# =============================================================================
+# ФОРМАТИРОВАНИЕ И ЗАПИСЬ EXCEL
+# =============================================================================
+
+def get_column_letter(col_num):
+    """Преобразует номер колонки в букву Excel (A, B, C, ..., Z, AA, AB, ...)"""
+    result = ""
+    while col_num > 0:
+        col_num, remainder = divmod(col_num - 1, 26)
+        result = chr(65 + remainder) + result
+    return result
+
+def get_column_format_config(column_name):
+    """Получает настройки форматирования для колонки из групп или специальных настроек"""
+    # Сначала проверяем специальные настройки (переопределяют групповые)
+    if column_name in COLUMN_SPECIAL_FORMATS:
+        special_config = COLUMN_SPECIAL_FORMATS[column_name].copy()
+        
+        # Ищем группу для этой колонки
+        for group_name, group_config in COLUMN_FORMAT_GROUPS.items():
+            if column_name in group_config['columns']:
+                # Объединяем групповые настройки со специальными
+                format_config = group_config.copy()
+                format_config.update(special_config)  # Специальные переопределяют групповые
+                return format_config
+        
+        # Если колонка не найдена в группах, возвращаем только специальные
+        return special_config
+    
+    # Если нет специальных настроек, ищем в группах
+    for group_name, group_config in COLUMN_FORMAT_GROUPS.items():
+        if column_name in group_config['columns']:
+            return group_config.copy()
+    
+    # Если колонка не найдена нигде, возвращаем None
+    return None
+
+def format_worksheet(ws, columns, data_rows):
+    """
+    Автофильтр, фиксация заголовка и форматирование колонок листа
+    
+    Args:
+        ws: Лист openpyxl
+        columns (list): Названия колонок (в порядке листа)
+        data_rows (int): Количество строк данных (без заголовка)
+    """
+    max_row = data_rows + 1  # +1 потому что pandas.to_excel добавляет заголовки
+    max_col = len(columns)
+    
+    # Устанавливаем автофильтр на диапазон A1:последняя_колонка_последняя_строка (заголовки + данные)
+    last_col_letter = get_column_letter(max_col)
+    ws.auto_filter.ref = f"A1:{last_col_letter}{max_row}"
+    
+    # Фиксируем панели на уровне A2 (колонка A, строка 2) - заголовки остаются видимыми
+    ws.freeze_panes = "A2"
+    
+    # Применяем форматирование колонок согласно групповой системе
+    for col in range(1, max_col + 1):
+        column_letter = get_column_letter(col)
+        column_name = columns[col - 1]  # Получаем название колонки
+        
+        # Получаем настройки форматирования для колонки
+        format_config = get_column_format_config(column_name)
+        
+        if format_config:
+            # Устанавливаем ширину колонки
+            ws.column_dimensions[column_letter].width = format_config.get('width', 15)
+            
+            # Применяем форматирование ко всем ячейкам в колонке (кроме заголовка)
+            for row in range(2, max_row + 1):  # Начинаем со 2-й строки (после заголовка)
+                cell = ws[f"{column_letter}{row}"]
+                
+                # Применяем специальное форматирование для padded_number
+                if format_config.get('format_type') == 'padded_number':
+                    # Для чисел с лидирующими нулями устанавливаем текстовый формат
+                    cell.number_format = '@'  # Текстовый формат Excel
+                    # Применяем выравнивание по левому краю для лучшей читаемости
+                    cell.alignment = Alignment(horizontal='left', vertical='center')
+                else:
+                    # Применяем числовой формат
+                    if format_config.get('format') == 'number' and 'number_format' in format_config:
+                        cell.number_format = format_config['number_format']
+                    
+                    # Применяем выравнивание
+                    alignment = format_config.get('alignment', 'left')
+                    if alignment == 'center':
+                        cell.alignment = Alignment(horizontal='center', vertical='center')
+                    elif alignment == 'right':
+                        cell.alignment = Alignment(horizontal='right', vertical='center')
+                    elif alignment == 'left':
+                        cell.alignment = Alignment(horizontal='left', vertical='center')
+        else:
+            # Для колонок без настроек - форматируем по содержимому
+            max_width = 0
+            for row in range(1, max_row + 1):
+                cell_value = ws[f"{column_letter}{row}"].value
+                if cell_value is not None:
+                    if isinstance(cell_value, (int, float)):
+                        width = len(str(cell_value)) + 2
+                    else:
+                        width = len(str(cell_value)) + 1
+                    max_width = max(max_width, width)
+            
+            ws.column_dimensions[column_letter].width = min(max_width + 2, 50)
+    
+    # Цветовая разметка правилами условного форматирования
+    apply_conditional_formats(ws, columns, data_rows)
+
+def apply_conditional_formats(ws, columns, data_rows):
+    """
+    Добавление правил условного форматирования из CONDITIONAL_FORMAT_RULES
+    
+    Число операций пропорционально числу правил, а не числу ячеек.
+    
+    Args:
+        ws: Лист openpyxl
+        columns (list): Названия колонок (в порядке листа)
+        data_rows (int): Количество строк данных (без заголовка)
+        
+    Returns:
+        int: Количество добавленных правил
+    """
+    if data_rows == 0:
+        return 0
+    
+    max_row = data_rows + 1
+    last_col_letter = get_column_letter(len(columns))
+    rules_added = 0
+    
+    # Правила для ячеек добавляются первыми и получают больший приоритет, чем правила для строк
+    ordered_rules = sorted(CONDITIONAL_FORMAT_RULES.items(), key=lambda item: item[1].get('apply_to') == 'row')
+    
+    for rule_name, rule_config in ordered_rules:
+        if not rule_config.get('enabled', True) or rule_config['column'] not in columns:
+            continue
+        
+        column_letter = get_column_letter(columns.index(rule_config['column']) + 1)
+        column_range = f"{column_letter}2:{column_letter}{max_row}"
+        
+        if rule_config['type'] == 'data_bar':
+            ws.conditional_formatting.add(column_range, DataBarRule(
+                start_type='min', end_type='max', color=rule_config['color'], showValue=True
+            ))
+            rules_added += 1
+            
+        elif rule_config['type'] == 'cell_is':
+            for value, style in rule_config['styles'].items():
+                fill = PatternFill(start_color=style['fill'], end_color=style['fill'], fill_type='solid')
+                font = Font(color=style['font']) if style.get('font') else None
+                
+                if rule_config.get('apply_to') == 'row':
+                    # Формула с абсолютной колонкой окрашивает всю строку данных
+                    target_range = f"A2:{last_col_letter}{max_row}"
+                    rule = FormulaRule(formula=[f"${column_letter}2={value}"], fill=fill, font=font)
+                else:
+                    target_range = column_range
+                    rule = CellIsRule(operator='equal', formula=[str(value)], fill=fill, font=font)
+                
+                ws.conditional_formatting.add(target_range, rule)
+                rules_added += 1
+    
+    return rules_added
+
+def sanitize_sheet_name(name):
+    """Имя листа Excel: без символов []:*?/\\ и не длиннее 31 символа"""
+    for char in '[]:*?/\\':
+        name = name.replace(char, '_')
+    return name[:31] or 'Лист'
+
+def split_into_shards(processed_data, split_by, max_rows):
+    """
+    Разбиение результата на части для записи в Excel
+    
+    Args:
+        processed_data (pd.DataFrame): Обработанные данные
+        split_by (str): 'tb' - по ТБ (большие ТБ дополнительно делятся по строкам), 'rows' - только по строкам
+        max_rows (int): Максимум строк данных в одной части
+        
+    Returns:
+        list: Части в виде словарей {'tb', 'sheet_name', 'start', 'stop'} - диапазоны строк
+              в processed_data (при split_by='tb' данные должны быть упорядочены по ТБ)
+    """
+    shards = []
+    if split_by == 'tb':
+        tb_values = processed_data['ТБ'].astype(str).to_numpy()
+        starts = segment_starts(tb_values)
+        stops = np.r_[starts[1:], len(tb_values)]
+        groups = [(tb_values[start], start, stop) for start, stop in zip(starts, stops)]
+    else:
+        groups = [(None, 0, len(processed_data))]
+    
+    for tb, start, stop in groups:
+        parts = range(start, stop, max_rows)
+        for part_number, part_start in enumerate(parts, start=1):
+            part_stop = min(part_start + max_rows, stop)
+            if tb is None:
+                sheet_name = f"Данные_{len(shards) + 1:03d}"
+            elif len(parts) > 1:
+                sheet_name = f"{tb[:27]}_{part_number:02d}"
+            else:
+                sheet_name = tb
+            shards.append({'tb': tb, 'sheet_name': sanitize_sheet_name(sheet_name), 'start': int(part_start), 'stop': int(part_stop)})
+    return shards
+
+def write_excel_shard(task):
+    """
+    Запись одной книги Excel (используется в пуле процессов)
+    
+    Args:
+        task (dict): {'file_path': путь к книге, 'sheets': список (имя листа, DataFrame)}
+        
+    Returns:
+        str: Путь к записанной книге
+    """
+    with pd.ExcelWriter(task['file_path'], engine='openpyxl') as writer:
+        for sheet_name, sheet_df in task['sheets']:
+            sheet_df.to_excel(writer, sheet_name=sheet_name, index=False)
+            format_worksheet(writer.sheets[sheet_name], list(sheet_df.columns), len(sheet_df))
+    return task['file_path']
+
+def sanitize_file_name(name):
+    """Имя файла без недопустимых символов (<>:"/\\|?*)"""
+    cleaned = re.sub(r'[<>:"/\\|?*]', '_', str(name)).strip().rstrip('.')
+    return cleaned or '_'
+
+def build_style_plan(processed_data):
+    """
+    План оформления колонок результата (вычисляется один раз для всех книг)
+    
+    Настройки колонок те же, что у format_worksheet. Ширина колонок без настроек
+    считается по содержимому всего результата, поэтому одинакова во всех книгах.
+    
+    Args:
+        processed_data (pd.DataFrame): Обработанные данные
+        
+    Returns:
+        list: Для каждой колонки {'width', 'number_format', 'alignment'} (None - без оформления)
+    """
+    style_plan = []
+    for column_name in processed_data.columns:
+        format_config = get_column_format_config(column_name)
+        number_format = None
+        horizontal = None
+        
+        if format_config:
+            width = format_config.get('width', 15)
+            if format_config.get('format_type') == 'padded_number':
+                number_format, horizontal = '@', 'left'
+            else:
+                if format_config.get('format') == 'number' and 'number_format' in format_config:
+                    number_format = format_config['number_format']
+                alignment = format_config.get('alignment', 'left')
+                if alignment in ('center', 'right', 'left'):
+                    horizontal = alignment
+        else:
+            # Как в format_worksheet: числа +2 символа, текст +1, заголовок - тоже текст
+            values = processed_data[column_name].dropna()
+            extra = 2 if pd.api.types.is_numeric_dtype(values) else 1
+            max_width = max(int(values.astype(str).str.len().max()) + extra if len(values) else 0, len(str(column_name)) + 1)
+            width = min(max_width + 2, 50)
+        
+        style_plan.append({
+            'width': width,
+            'number_format': number_format,
+            'alignment': Alignment(horizontal=horizontal, vertical='center') if horizontal else None
+        })
+    return style_plan
+
+def write_styled_workbook(task):
+    """
+    Запись книги с одним листом по готовому плану оформления (используется в пуле процессов)
+    
+    Книга пишется потоково (openpyxl write_only). Стиль каждой колонки один раз
+    регистрируется в книге, ячейкам присваивается готовый набор индексов стиля.
+    
+    Args:
+        task (dict): {'file_path', 'sheet_name', 'data': DataFrame, 'style_plan': build_style_plan}
+        
+    Returns:
+        dict: {'file_path', 'rows', 'size_bytes'}
+    """
+    data = task['data']
+    columns = list(data.columns)
+    workbook = Workbook(write_only=True)
+    ws = workbook.create_sheet(task['sheet_name'])
+    
+    # Ширина колонок, автофильтр, закрепление заголовка и условное форматирование - до строк
+    for col, column_style in enumerate(task['style_plan'], start=1):
+        ws.column_dimensions[get_column_letter(col)].width = column_style['width']
+    ws.auto_filter.ref = f"A1:{get_column_letter(len(columns))}{len(data) + 1}"
+    ws.freeze_panes = "A2"
+    apply_conditional_formats(ws, columns, len(data))
+    ws.append(columns)
+    
+    # Шаблоны стилей колонок: индексы стиля в этой книге
+    templates = {}
+    for col, column_style in enumerate(task['style_plan']):
+        if column_style['number_format'] or column_style['alignment']:
+            template = WriteOnlyCell(ws)
+            if column_style['number_format']:
+                template.number_format = column_style['number_format']
+            if column_style['alignment']:
+                template.alignment = column_style['alignment']
+            templates[col] = template._style
+    
+    values = data.astype(object).where(data.notna(), None)
+    for row in values.itertuples(index=False, name=None):
+        row = list(row)
+        for col, style in templates.items():
+            cell = WriteOnlyCell(ws, value=row[col])
+            cell._style = StyleArray(style)
+            row[col] = cell
+        ws.append(row)
+    
+    workbook.save(task['file_path'])
+    return {'file_path': task['file_path'], 'rows': len(data), 'size_bytes': os.path.getsize(task['file_path'])}
+
+# =============================================================================
+# КОНТРОЛЬНЫЕ ТОЧКИ ЭТАПОВ ОБРАБОТКИ
+# =============================================================================
+
+def settings_hash(*parts):
+    """
+    Короткий хэш набора значений (настройки, описания файлов)
+    
+    Returns:
+        str: 12 шестнадцатеричных символов
+    """
+    payload = json.dumps(parts, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()[:12]
+
+class StageCheckpointStore:
+    """
+    Хранилище контрольных точек этапов
+    
+    Контрольная точка - папка <этап>_<ключ> с таблицами этапа и manifest.json.
+    Манифест пишется последним, поэтому папка без манифеста считается
+    незавершенной и не используется.
+    """
+    
+    EXTENSIONS = {'feather': '.feather', 'parquet': '.parquet', 'pickle': '.pkl'}
+    
+    def __init__(self, folder, file_format="auto"):
+        """
+        Args:
+            folder (Path): Папка контрольных точек
+            file_format (str): 'feather', 'parquet', 'pickle' или 'auto'
+        """
+        self.folder = Path(folder)
+        if file_format == 'auto':
+            file_format = 'feather' if ARROW_STRING_DTYPE is not None else 'pickle'
+        self.file_format = file_format
+    
+    def path(self, stage, key):
+        """Папка контрольной точки этапа"""
+        return self.folder / f"{stage}_{key}"
+    
+    def exists(self, stage, key):
+        """Есть ли завершенная контрольная точка этапа"""
+        return (self.path(stage, key) / CHECKPOINT_SETTINGS["manifest_name"]).exists()
+    
+    def _write_frame(self, df, file_stem):
+        """Запись таблицы в выбранном формате (при ошибке формата - в pickle)"""
+        if self.file_format != 'pickle':
+            file_path = file_stem.with_suffix(self.EXTENSIONS[self.file_format])
+            try:
+                getattr(df.reset_index(drop=True), f"to_{self.file_format}")(file_path)
+                return file_path.name
+            except Exception:
+                # Смешанные типы в колонке и т.п. - такие таблицы сохраняются без преобразования
+                file_path.unlink(missing_ok=True)
+        file_path = file_stem.with_suffix(self.EXTENSIONS['pickle'])
+        df.to_pickle(file_path)
+        return file_path.name
+    
+    @staticmethod
+    def _read_frame(file_path):
+        """Чтение таблицы по расширению файла"""
+        if file_path.suffix == '.feather':
+            return pd.read_feather(file_path)
+        if file_path.suffix == '.parquet':
+            return pd.read_parquet(file_path)
+        return pd.read_pickle(file_path)
+    
+    def save(self, stage, key, frames):
+        """
+        Сохранение контрольной точки
+        
+        Args:
+            stage (str): Этап
+            key (str): Ключ входных данных и настроек
+            frames (list): [{'name': имя, 'data': DataFrame, ...}] - остальные поля пишутся в манифест
+            
+        Returns:
+            Path: Папка контрольной точки
+        """
+        checkpoint_dir = self.path(stage, key)
+        checkpoint_dir.mkdir(parents=True, exist_ok=True)
+        manifest = {'stage': stage, 'key': key, 'created': datetime.now().isoformat(timespec='seconds'), 'frames': []}
+        for index, frame in enumerate(frames):
+            file_name = self._write_frame(frame['data'], checkpoint_dir / f"frame_{index:03d}")
+            meta = {name: str(value) for name, value in frame.items() if name != 'data'}
+            meta['file'] = file_name
+            manifest['frames'].append(meta)
+        with open(checkpoint_dir / CHECKPOINT_SETTINGS["manifest_name"], 'w', encoding='utf-8') as manifest_file:
+            json.dump(manifest, manifest_file, ensure_ascii=False, indent=2)
+        return checkpoint_dir
+    
+    def load(self, stage, key):
+        """
+        Чтение контрольной точки
+        
+        Returns:
+            list: [{'name': имя, 'data': DataFrame, ...}] в порядке сохранения
+        """
+        checkpoint_dir = self.path(stage, key)
+        with open(checkpoint_dir / CHECKPOINT_SETTINGS["manifest_name"], 'r', encoding='utf-8') as manifest_file:
+            manifest = json.load(manifest_file)
+        frames = []
+        for meta in manifest['frames']:
+            frame = {name: value for name, value in meta.items() if name != 'file'}
+            frame['data'] = self._read_frame(checkpoint_dir / meta['file'])
+            frames.append(frame)
+        return frames
+    
+    def prune(self, stage, keep):
+        """Удаление старых контрольных точек этапа (остаются keep последних)"""
+        checkpoints = sorted(
+            (path for path in self.folder.glob(f"{stage}_*") if path.is_dir()),
+            key=lambda path: path.stat().st_mtime, reverse=True
+        )
+        for checkpoint_dir in checkpoints[keep:]:
+            for file_path in checkpoint_dir.iterdir():
+                file_path.unlink()
+            checkpoint_dir.rmdir()
+
+# =============================================================================
+# ПЛАНИРОВЩИК ВЫПОЛНЕНИЯ
+# =============================================================================
+
+def available_memory_bytes():
+    """
+    Доступная память системы
+    
+    Returns:
+        int | None: Байт (None - определить не удалось)
+    """
+    if psutil is not None:
+        return int(psutil.virtual_memory().available)
+    try:
+        with open('/proc/meminfo', encoding='utf-8') as meminfo:
+            for line in meminfo:
+                if line.startswith('MemAvailable:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    try:
+        return os.sysconf('SC_AVPHYS_PAGES') * os.sysconf('SC_PAGE_SIZE')
+    except (ValueError, OSError, AttributeError):
+        return None
+
+def parse_plan_value(key, value):
+    """
+    Значение пункта плана из строки ('workers=2', 'load=chunked', 'compact_text=false')
+    
+    Raises:
+        ValueError: Неизвестный пункт или недопустимое значение
+    """
+    if key not in PLAN_KEYS:
+        raise ValueError(f"неизвестный пункт плана {key} (допустимы: {', '.join(PLAN_KEYS)})")
+    kind = PLAN_KEYS[key]
+    if kind is bool:
+        if value.lower() not in ('true', 'false', '1', '0'):
+            raise ValueError(f"{key}: ожидается true или false")
+        return value.lower() in ('true', '1')
+    if kind is int:
+        if not value.isdigit() or int(value) < 1:
+            raise ValueError(f"{key}: ожидается целое число больше 0")
+        return int(value)
+    if value not in kind:
+        raise ValueError(f"{key}: допустимые значения {', '.join(kind)}")
+    return value
+
+def estimate_peak_memory(plan, input_rows, largest_file_rows, result_rows):
+    """
+    Оценка пиковой памяти обработки при заданном плане
+    
+    Пик - максимум по этапам: загрузка (входные данные + читаемый файл или его часть),
+    расчет (входные данные + результат + временные массивы), запись Excel (входные
+    данные + результат + книги openpyxl, одновременно записываемые процессами).
+    
+    Args:
+        plan (dict): План выполнения
+        input_rows (int): Строк во всех входных файлах
+        largest_file_rows (int): Строк в самом большом входном файле
+        result_rows (int): Строк результата (верхняя оценка)
+    
+    Returns:
+        int: Байт
+    """
+    row_bytes = PLANNER_SETTINGS["row_bytes"]
+    input_bytes = input_rows * row_bytes["input_compact" if plan['compact_text'] else "input"]
+    result_bytes = result_rows * row_bytes["result_compact" if plan['compact_text'] else "result"]
+    
+    read_rows = min(largest_file_rows, PLANNER_SETTINGS["chunk_rows"]) if plan['load'] == 'chunked' else largest_file_rows
+    load_peak = input_bytes + read_rows * row_bytes["input"]
+    process_peak = input_bytes + result_bytes + result_rows * row_bytes["processing"]
+    
+    if plan['excel_parts']:
+        # Самая большая часть - самый большой ТБ (по доле ГОСБ), не больше листа Excel
+        largest_tb_share = max(len(gosb_list) for gosb_list in BANK_STRUCTURE.values()) / len(HEAD_OFFICES)
+        part_rows = min(int(np.ceil(result_rows * largest_tb_share)), EXCEL_SHARDING["max_rows_per_sheet"])
+        excel_rows = part_rows * plan['workers']
+    else:
+        excel_rows = result_rows
+    save_peak = input_bytes + result_bytes + excel_rows * row_bytes["excel"]
+    
+    return int(max(load_peak, process_peak, save_peak))
+
+def plan_execution(file_rows, cpu_count, available_memory, override=None):
+    """
+    Выбор плана выполнения по размеру входных данных, ядрам и памяти
+    
+    Args:
+        file_rows (list): Строк в каждом входном файле
+        cpu_count (int): Число ядер
+        available_memory (int | None): Доступная память, байт
+        override (dict): Явно заданные пункты плана
+    
+    Returns:
+        dict: План (PLAN_KEYS) + оценка 'estimated_peak_bytes' и бюджет 'memory_budget_bytes'
+    """
+    override = dict(override or {})
+    if EXCEL_SHARDING["enabled"] != "auto":
+        override.setdefault('excel_parts', bool(EXCEL_SHARDING["enabled"]))
+    
+    input_rows = sum(file_rows)
+    largest_file_rows = max(file_rows, default=0)
+    # Все ТН могут быть разными - верхняя оценка строк результата
+    result_rows = input_rows
+    max_workers = min(EXCEL_SHARDING["workers"] or cpu_count, len(BANK_STRUCTURE))
+    
+    plan = {
+        'strategy': 'serial',
+        'excel_parts': result_rows > EXCEL_SHARDING["max_rows_per_sheet"],
+        'load': 'memory',
+        'workers': 1,
+        'compact_text': TEXT_COLUMN_TYPES["enabled"] and input_rows >= PLANNER_SETTINGS["compact_min_rows"]
+    }
+    if result_rows >= PLANNER_SETTINGS["parallel_min_rows"] and max_workers > 1:
+        plan.update(strategy='parallel_tb', excel_parts=True, workers=max_workers)
+    plan.update(override)
+    
+    def estimate():
+        return estimate_peak_memory(plan, input_rows, largest_file_rows, result_rows)
+    
+    # Облегчение плана, пока оценка больше бюджета (явные пункты не меняются)
+    budget = int(available_memory * PLANNER_SETTINGS["memory_budget_share"]) if available_memory else None
+    if budget is not None:
+        for key, value in [('compact_text', TEXT_COLUMN_TYPES["enabled"]), ('load', 'chunked'), ('excel_parts', True)]:
+            if estimate() > budget and key not in override and value:
+                plan[key] = value
+        while estimate() > budget and plan['workers'] > 1 and 'workers' not in override:
+            plan['workers'] -= 1
+        if plan['workers'] == 1 and 'strategy' not in override:
+            plan['strategy'] = 'serial'
+    
+    plan['estimated_peak_bytes'] = estimate()
+    plan['memory_budget_bytes'] = budget
+    return plan
+
+# =============================================================================
+# СЦЕНАРИИ ПОРОГОВ КОД ВЫВОДА
+# =============================================================================
+
+def build_threshold_scenarios(grid, extra_scenarios=None, base=None):
+    """
+    Список наборов порогов КОД вывода: текущие пороги, сочетания сетки, дополнительные сценарии
+    
+    Args:
+        grid (dict): Ключ порога -> список значений (см. SCENARIO_SETTINGS['grid'])
+        extra_scenarios (list): Дополнительные наборы порогов
+        base (dict): Текущие пороги (None - KOD_VYVODA_THRESHOLDS)
+        
+    Returns:
+        list: [{'name': имя, 'thresholds': полный набор порогов}] без повторов
+    """
+    base = dict(base or KOD_VYVODA_THRESHOLDS)
+    unknown = set(grid) - set(base)
+    if unknown:
+        raise ValueError(f"Неизвестные пороги в сетке сценариев: {', '.join(sorted(unknown))}")
+    
+    candidates = [base]
+    keys = list(grid)
+    combinations = [[]]
+    for key in keys:
+        combinations = [combination + [value] for combination in combinations for value in grid[key]]
+    candidates += [dict(base, **dict(zip(keys, combination))) for combination in combinations if keys]
+    candidates += [dict(base, **scenario) for scenario in extra_scenarios or []]
+    
+    scenarios, seen = [], set()
+    for thresholds in candidates:
+        key = tuple(float(thresholds[name]) for name in base)
+        if key in seen:
+            continue
+        seen.add(key)
+        # Имя: пороги в процентах в порядке страна топ / страна / ТБ / ГОСБ
+        scenarios.append({'name': '/'.join(f"{value * 100:g}" for value in key), 'thresholds': thresholds})
+    return scenarios
+
+# =============================================================================
+# ПАКЕТНАЯ ОБРАБОТКА: ЭТАПЫ В ПРОЦЕССАХ-ИСПОЛНИТЕЛЯХ
+# =============================================================================
+
+def batch_worker_processor(task):
+    """
+    Процессор для пары в процессе-исполнителе конвейера (лог - в тот же файл)
+    
+    Args:
+        task (dict): Задача DataProcessor._batch_task
+        
+    Returns:
+        DataProcessor: Процессор с планом и ключом пары
+    """
+    logger = DataProcessorLogger(**task['logger'])
+    processor = DataProcessor(task['work_dir'], logger, task['input_files'])
+    processor.plan = task['plan']
+    processor.output_label = task['label']
+    return processor
+
+def batch_worker_result(processor, **extra):
+    """Счетчики и метрики процессора-исполнителя для учета в основном процессе"""
+    return dict(
+        errors_count=processor.errors_count,
+        files_processed=processor.files_processed,
+        outputs_created=processor.outputs_created,
+        stage_seconds=processor.metrics.stage_seconds,
+        rows_loaded=processor.metrics.rows_loaded,
+        text_memory=processor.text_memory,
+        **extra
+    )
+
+def batch_load_task(task):
+    """Этап загрузки конвейера: входные файлы пары (используется в пуле процессов)"""
+    processor = batch_worker_processor(task)
+    return batch_worker_result(processor, dataframes=processor.load_excel_files())
+
+def batch_save_task(task):
+    """Этап записи конвейера: выходные файлы пары, task['data'] - результат расчета"""
+    processor = batch_worker_processor(task)
+    processor.save_outputs(task['data'])
+    return batch_worker_result(processor)
+
+# =============================================================================
+# КЛАСС ДЛЯ ОБРАБОТКИ ДАННЫХ
+# =============================================================================
+
+class DataProcessor:
+    """Основной класс для обработки данных"""
+    
+    def __init__(self, work_dir, logger, input_files=None):
+        """
+        Инициализация процессора данных
+        
+        Args:
+            work_dir (str): Рабочая директория (None - только расчет в памяти, без папок и файлов)
+            logger (DataProcessorLogger): Объект логгера
+            input_files (list): Пара входных файлов (по умолчанию INPUT_FILES)
+        """
+        self.work_dir = Path(work_dir) if work_dir is not None else None
+        self.logger = logger
+        self.input_files = input_files or INPUT_FILES
+        self.output_label = None
+        self.start_time = None
+        self.errors_count = 0
+        self.files_processed = 0
+        self.outputs_created = 0
+        self.hierarchy_mismatches = pd.DataFrame()
+        self.validation_report = pd.DataFrame()
+        self.text_memory = {'before': 0, 'after': 0}
+        self.metrics = RunMetrics('process', input_pair_label(self.input_files))
+        self.plan = None
+        # True - ошибки расчета пробрасываются вызывающему коду, а не только пишутся в лог
+        self.raise_errors = False
+        
+        # Создаем необходимые директории
+        if self.work_dir is not None:
+            self._create_directories()
+    
+    def _create_directories(self):
+        """Создание необходимых директорий"""
+        directories = [
+            self.work_dir / INPUT_FOLDER,
+            self.work_dir / OUTPUT_FOLDER,
+            self.work_dir / LOGS_FOLDER
+        ]
+        
+        for directory in directories:
+            directory.mkdir(parents=True, exist_ok=True)
+            self.logger.log_debug(LOG_MESSAGES["directory_ready"].format(directory))
+    
+    def load_excel_files(self):
+        """
+        Загрузка входных файлов (.xlsx, .csv или .parquet - по расширению в self.input_files)
+        
+        Returns:
+            list: Список загруженных DataFrame'ов
+        """
+        start_time = time.time()
+        dataframes = []
+        
+        if TEXT_COLUMN_TYPES["enabled"] and ARROW_STRING_DTYPE is None:
+            self.logger.log_debug(LOG_MESSAGES["arrow_strings_unavailable"].format(TEXT_COLUMN_TYPES["string_columns"]))
+        
+        for file_config in self.input_files:
+            try:
+                file_path = self.work_dir / INPUT_FOLDER / f"{file_config['name']}{file_config['extension']}"
+                # Файлы частей генератора (GENERATION_SETTINGS['output'] = 'shards')
+                part_paths = sorted(file_path.parent.glob(f"{file_config['name']}_part*{file_config['extension']}"))
+                
+                if file_path.exists() or part_paths:
+                    if self.plan is not None and self.plan['load'] == 'chunked':
+                        # Читаем частями: ключ ТН и компактные типы - на каждой части
+                        df = self._read_table_chunked([file_path] if file_path.exists() else part_paths, file_path.name)
+                    elif file_path.exists():
+                        # Загружаем файл (формат - по расширению)
+                        df = read_table_file(file_path)
+                    else:
+                        # Собираем файл из частей в порядке номеров
+                        df = pd.concat([read_table_file(part_path) for part_path in part_paths], ignore_index=True)
+                        self.logger.log_info(LOG_MESSAGES["file_parts_loaded"].format(file_path.name, len(part_paths)))
+                    
+                    # ТН разбирается один раз в целочисленный ключ для объединения и дедупликации
+                    # (при чтении частями ключ и компактные типы уже получены)
+                    if TN_KEY_COLUMN not in df.columns:
+                        if 'ТН 10' in df.columns:
+                            df[TN_KEY_COLUMN] = parse_tn_keys(df['ТН 10'])
+                        self._optimize_text_columns(df, file_path.name)
+                    dataframes.append({
+                        'name': file_config['name'],
+                        'data': df,
+                        'file_path': file_path
+                    })
+                    
+                    self.logger.log_info(LOG_MESSAGES["file_loaded"].format(file_path.name))
+                    self.logger.log_debug(LOG_MESSAGES["rows_columns_loaded"].format(len(df), len(df.columns), file_path.name))
+                    self.metrics.record_rows_loaded(file_path.name, len(df))
+                    self.files_processed += 1
+                else:
+                    self.logger.log_error(LOG_MESSAGES["file_not_found"].format(file_path))
+                    self.errors_count += 1
+                    
+            except Exception as e:
+                error_msg = LOG_MESSAGES["load_file_error"].format(file_config['name'], str(e))
+                self.logger.log_error(error_msg)
+                self.logger.log_debug(LOG_MESSAGES["details_error"].format(traceback.format_exc()))
+                self.errors_count += 1
+        
+        end_time = time.time()
+        execution_time = end_time - start_time
+        self.logger.log_debug(LOG_MESSAGES["file_loading_time"].format(format_execution_time(execution_time)))
+        self.metrics.record_stage('load', execution_time)
+        
+        return dataframes
+    
+    def _read_table_chunked(self, paths, label):
+        """
+        Чтение файла (или его частей) по PLANNER_SETTINGS['chunk_rows'] строк
+        
+        Каждая часть сразу получает ключ ТН и компактные типы текстовых колонок,
+        поэтому текст всего файла не держится в памяти объектами Python.
+        
+        Args:
+            paths (list): Файл или файлы частей по порядку
+            label (str): Имя файла для лога
+        
+        Returns:
+            pd.DataFrame: Данные файла
+        """
+        chunks = []
+        for path in paths:
+            for chunk in read_table_chunks(path, PLANNER_SETTINGS["chunk_rows"]):
+                if 'ТН 10' in chunk.columns:
+                    chunk[TN_KEY_COLUMN] = parse_tn_keys(chunk['ТН 10'])
+                self._optimize_text_columns(chunk, label)
+                chunks.append(chunk)
+        self.logger.log_debug(LOG_MESSAGES["file_read_chunked"].format(label, len(chunks)))
+        return concat_compact_frames(chunks)
+    
+    def plan_run(self):
+        """
+        План выполнения по входным файлам, ядрам и доступной памяти (см. PLANNER_SETTINGS)
+        
+        Returns:
+            dict: План выполнения (также сохраняется в self.plan)
+        """
+        file_rows = []
+        for file_config in self.input_files:
+            file_path = self.work_dir / INPUT_FOLDER / f"{file_config['name']}{file_config['extension']}"
+            paths = [file_path] if file_path.exists() else sorted(
+                file_path.parent.glob(f"{file_config['name']}_part*{file_config['extension']}")
+            )
+            file_rows.append(sum(count_table_rows(path) for path in paths))
+        
+        cpu_count = os.cpu_count() or 1
+        available_memory = available_memory_bytes()
+        self.plan = plan_execution(file_rows, cpu_count, available_memory, PLANNER_SETTINGS["override"])
+        
+        plan_text = ", ".join(f"{key}={self.plan[key]}" for key in PLAN_KEYS)
+        self.logger.log_info(LOG_MESSAGES["execution_plan"].format(
+            plan_text, sum(file_rows), cpu_count,
+            format_memory_size(available_memory) if available_memory else "?",
+            format_memory_size(self.plan['estimated_peak_bytes'])
+        ))
+        if PLANNER_SETTINGS["override"]:
+            self.logger.log_info(LOG_MESSAGES["execution_plan_override"].format(PLANNER_SETTINGS["override"]))
+        if TEXT_COLUMN_TYPES["enabled"] and not self.plan['compact_text']:
+            if 'compact_text' in PLANNER_SETTINGS["override"]:
+                reason = "пункт плана compact_text=false задан явно"
+            else:
+                reason = (f"строк на входе {sum(file_rows)} меньше compact_min_rows {PLANNER_SETTINGS['compact_min_rows']} "
+                          f"(включить: --plan compact_text=true)")
+            self.logger.log_info(LOG_MESSAGES["execution_plan_compact_off"].format(reason))
+        budget = self.plan['memory_budget_bytes']
+        if budget is not None and self.plan['estimated_peak_bytes'] > budget:
+            self.logger.log_error(LOG_MESSAGES["execution_plan_over_budget"].format(
+                format_memory_size(self.plan['estimated_peak_bytes']), format_memory_size(budget)
+            ))
+        return self.plan
+    
+    def _label_suffix(self):
+        """Суффикс имен выходных файлов пары в пакетном режиме ('_<ключ пары>' или пусто)"""
+        return f"_{self.output_label}" if self.output_label else ""
+    
+    def _split_input_frames(self, dataframes):
+        """
+        Поиск DataFrame'ов файлов 1 и 2 по именам из self.input_files
+        
+        Returns:
+            tuple: (df1, df2), отсутствующие файлы - None
+        """
+        df1 = None
+        df2 = None
+        file1_name = self.input_files[0]['name']
+        file2_name = self.input_files[1]['name']
+        
+        for df_info in dataframes:
+            if df_info['name'] == file1_name:
+                df1 = df_info['data']
+            elif df_info['name'] == file2_name:
+                df2 = df_info['data']
+        
+        return df1, df2
+    
+    def validate_inputs(self, dataframes):
+        """
+        Векторная проверка входных данных до обработки
+        
+        Проверяются: формат ТН, дубли ТН внутри файла, расхождение ТБ/ГОСБ
+        одного ТН между файлами, пропущенный или отрицательный ОД,
+        пропущенный ТБ/ГОСБ, ТБ/ГОСБ вне BANK_STRUCTURE и ГОСБ вне указанного ТБ.
+        
+        Args:
+            dataframes (list): Список загруженных DataFrame'ов
+            
+        Returns:
+            tuple: (отчет pd.DataFrame [проверка, файл, строк, примеры], признак успешной проверки)
+        """
+        start_time = time.time()
+        df1, df2 = self._split_input_frames(dataframes)
+        tn_format = COLUMN_SPECIAL_FORMATS.get('ТН 10', {})
+        total_digits = tn_format.get('total_digits', 10)
+        examples_count = VALIDATION_SETTINGS["examples"]
+        
+        report_rows = []
+        violating_rows = 0
+        total_rows = 0
+        tn_keys_by_file = {}
+        
+        def add_check(check_name, file_label, mask, tn_values):
+            """Добавление строки отчета по маске нарушений"""
+            count = int(mask.sum())
+            report_rows.append({
+                'проверка': check_name,
+                'файл': file_label,
+                'строк': count,
+                'примеры': ', '.join(tn_values[mask][:examples_count].astype(str)) if count else ''
+            })
+            return mask
+        
+        for file_label, df in (('1', df1), ('2', df2)):
+            if df is None:
+                continue
+            total_rows += len(df)
+            row_violations = np.zeros(len(df), dtype=bool)
+            
+            # Формат ТН: ровно total_digits цифр после префикса TN_
+            tn = df['ТН 10'].astype(str).str.replace('TN_', '', regex=False).str.strip()
+            tn_values = tn.to_numpy(dtype=object)
+            tn_keys = df[TN_KEY_COLUMN].to_numpy() if TN_KEY_COLUMN in df.columns else parse_tn_keys(df['ТН 10'])
+            tn_keys_by_file[file_label] = tn_keys
+            row_violations |= add_check('формат ТН', file_label,
+                                        ~tn.str.fullmatch(rf"\d{{{total_digits}}}").to_numpy(dtype=bool), tn_values)
+            
+            # Дубли ТН внутри файла
+            row_violations |= add_check('дубли ТН', file_label, pd.Series(tn_keys).duplicated(keep=False).to_numpy(), tn_values)
+            
+            # Пропущенный или отрицательный ОД
+            for od_column in ('2025, тыс. руб.', '2024, тыс. руб. на конец месяца'):
+                if od_column in df.columns:
+                    od_values = pd.to_numeric(df[od_column], errors='coerce').to_numpy(dtype=np.float64)
+                    row_violations |= add_check(f"пропущен ОД: {od_column}", file_label, np.isnan(od_values), tn_values)
+                    row_violations |= add_check(f"отрицательный ОД: {od_column}", file_label, od_values < 0, tn_values)
+            
+            # Пропущенный ТБ/ГОСБ, ТБ/ГОСБ вне BANK_STRUCTURE и ГОСБ вне указанного ТБ
+            missing_mask = (df['ТБ'].isna() | df['ГОСБ'].isna()).to_numpy()
+            row_violations |= add_check('пропущен ТБ/ГОСБ', file_label, missing_mask, tn_values)
+            tb_codes = BANK_HIERARCHY.encode_tb(df['ТБ'])
+            gosb_codes = BANK_HIERARCHY.encode_gosb(df['ГОСБ'])
+            row_violations |= add_check('неизвестный ТБ/ГОСБ', file_label,
+                                        BANK_HIERARCHY.unknown_mask(tb_codes, gosb_codes) & ~missing_mask, tn_values)
+            row_violations |= add_check('ГОСБ вне указанного ТБ', file_label,
+                                        BANK_HIERARCHY.hierarchy_mismatch_mask(tb_codes, gosb_codes), tn_values)
+            
+            violating_rows += int(row_violations.sum())
+        
+        # ТН, у которых ТБ/ГОСБ различаются между файлами
+        if df1 is not None and df2 is not None:
+            left = pd.DataFrame({'ТН': tn_keys_by_file['1'], 'ТБ': df1['ТБ'].to_numpy(), 'ГОСБ': df1['ГОСБ'].to_numpy()}).drop_duplicates('ТН')
+            right = pd.DataFrame({'ТН': tn_keys_by_file['2'], 'ТБ': df2['ТБ'].to_numpy(), 'ГОСБ': df2['ГОСБ'].to_numpy()}).drop_duplicates('ТН')
+            joined = left.merge(right, on='ТН', suffixes=('_1', '_2'))
+            # Пропуск в обоих файлах - не различие (NaN != NaN)
+            moved = np.zeros(len(joined), dtype=bool)
+            for column in ('ТБ', 'ГОСБ'):
+                first, second = joined[f'{column}_1'], joined[f'{column}_2']
+                moved |= ((first != second) & ~(first.isna() & second.isna())).to_numpy()
+            add_check('ТБ/ГОСБ различаются между файлами', '1-2', moved, format_tn_keys(joined['ТН'].to_numpy()))
+            violating_rows += int(moved.sum())
+        
+        report = pd.DataFrame(report_rows, columns=['проверка', 'файл', 'строк', 'примеры'])
+        violation_share = violating_rows / total_rows if total_rows else 0.0
+        threshold = VALIDATION_SETTINGS["fail_threshold"]
+        passed = threshold is None or violation_share <= threshold
+        
+        for _, check in report[report['строк'] > 0].iterrows():
+            self.logger.log_error(LOG_MESSAGES["validation_issue"].format(check['проверка'], check['файл'], check['строк'], check['примеры']))
+        self.logger.log_info(LOG_MESSAGES["validation_done"].format(violating_rows, total_rows, violation_share * 100))
+        self.logger.log_debug(LOG_MESSAGES["validation_time"].format(format_execution_time(time.time() - start_time)))
+        self.metrics.record_stage('validate', time.time() - start_time)
+        
+        if VALIDATION_SETTINGS["save_report"] and self.work_dir is not None:
+            timestamp = format_timestamp_suffix(VALIDATION_SETTINGS["suffix_format"])
+            report_path = self.work_dir / OUTPUT_FOLDER / f"{VALIDATION_SETTINGS['report_name']}{self._label_suffix()}{timestamp}.csv"
+            report.to_csv(report_path, sep=';', index=False, encoding='utf-8')
+            self.logger.log_debug(LOG_MESSAGES["file_saved_debug"].format(report_path))
+        
+        if not passed:
+            self.logger.log_error(LOG_MESSAGES["validation_failed"].format(violation_share * 100, threshold * 100))
+            self.errors_count += 1
+        
+        self.validation_report = report
+        return report, passed
+    
+    def process_data(self, dataframes):
+        """
+        Обработка загруженных данных с объединением и расчетом новых колонок
+        
+        Args:
+            dataframes (list): Список загруженных DataFrame'ов
+            
+        Returns:
+            pd.DataFrame: Обработанные данные
+        """
+        start_time = time.time()
+        self.logger.log_info(LOG_MESSAGES["processing_start"])
         
-        last_names = [
-            "Иванов", "Смирнов", "Кузнецов", "Попов", "Васильев", "Петров", "Соколов", "Михайлов", "Новиков", "Федоров",
-            "Морозов", "Волков", "Алексеев", "Лебедев", "Семенов", "Егоров", "Павлов", "Козлов", "Степанов", "Николаев"
-        ]
+        if not dataframes:
+            self.logger.log_error(LOG_MESSAGES["no_data_to_process"])
+            return pd.DataFrame()
         
-        middle_names_male = [
-            "Александрович", "Сергеевич", "Владимирович", "Дмитриевич", "Андреевич", "Алексеевич", "Максимович", "Иванович", "Михайлович", "Николаевич"
-        ]
+        try:
+            # Находим файлы data1 и data2 по именам из self.input_files
+            df1, df2 = self._split_input_frames(dataframes)
+            
+            if df1 is None or df2 is None:
+                self.logger.log_error(LOG_MESSAGES["files_not_found"].format(self.input_files[0]['name'], self.input_files[1]['name']))
+                return pd.DataFrame()
+            
+            self.logger.log_debug(LOG_MESSAGES["files_loaded_info"].format(len(df1), len(df2)))
+            
+            # Целочисленные ключи ТН (разбираются при загрузке, для внешних данных - здесь)
+            tn_keys1 = df1[TN_KEY_COLUMN].to_numpy() if TN_KEY_COLUMN in df1.columns else parse_tn_keys(df1['ТН 10'])
+            tn_keys2 = df2[TN_KEY_COLUMN].to_numpy() if TN_KEY_COLUMN in df2.columns else parse_tn_keys(df2['ТН 10'])
+            
+            # Дополнительные уровни иерархии (например, "регион", "ВСП"), если они есть в обоих файлах
+            extra_level_columns = [
+                level['column'] for level in HIERARCHY_LEVELS
+                if level['column'] not in (None, 'ТБ', 'ГОСБ')
+                and level['column'] in df1.columns and level['column'] in df2.columns
+            ]
+            key_columns = ['ТБ', 'ГОСБ', 'КМ'] + extra_level_columns
+            
+            # Создаем список уникальных ТН из обоих файлов (ТБ, ГОСБ, ФИО берутся из последнего вхождения)
+            all_tn = pd.concat([df1[key_columns], df2[key_columns]], ignore_index=True)
+            all_tn['ТН 10'] = np.concatenate([df1['ТН 10'].to_numpy(dtype=object), df2['ТН 10'].to_numpy(dtype=object)])
+            all_keys = np.concatenate([tn_keys1, tn_keys2])
+            last_occurrence = ~pd.Series(all_keys).duplicated(keep='last').to_numpy()
+            all_tn = all_tn[last_occurrence].reset_index(drop=True)
+            all_keys = all_keys[last_occurrence]
+            
+            self.logger.log_debug(LOG_MESSAGES["unique_tn_list_created"].format(len(all_tn)))
+            
+            # Соединение с файлами 1 и 2 по int64 ключу (берется первое вхождение ТН в файле)
+            data1 = df1.set_axis(tn_keys1, axis=0)
+            data1 = data1[~data1.index.duplicated(keep='first')]
+            data2 = df2.set_axis(tn_keys2, axis=0)
+            data2 = data2[~data2.index.duplicated(keep='first')]
+            in_file1 = data1.index.get_indexer(all_keys) >= 0
+            in_file2 = data2.index.get_indexer(all_keys) >= 0
+            
+            def lookup(data, column, default):
+                """Значения колонки файла для всех ТН (default - если ТН нет в файле)"""
+                values = data[column].reindex(all_keys)
+                if isinstance(values.dtype, pd.CategoricalDtype):
+                    values = values.astype(object)
+                if values.isna().any():
+                    values = values.fillna(default)
+                if pd.api.types.is_integer_dtype(data[column]):
+                    values = values.astype(data[column].dtype)
+                return values.to_numpy()
+            
+            od_current_values = lookup(data1, '2025, тыс. руб.', 0)
+            od_previous_values = lookup(data1, '2024, тыс. руб. на конец месяца', 0)
+            effectiveness1 = lookup(data1, 'Эффективный КМ', "👎")
+            effectiveness2 = lookup(data2, 'Эффективный КМ', "👎")
+            
+            # Отображаемая форма ТН (с лидирующими нулями) - только для вывода
+            display_tn = format_tn_keys(all_keys, all_tn['ТН 10'])
+            
+            # Эффективность берется из файла 2, если ТН там нет - из файла 1
+            effectiveness = np.where(in_file2, effectiveness2, np.where(in_file1, effectiveness1, "👎"))
+            
+            # Производные показатели считаются векторно по всем ТН сразу (см. metrics_kernels)
+            result_df = pd.DataFrame({
+                'ТН 10': display_tn,
+                'ТБ': all_tn['ТБ'].to_numpy(),
+                'ГОСБ': all_tn['ГОСБ'].to_numpy(),
+                'ФИО': all_tn['КМ'].to_numpy(),
+                'ЭФ.КМ': effectiveness_flag(effectiveness),
+                'ОД ТЕКУЩИЙ': od_current_values,
+                'ОД ПРОШЛЫЙ': od_previous_values,
+                'прирост': growth(od_current_values, od_previous_values),
+                'темп': tempo(od_current_values, od_previous_values),
+                'вып условий': conditions_met(od_current_values, od_previous_values),
+                'КОД вывода': 0,  # Будет рассчитано позже
+                'вывод': '',       # Будет заполнено позже
+            })
+            for level_column in extra_level_columns:
+                result_df[level_column] = all_tn[level_column].to_numpy()
+            
+            # Ранги, процентили, места по темпу, КОД вывода и вывод
+            result_df, _ = self._rank_and_classify(result_df)
+            
+            # Упорядочиваем колонки по шаблону RESULT_COLUMNS_LAYOUT
+            result_df = result_df[HIERARCHY_STATS_ENGINE.column_order(RESULT_COLUMNS_LAYOUT, list(result_df.columns))]
+            self._optimize_text_columns(result_df, 'результат')
+            
+            end_time = time.time()
+            execution_time = end_time - start_time
+            self.logger.log_debug(LOG_MESSAGES["data_processing_time"].format(format_execution_time(execution_time)))
+            self.logger.log_debug(LOG_MESSAGES["data_processed_info"].format(len(result_df), len(result_df.columns)))
+            self.metrics.record_stage('process', execution_time)
+            self.metrics.rows_output = len(result_df)
+            self.metrics.unique_tn = len(all_tn)
+            self.logger.log_info(LOG_MESSAGES["processing_end"])
+            
+            return result_df
+            
+        except Exception as e:
+            error_msg = LOG_MESSAGES["processing_error"].format(str(e))
+            self.logger.log_error(error_msg)
+            self.logger.log_debug(LOG_MESSAGES["details_error"].format(traceback.format_exc()))
+            self.errors_count += 1
+            if self.raise_errors:
+                raise
+            return pd.DataFrame()
+    
+    def _rank_and_classify(self, result_df, root_codes=None):
+        """
+        Ранги ОД, процентили, места по темпу, КОД вывода и вывод для всех уровней иерархии
         
-        middle_names_female = [
-            "Александровна", "Сергеевна", "Владимировна", "Дмитриевна", "Андреевна", "Алексеевна", "Максимовна", "Ивановна", "Михайловна", "Николаевна"
-        ]
+        Args:
+            result_df (pd.DataFrame): Показатели КМ (ТБ, ГОСБ, ЭФ.КМ, ОД ТЕКУЩИЙ, прирост, темп, ...)
+            root_codes (np.ndarray): Коды корневых групп (период в панельном режиме), None - одна страна
+            
+        Returns:
+            tuple: (DataFrame с рассчитанными колонками в исходном порядке строк,
+                    размер корневой группы для каждой строки)
+        """
+        # Кодируем ТБ и ГОСБ целыми числами по индексу иерархии
+        tb_codes, gosb_codes, (levels, level_codes, skipped_levels) = self._hierarchy_level_codes(result_df, root_codes)
+        self._check_hierarchy(result_df, tb_codes, gosb_codes)
+        
+        # Раскладка: одна сортировка по (корень, ТБ, ГОСБ, ..., ОД ТЕКУЩИЙ), группы всех уровней непрерывны
+        for level_column in skipped_levels:
+            self.logger.log_debug(LOG_MESSAGES["hierarchy_level_skipped"].format(level_column))
+        layout = SortedPartitionLayout(level_codes, result_df['ОД ТЕКУЩИЙ'].to_numpy())
+        result_df = result_df.take(layout.order).reset_index(drop=True)
+        
+        # Ранги ОД, процентили и места по темпу для всех уровней иерархии
+        # РАНГ ОД - точная реализация Excel формулы:
+        # =СЧЁТЕСЛИМН(КМР[ОД ТЕКУЩИЙ];"<"&КМР[[#Эта строка];[ОД ТЕКУЩИЙ]];КМР[ТБ];КМР[[#Эта строка];[ТБ]])/СЧЁТЕСЛИМН(КМР[ТБ];КМР[[#Эта строка];[ТБ]])
+        # МЕСТО ПО ТЕМПУ - rank(method='min', ascending=False) внутри группы уровня
+        self.logger.log_debug(LOG_MESSAGES["ranks_calculation"])
+        self.logger.log_debug(LOG_MESSAGES["hierarchy_kernel"].format(
+            "однопроходное ядро (numba)" if HIERARCHY_STATS_ENGINE.use_fused_kernel() and FUSED_KERNEL_JIT
+            else "однопроходное ядро (Python)" if HIERARCHY_STATS_ENGINE.use_fused_kernel() else "NumPy"
+        ))
+        population_masks = {
+            name: population_mask(result_df, population['condition'])
+            for name, population in HIERARCHY_STATS_ENGINE.populations.items()
+        }
+        hierarchy_stats = HIERARCHY_STATS_ENGINE.compute(layout, levels, result_df['темп'].to_numpy(), population_masks)
+        for column_name, values in hierarchy_stats.columns.items():
+            result_df[column_name] = values
+        
+        # КОД вывода согласно логике из листа 't' Excel файла (векторно, см. metrics_kernels.kod_vyvoda)
+        # и текст вывода по коду
+        country_sizes = hierarchy_stats.group_sizes['__root__']
+        result_df['КОД вывода'] = kod_vyvoda(
+            result_df['число страна'], result_df['число ТБ'], result_df['число подразделение'],
+            result_df['ЭФ.КМ'], result_df['прирост'],
+            country_sizes, hierarchy_stats.group_sizes['ТБ'], hierarchy_stats.group_sizes['ГОСБ'],
+            self._effective_places(result_df), KOD_VYVODA_THRESHOLDS
+        )
+        result_df['вывод'] = KOD_VYVOD_TEXTS_ARRAY[result_df['КОД вывода'].to_numpy()]
+        
+        # Возвращаем исходный порядок строк
+        result_df = result_df.take(layout.inverse).reset_index(drop=True)
+        return result_df, layout.to_original(country_sizes)
+    
+    def _hierarchy_level_codes(self, result_df, root_codes=None):
+        """
+        Коды ТБ и ГОСБ по BANK_HIERARCHY и вложенные коды групп уровней иерархии
+        
+        Returns:
+            tuple: (коды ТБ, коды ГОСБ, результат HierarchyStatsEngine.level_codes)
+        """
+        tb_codes = BANK_HIERARCHY.encode_tb(result_df['ТБ'])
+        gosb_codes = BANK_HIERARCHY.encode_gosb(result_df['ГОСБ'])
+        return tb_codes, gosb_codes, HIERARCHY_STATS_ENGINE.level_codes(
+            result_df, known_codes={'ТБ': tb_codes, 'ГОСБ': gosb_codes}, root_codes=root_codes
+        )
+    
+    def _hierarchy_group_sizes(self, result_df):
+        """
+        Размер группы каждого уровня иерархии для каждой строки - по тем же группам,
+        что и в _rank_and_classify (пропущенный ТБ/ГОСБ - отдельная группа)
+        
+        Returns:
+            dict: Колонка уровня ('__root__' - страна) -> размеры групп в порядке строк
+        """
+        _, _, (levels, level_codes, _) = self._hierarchy_level_codes(result_df)
+        sizes = {}
+        for level, codes in zip(levels, level_codes):
+            _, inverse, counts = np.unique(codes, return_inverse=True, return_counts=True)
+            sizes[level['column'] or '__root__'] = counts[inverse.reshape(-1)]
+        return sizes
+    
+    def _effective_places(self, result_df):
+        """
+        Места и численность подвыборки для кодов 4 и 2 (RANK_POPULATIONS[...]['classify'])
+        
+        Returns:
+            tuple: (место в ТБ, место в ГОСБ, КМ в ТБ, КМ в ГОСБ) или None - коды по местам среди всех КМ
+        """
+        for population in HIERARCHY_STATS_ENGINE.populations.values():
+            if population['classify'] and {'ТБ', 'ГОСБ'} <= set(population['columns']):
+                (tb_rank, tb_size), (gosb_rank, gosb_size) = population['columns']['ТБ'], population['columns']['ГОСБ']
+                return result_df[tb_rank], result_df[gosb_rank], result_df[tb_size], result_df[gosb_size]
+        return None
+    
+    def load_panel_snapshots(self):
+        """
+        Загрузка истории выгрузок для панельного режима (файлы INPUT по PANEL_SETTINGS['input_pattern'])
+        
+        Returns:
+            list: [{'date': дата выгрузки, 'name': имя файла, 'data': DataFrame}] по возрастанию даты
+        """
+        start_time = time.time()
+        snapshots = []
+        
+        for file_path in sorted((self.work_dir / INPUT_FOLDER).glob(PANEL_SETTINGS["input_pattern"])):
+            match = re.search(PANEL_SETTINGS["date_regex"], file_path.stem)
+            if match is None:
+                self.logger.log_debug(LOG_MESSAGES["panel_snapshot_skipped"].format(file_path.name, PANEL_SETTINGS["date_regex"]))
+                continue
+            
+            try:
+                df = read_table_file(file_path)
+                df[TN_KEY_COLUMN] = parse_tn_keys(df['ТН 10'])
+                self._optimize_text_columns(df, file_path.name)
+                snapshots.append({
+                    'date': datetime.strptime(match.group(1), PANEL_SETTINGS["date_format"]),
+                    'name': file_path.name,
+                    'data': df
+                })
+                self.logger.log_debug(LOG_MESSAGES["rows_columns_loaded"].format(len(df), len(df.columns), file_path.name))
+                self.metrics.record_rows_loaded(file_path.name, len(df))
+                self.files_processed += 1
+                
+            except Exception as e:
+                error_msg = LOG_MESSAGES["load_file_error"].format(file_path.name, str(e))
+                self.logger.log_error(error_msg)
+                self.logger.log_debug(LOG_MESSAGES["details_error"].format(traceback.format_exc()))
+                self.errors_count += 1
+        
+        snapshots.sort(key=lambda snapshot: snapshot['date'])
+        if snapshots:
+            self.logger.log_info(LOG_MESSAGES["panel_snapshots_found"].format(
+                len(snapshots), snapshots[0]['date'].date(), snapshots[-1]['date'].date()
+            ))
+        else:
+            self.logger.log_error(LOG_MESSAGES["panel_no_snapshots"].format(PANEL_SETTINGS["input_pattern"]))
+        
+        self.logger.log_debug(LOG_MESSAGES["file_loading_time"].format(format_execution_time(time.time() - start_time)))
+        self.metrics.record_stage('load', time.time() - start_time)
+        return snapshots
+    
+    def process_panel(self, snapshots):
+        """
+        Расчет показателей для всей истории выгрузок за один сгруппированный проход
+        
+        Все выгрузки собираются в одну длинную таблицу по (ТН, дата). Дата -
+        корневой уровень иерархии, поэтому ранги, процентили, места по темпу
+        и КОД вывода считаются внутри каждой даты одной сортировкой. Добавляются
+        признаки динамики: серия выгрузок подряд в топе страны по темпу и
+        скользящий темп.
+        
+        Args:
+            snapshots (list): Выгрузки из load_panel_snapshots
+            
+        Returns:
+            pd.DataFrame: История показателей (по строке на ТН и дату)
+        """
+        start_time = time.time()
+        self.logger.log_info(LOG_MESSAGES["processing_start"])
+        
+        if not snapshots:
+            self.logger.log_error(LOG_MESSAGES["no_data_to_process"])
+            return pd.DataFrame()
+        
+        try:
+            date_column = PANEL_SETTINGS["date_column"]
+            extra_level_columns = [
+                level['column'] for level in HIERARCHY_LEVELS
+                if level['column'] not in (None, 'ТБ', 'ГОСБ')
+                and all(level['column'] in snapshot['data'].columns for snapshot in snapshots)
+            ]
+            columns = ['ТН 10', TN_KEY_COLUMN, 'ТБ', 'ГОСБ', 'КМ', 'Эффективный КМ',
+                       '2025, тыс. руб.', '2024, тыс. руб. на конец месяца'] + extra_level_columns
+            
+            # Длинная таблица: все выгрузки подряд, номер выгрузки - по возрастанию даты
+            panel = pd.concat([snapshot['data'][columns] for snapshot in snapshots], ignore_index=True)
+            period_codes = np.repeat(np.arange(len(snapshots)), [len(snapshot['data']) for snapshot in snapshots])
+            dates = np.array([snapshot['date'] for snapshot in snapshots], dtype='datetime64[ns]')
+            
+            # Дубли ТН внутри выгрузки - берется последнее вхождение
+            tn_keys = panel[TN_KEY_COLUMN].to_numpy()
+            keep = ~pd.DataFrame({'tn': tn_keys, 'period': period_codes}).duplicated(keep='last').to_numpy()
+            panel = panel[keep].reset_index(drop=True)
+            tn_keys = tn_keys[keep]
+            period_codes = period_codes[keep]
+            
+            od_current_values = panel['2025, тыс. руб.'].fillna(0).to_numpy()
+            od_previous_values = panel['2024, тыс. руб. на конец месяца'].fillna(0).to_numpy()
+            effectiveness = panel['Эффективный КМ'].astype(object).fillna("👎").to_numpy()
+            
+            result_df = pd.DataFrame({
+                'ТН 10': format_tn_keys(tn_keys, panel['ТН 10']),
+                'ТБ': panel['ТБ'].to_numpy(),
+                'ГОСБ': panel['ГОСБ'].to_numpy(),
+                'ФИО': panel['КМ'].to_numpy(),
+                'ЭФ.КМ': effectiveness_flag(effectiveness),
+                'ОД ТЕКУЩИЙ': od_current_values,
+                'ОД ПРОШЛЫЙ': od_previous_values,
+                'прирост': growth(od_current_values, od_previous_values),
+                'темп': tempo(od_current_values, od_previous_values),
+                'вып условий': conditions_met(od_current_values, od_previous_values)
+            })
+            for level_column in extra_level_columns:
+                result_df[level_column] = panel[level_column].to_numpy()
+            
+            # Все уровни иерархии считаются внутри даты выгрузки
+            result_df, country_sizes = self._rank_and_classify(result_df, root_codes=period_codes)
+            
+            # Динамика: серия выгрузок подряд в топе страны по темпу и скользящий темп
+            top_flags = (result_df['число страна'] <= PANEL_SETTINGS["top_share"] * country_sizes).to_numpy()
+            streak, rolling_tempo = panel_trend_features(
+                tn_keys, period_codes, top_flags, result_df['темп'].to_numpy(), PANEL_SETTINGS["rolling_window"]
+            )
+            result_df[PANEL_SETTINGS["top_streak_column"]] = streak
+            result_df[PANEL_SETTINGS["rolling_tempo_column"]] = rolling_tempo
+            result_df.insert(0, date_column, dates[period_codes])
+            
+            # Порядок колонок: дата, колонки результата, признаки динамики
+            result_df = result_df[[date_column] + HIERARCHY_STATS_ENGINE.column_order(
+                RESULT_COLUMNS_LAYOUT, [column for column in result_df.columns if column != date_column]
+            )]
+            self._optimize_text_columns(result_df, 'панель')
+            
+            unique_tn = len(np.unique(tn_keys))
+            self.logger.log_info(LOG_MESSAGES["panel_processed"].format(len(result_df), len(snapshots), unique_tn))
+            self.logger.log_debug(LOG_MESSAGES["data_processing_time"].format(format_execution_time(time.time() - start_time)))
+            self.metrics.record_stage('process', time.time() - start_time)
+            self.metrics.rows_output = len(result_df)
+            self.metrics.unique_tn = unique_tn
+            self.logger.log_info(LOG_MESSAGES["processing_end"])
+            return result_df
+            
+        except Exception as e:
+            error_msg = LOG_MESSAGES["processing_error"].format(str(e))
+            self.logger.log_error(error_msg)
+            self.logger.log_debug(LOG_MESSAGES["details_error"].format(traceback.format_exc()))
+            self.errors_count += 1
+            return pd.DataFrame()
+    
+    def save_panel(self, panel_df):
+        """
+        Сохранение истории показателей (формат - PANEL_SETTINGS['output_extension'])
+        
+        Args:
+            panel_df (pd.DataFrame): Результат process_panel
+        """
+        if panel_df.empty:
+            self.logger.log_error(LOG_MESSAGES["no_data_to_save"])
+            return
+        
+        start_time = time.time()
+        try:
+            filename = f"{PANEL_SETTINGS['output_name']}{format_timestamp_suffix(PANEL_SETTINGS['suffix_format'])}{PANEL_SETTINGS['output_extension']}"
+            file_path = self.work_dir / OUTPUT_FOLDER / filename
+            write_table_file(panel_df, file_path)
+            self.logger.log_info(LOG_MESSAGES["panel_saved"].format(filename))
+            self.outputs_created += 1
+            self.metrics.record_stage('save', time.time() - start_time)
+            
+        except Exception as e:
+            error_msg = LOG_MESSAGES["save_error"].format(str(e))
+            self.logger.log_error(error_msg)
+            self.logger.log_debug(LOG_MESSAGES["details_error"].format(traceback.format_exc()))
+            self.errors_count += 1
+    
+    def run_panel(self):
+        """Запуск панельного режима: история выгрузок -> расчет за один проход -> сохранение"""
+        self.start_time = time.time()
+        self.metrics = RunMetrics('panel', PANEL_SETTINGS["input_pattern"])
+        
+        try:
+            snapshots = self.load_panel_snapshots()
+            panel_df = self.process_panel(snapshots)
+            self.save_panel(panel_df)
+            
+        except Exception as e:
+            error_msg = LOG_MESSAGES["processing_error"].format(str(e))
+            self.logger.log_error(error_msg)
+            self.logger.log_debug(LOG_MESSAGES["details_error"].format(traceback.format_exc()))
+            self.errors_count += 1
+        
+        finally:
+            # Генерируем сводку
+            self.generate_summary()
+    
+    def find_input_pairs(self):
+        """
+        Поиск пар входных файлов для пакетного режима (см. BATCH_SETTINGS)
+        
+        Returns:
+            list: [{'label': ключ пары, 'input_files': пара в формате INPUT_FILES}] по возрастанию ключа
+        """
+        input_dir = self.work_dir / INPUT_FOLDER
+        first_prefix = BATCH_SETTINGS["first_prefix"]
+        second_prefix = BATCH_SETTINGS["second_prefix"]
+        pairs = []
+        
+        for extension in BATCH_SETTINGS["extensions"]:
+            # Ключ - остаток имени после префикса (части '_partNNN' относятся к одному файлу)
+            keys = {
+                re.sub(r'_part\d+$', '', path.stem)[len(first_prefix):]
+                for path in input_dir.glob(f"{first_prefix}*{extension}")
+            }
+            for key in sorted(keys):
+                second_name = f"{second_prefix}{key}"
+                if not ((input_dir / f"{second_name}{extension}").exists() or any(input_dir.glob(f"{second_name}_part*{extension}"))):
+                    self.logger.log_debug(LOG_MESSAGES["batch_pair_incomplete"].format(f"{first_prefix}{key}{extension}", f"{second_name}{extension}"))
+                    continue
+                pairs.append({
+                    'label': key.strip('_') or extension.lstrip('.'),
+                    'input_files': [
+                        {"name": f"{first_prefix}{key}", "extension": extension},
+                        {"name": second_name, "extension": extension}
+                    ]
+                })
+        
+        pairs.sort(key=lambda pair: pair['label'])
+        return pairs
+    
+    def _batch_task(self, pair):
+        """Задача процесса-исполнителя конвейера для пары (см. batch_load_task / batch_save_task)"""
+        return {
+            'work_dir': str(self.work_dir),
+            'logger': {
+                'log_dir': str(self.logger.log_dir),
+                'log_name': self.logger.log_name,
+                'log_extension': self.logger.log_extension,
+                'suffix_format': self.logger.suffix_format,
+                'level': self.logger.level
+            },
+            'input_files': pair['input_files'],
+            'label': pair['label'],
+            'plan': self.plan
+        }
+    
+    def _process_batch_pair(self, pair, dataframes):
+        """
+        Проверка и расчет одной пары в основном процессе
+        
+        Returns:
+            pd.DataFrame: Результат (пустой - пара пропущена)
+        """
+        self.input_files = pair['input_files']
+        self.output_label = pair['label']
+        
+        if VALIDATION_SETTINGS["enabled"]:
+            _, passed = self.validate_inputs(dataframes)
+            if not passed:
+                return pd.DataFrame()
+        
+        result_df = self.process_data(dataframes)
+        if result_df.empty:
+            self.logger.log_error(LOG_MESSAGES["batch_pair_skipped"].format(pair['label']))
+        return result_df
+    
+    def _merge_batch_result(self, result):
+        """Учет счетчиков и метрик, полученных от процесса-исполнителя конвейера"""
+        self.errors_count += result['errors_count']
+        self.files_processed += result['files_processed']
+        self.outputs_created += result['outputs_created']
+        for stage, seconds in result['stage_seconds'].items():
+            self.metrics.record_stage(stage, seconds)
+        for file_name, rows in result['rows_loaded'].items():
+            self.metrics.record_rows_loaded(file_name, rows)
+        self.text_memory['before'] += result['text_memory']['before']
+        self.text_memory['after'] += result['text_memory']['after']
+    
+    def _run_batch_pipelined(self, pairs):
+        """
+        Конвейер: загрузка (процесс) -> расчет (основной процесс) -> запись (процесс)
+        
+        Между этапами не больше BATCH_SETTINGS['queue_size'] пар, поэтому
+        в памяти одновременно находятся лишь несколько пар.
+        
+        Returns:
+            int: Количество пар с сохраненным результатом
+        """
+        queue_size = max(1, BATCH_SETTINGS["queue_size"])
+        pending_loads = []
+        pending_saves = []
+        next_load = 0
+        pairs_done = 0
+        rows_output = 0
+        
+        def collect_save():
+            nonlocal pairs_done
+            pair, future = pending_saves.pop(0)
+            try:
+                self._merge_batch_result(future.result())
+                pairs_done += 1
+            except Exception as e:
+                self.logger.log_error(LOG_MESSAGES["batch_pair_error"].format(pair['label'], str(e)))
+                self.errors_count += 1
+        
+        with ProcessPoolExecutor(max_workers=1) as loader, ProcessPoolExecutor(max_workers=1) as writer:
+            for number, pair in enumerate(pairs, start=1):
+                # Загрузка следующих пар идет, пока считается текущая
+                while next_load < len(pairs) and len(pending_loads) <= queue_size:
+                    pending_loads.append(loader.submit(batch_load_task, self._batch_task(pairs[next_load])))
+                    next_load += 1
+                
+                try:
+                    loaded = pending_loads.pop(0).result()
+                    self._merge_batch_result(loaded)
+                    self.logger.log_info(LOG_MESSAGES["batch_pair_start"].format(pair['label'], number, len(pairs)))
+                    result_df = self._process_batch_pair(pair, loaded['dataframes'])
+                except Exception as e:
+                    self.logger.log_error(LOG_MESSAGES["batch_pair_error"].format(pair['label'], str(e)))
+                    self.logger.log_debug(LOG_MESSAGES["details_error"].format(traceback.format_exc()))
+                    self.errors_count += 1
+                    continue
+                
+                if result_df.empty:
+                    continue
+                rows_output += len(result_df)
+                
+                # Запись результата - в процессе записи, очередь ограничена
+                while len(pending_saves) >= queue_size:
+                    collect_save()
+                pending_saves.append((pair, writer.submit(batch_save_task, dict(self._batch_task(pair), data=result_df))))
+            
+            while pending_saves:
+                collect_save()
+        
+        self.metrics.rows_output = rows_output
+        return pairs_done
+    
+    def _run_batch_serial(self, pairs):
+        """
+        Обработка пар по очереди в основном процессе
+        
+        Returns:
+            int: Количество пар с сохраненным результатом
+        """
+        pairs_done = 0
+        rows_output = 0
+        for number, pair in enumerate(pairs, start=1):
+            try:
+                self.input_files = pair['input_files']
+                dataframes = self.load_excel_files()
+                self.logger.log_info(LOG_MESSAGES["batch_pair_start"].format(pair['label'], number, len(pairs)))
+                result_df = self._process_batch_pair(pair, dataframes)
+                if result_df.empty:
+                    continue
+                rows_output += len(result_df)
+                self.save_outputs(result_df)
+                pairs_done += 1
+                
+            except Exception as e:
+                self.logger.log_error(LOG_MESSAGES["batch_pair_error"].format(pair['label'], str(e)))
+                self.logger.log_debug(LOG_MESSAGES["details_error"].format(traceback.format_exc()))
+                self.errors_count += 1
+        
+        self.metrics.rows_output = rows_output
+        return pairs_done
+    
+    def run_batch(self):
+        """Запуск пакетного режима: все пары входных файлов из INPUT (конвейером или по очереди)"""
+        self.start_time = time.time()
+        self.metrics = RunMetrics('batch', f"{BATCH_SETTINGS['first_prefix']}*|{BATCH_SETTINGS['second_prefix']}*")
+        
+        try:
+            pairs = self.find_input_pairs()
+            if not pairs:
+                self.logger.log_error(LOG_MESSAGES["batch_no_pairs"].format(
+                    BATCH_SETTINGS["first_prefix"], BATCH_SETTINGS["second_prefix"], self.work_dir / INPUT_FOLDER
+                ))
+                self.errors_count += 1
+                return
+            self.logger.log_info(LOG_MESSAGES["batch_pairs_found"].format(
+                len(pairs), ", ".join(pair['label'] for pair in pairs)
+            ))
+            
+            # План - по первой паре (даты одной выгрузки близки по размеру)
+            if PLANNER_SETTINGS["enabled"]:
+                self.input_files = pairs[0]['input_files']
+                self.plan_run()
+            
+            if BATCH_SETTINGS["pipelined"] and len(pairs) > 1:
+                pairs_done = self._run_batch_pipelined(pairs)
+            else:
+                pairs_done = self._run_batch_serial(pairs)
+            # Уникальные ТН считаются внутри пары, для пакета метрика не пишется
+            self.metrics.unique_tn = None
+            
+            execution_time = time.time() - self.start_time
+            self.logger.log_info(LOG_MESSAGES["batch_done"].format(
+                pairs_done, len(pairs), format_execution_time(execution_time),
+                format_execution_time(execution_time / len(pairs)),
+                *[format_execution_time(self.metrics.stage_seconds.get(stage, 0.0)) for stage in PIPELINE_STAGES]
+            ))
+            
+        except Exception as e:
+            error_msg = LOG_MESSAGES["processing_error"].format(str(e))
+            self.logger.log_error(error_msg)
+            self.logger.log_debug(LOG_MESSAGES["details_error"].format(traceback.format_exc()))
+            self.errors_count += 1
+        
+        finally:
+            # Генерируем сводку
+            self.generate_summary()
+    
+    def _optimize_text_columns(self, df, label):
+        """
+        Компактные типы текстовых колонок (см. optimize_text_columns) с учетом экономии памяти
+        
+        Args:
+            df (pd.DataFrame): Данные (изменяются на месте)
+            label (str): Имя набора данных для лога
+        """
+        if not TEXT_COLUMN_TYPES["enabled"] or (self.plan is not None and not self.plan['compact_text']):
+            return
+        converted, memory_before, memory_after = optimize_text_columns(df)
+        self.text_memory['before'] += memory_before
+        self.text_memory['after'] += memory_after
+        if converted:
+            self.logger.log_debug(LOG_MESSAGES["text_columns_optimized"].format(
+                label, format_memory_size(memory_before), format_memory_size(memory_after)
+            ))
+    
+    def _check_hierarchy(self, result_df, tb_codes, gosb_codes):
+        """
+        Векторная проверка соответствия ГОСБ указанному ТБ по BANK_STRUCTURE
         
-        # Выбираем пол случайно
-        is_male = np.random.choice([True, False])
+        Несоответствия сохраняются в self.hierarchy_mismatches и логируются.
+        
+        Args:
+            result_df (pd.DataFrame): Данные с колонками ТБ и ГОСБ
+            tb_codes (np.ndarray): Коды ТБ
+            gosb_codes (np.ndarray): Коды ГОСБ
+        """
+        mismatch_mask = BANK_HIERARCHY.hierarchy_mismatch_mask(tb_codes, gosb_codes)
+        unknown_mask = BANK_HIERARCHY.unknown_mask(tb_codes, gosb_codes)
+        self.hierarchy_mismatches = result_df.loc[mismatch_mask, ['ТН 10', 'ТБ', 'ГОСБ']]
+        
+        if mismatch_mask.any():
+            self.logger.log_error(LOG_MESSAGES["hierarchy_mismatch"].format(int(mismatch_mask.sum())))
+            self.logger.log_debug(LOG_MESSAGES["hierarchy_mismatch_examples"].format(
+                self.hierarchy_mismatches.head(5).to_dict('records')
+            ))
+        if unknown_mask.any():
+            self.logger.log_error(LOG_MESSAGES["hierarchy_unknown"].format(int(unknown_mask.sum())))
+    
+    def save_outputs(self, processed_data):
+        """
+        Сохранение обработанных данных в выходные файлы
+        
+        Args:
+            processed_data (pd.DataFrame): Обработанные данные
+        """
+        start_time = time.time()
+        if processed_data.empty:
+            self.logger.log_error(LOG_MESSAGES["no_data_to_save"])
+            return
+        
+        for output_config in OUTPUT_FILES:
+            try:
+                # Формируем имя файла с суффиксом
+                timestamp = datetime.now().strftime(
+                    output_config["suffix_format"]
+                    .replace("YYYY", "%Y")
+                    .replace("MM", "%m")
+                    .replace("DD", "%d")
+                    .replace("HH", "%H")
+                    .replace("MM", "%M")
+                    .replace("SS", "%S")
+                )
+                
+                filename = f"{output_config['name']}{self._label_suffix()}{timestamp}{output_config['extension']}"
+                file_path = self.work_dir / OUTPUT_FOLDER / filename
+                
+                # Сохраняем файл в зависимости от формата
+                # ЗАКЛАДКА ДЛЯ БУДУЩЕГО CSV:
+                # if output_config['extension'].lower() == '.csv':
+                #     # Сохраняем CSV с разделителем ";"
+                #     processed_data.to_csv(file_path, sep=';', index=False, encoding='utf-8')
+                # if output_config['extension'].lower() == '.xlsx':
+                # 
+                # Текущая реализация - только Excel файл
+                if output_config['extension'].lower() == '.xlsx' and self._use_excel_sharding(processed_data):
+                    # Большой результат - разбиваем на части и пишем параллельно
+                    self.save_sharded_excel(processed_data, file_path)
+                    continue
+                
+                if output_config['extension'].lower() == '.xlsx':
+                    # Сохраняем Excel с автофильтром и форматированием
+                    with pd.ExcelWriter(file_path, engine='openpyxl') as writer:
+                        processed_data.to_excel(writer, index=False)
+                        ws = writer.sheets[next(iter(writer.sheets))]
+                        
+                        # Автофильтр на A1, фиксация панелей на A2 и групповое форматирование колонок
+                        format_worksheet(ws, list(processed_data.columns), len(processed_data))
+                        
+                        # Сводные листы по ТБ/ГОСБ и лидеры по темпу
+                        if SUMMARY_SHEETS["enabled"]:
+                            for sheet_name, table in self.build_summary_tables(processed_data).items():
+                                table.to_excel(writer, sheet_name=sheet_name, index=False)
+                                format_worksheet(writer.sheets[sheet_name], list(table.columns), len(table))
+                    
+                    max_row = len(processed_data) + 1  # +1 потому что pandas.to_excel добавляет заголовки
+                    last_col_letter = get_column_letter(len(processed_data.columns))
+                    self.logger.log_debug(LOG_MESSAGES["autofilter_added"].format(f"A1:{last_col_letter}{max_row}"))
+                    self.logger.log_debug(LOG_MESSAGES["panes_frozen"])
+                    self._log_formatting_applied()
+                
+                self.logger.log_info(LOG_MESSAGES["file_saved"].format(filename))
+                self.logger.log_debug(LOG_MESSAGES["file_saved_debug_old"].format(file_path))
+                self.outputs_created += 1
+                
+            except Exception as e:
+                error_msg = LOG_MESSAGES["save_error"].format(f"{output_config['name']}: {str(e)}")
+                self.logger.log_error(error_msg)
+                self.logger.log_debug(LOG_MESSAGES["details_error"].format(traceback.format_exc()))
+                self.errors_count += 1
         
-        if is_male:
-            first_name = np.random.choice(first_names_male)
-            middle_name = np.random.choice(middle_names_male)
-        else:
-            first_name = np.random.choice(first_names_female)
-            middle_name = np.random.choice(middle_names_female)
+        # Бинарный снимок для быстрых читателей (опционально)
+        if SNAPSHOT_SETTINGS["enabled"]:
+            self.save_snapshot(processed_data)
         
-        last_name = np.random.choice(last_names)
+        # Книги по подразделениям для рассылки (опционально)
+        if DISTRIBUTION_SETTINGS["enabled"]:
+            self.save_distribution(processed_data)
         
-        return f"{last_name} {first_name} {middle_name}"
-    
-    def _generate_effective_status(self):
-        """Генерация статуса эффективности"""
-        # 80% эффективных, 20% неэффективных
-        is_effective = np.random.random() < DATA_PARAMS["effective_share"]
-        return "👍" if is_effective else "👎"
+        end_time = time.time()
+        execution_time = end_time - start_time
+        self.logger.log_debug(LOG_MESSAGES["file_saving_time"].format(format_execution_time(execution_time)))
+        self.metrics.record_stage('save', execution_time)
     
-    def _generate_operational_income_data(self):
-        """Генерация данных об операционном доходе"""
-        # Операционный доход на 31 июля 2025 (финальный)
-        income_july = np.random.randint(DATA_PARAMS["operational_income_final_min"], DATA_PARAMS["operational_income_final_max"] + 1)
+    def build_summary_tables(self, processed_data):
+        """
+        Сводные таблицы по ТБ и ГОСБ и лидеры по темпу в каждом ТБ
         
-        # Операционный доход на 20 августа 2025 (текущий, обязательно >= финального)
-        # Минимальный доход = доход на 31 июля, максимальный = заданный максимум
-        income_august = np.random.randint(income_july, DATA_PARAMS["operational_income_current_max"] + 1)
+        Args:
+            processed_data (pd.DataFrame): Обработанные данные
+            
+        Returns:
+            dict: Имя листа -> DataFrame
+        """
+        tb_codes = BANK_HIERARCHY.encode_tb(processed_data['ТБ'])
+        gosb_codes = BANK_HIERARCHY.encode_gosb(processed_data['ГОСБ'])
+        effective = processed_data['ЭФ.КМ'].to_numpy(dtype=np.float64)
+        od_values = processed_data['ОД ТЕКУЩИЙ'].to_numpy(dtype=np.float64)
+        kod_values = processed_data['КОД вывода'].to_numpy()
         
-        # Прирост в процентах
-        growth_percent = ((income_august - income_july) / income_july * 100) if income_july > 0 else 0
+        # Пары (ТБ, ГОСБ): ГОСБ с неверным ТБ попадает в отдельную строку сводки
+        pair_keys = tb_codes * (int(gosb_codes.max()) + 1) + gosb_codes
         
-        # Прирост в тыс. руб.
-        growth_amount = income_august - income_july
+        tables = {}
+        for sheet_name, group_keys, label_columns in (
+            (SUMMARY_SHEETS["tb_sheet_name"], tb_codes, ['ТБ']),
+            (SUMMARY_SHEETS["gosb_sheet_name"], pair_keys, ['ТБ', 'ГОСБ'])
+        ):
+            # Плотные коды групп (в порядке BANK_STRUCTURE) и первая строка каждой группы для подписи
+            _, first_rows, codes = np.unique(group_keys, return_index=True, return_inverse=True)
+            codes = codes.reshape(-1)
+            summary = grouped_summary(codes, effective, od_values, kod_values)
+            
+            table = processed_data[label_columns].iloc[first_rows].reset_index(drop=True)
+            table['Численность'] = summary['count']
+            table['Доля эффективных'] = summary['effective_share']
+            table['Сумма ОД'] = summary['od_sum']
+            table['Медиана ОД'] = summary['od_median']
+            for kod in range(summary['kod_counts'].shape[1]):
+                table[f"КОД {kod}"] = summary['kod_counts'][:, kod]
+            tables[sheet_name] = table
         
-        # ОД конец квартала = август 2025
-        od_quarter = income_august
+        # Лидеры по темпу внутри каждого ТБ
+        top_columns = ['ТБ', 'ГОСБ', 'ТН 10', 'ФИО', 'темп', 'ОД ТЕКУЩИЙ', 'прирост', 'КОД вывода']
+        top_parts = []
+        for tb_code, rows in top_n_within_groups(tb_codes, processed_data['темп'].to_numpy(), SUMMARY_SHEETS["top_n"]):
+            part = processed_data[top_columns].iloc[rows].reset_index(drop=True)
+            part.insert(1, 'Место', np.arange(1, len(rows) + 1))
+            top_parts.append(part)
+        tables[SUMMARY_SHEETS["top_sheet_name"]] = pd.concat(top_parts, ignore_index=True) if top_parts else pd.DataFrame(columns=top_columns)
         
-        return {
-            'operational_income_july': income_july,
-            'operational_income_august': income_august,
-            'growth_percent': round(growth_percent, 2),
-            'growth_amount': growth_amount,
-            'od_quarter': income_august
-        }
+        self.logger.log_debug(LOG_MESSAGES["summary_tables_built"].format(
+            {name: len(table) for name, table in tables.items()}
+        ))
+        return tables
     
-    def create_sample_data(self):
-        """Создание тестовых данных для анализа эффективности"""
-        self.start_time = time.time()
+    def _log_formatting_applied(self):
+        """Логирование информации о примененном групповом и специальном форматировании"""
+        formatted_columns = 0
+        for group_name, group_config in COLUMN_FORMAT_GROUPS.items():
+            formatted_columns += len(group_config['columns'])
         
-        try:
-            self.logger.log_info(LOG_MESSAGES["data_generation_start"])
-            
-            # Создаем списки для данных
-            data1 = []  # Данные на 31 июля 2025 года
-            data2 = []  # Данные на 20 августа 2025 года
-            used_fios = set()
-            
-            # Генерируем базовый список сотрудников для 31 июля 2025 года
-            base_employees = []
-            for i in range(DATA_PARAMS["total_employees"]):
-                # Генерируем уникальный ФИО
-                while True:
-                    fio = self._generate_fio()
-                    if fio not in used_fios:
-                        used_fios.add(fio)
-                        break
-                
-                # Выбираем случайный ТБ и ГОСБ
-                tb = np.random.choice(TERRITORIAL_BANKS)
-                gosb = np.random.choice(self.tb_gosb_mapping[tb])
-                
-                # Генерируем остальные данные для 31 июля 2025 года
-                tn = self._generate_tn()
-                effective_status = self._generate_effective_status()
-                
-                # Генерируем базовый доход (как бы на начало периода) и доход на 31 июля (финальный)
-                # Базовый доход в диапазоне от 60% до 90% от минимального финального дохода
-                base_income_min = int(DATA_PARAMS["operational_income_final_min"] * 0.6)
-                base_income_max = int(DATA_PARAMS["operational_income_final_min"] * 0.9)
-                base_income = np.random.randint(base_income_min, base_income_max + 1)
-                income_july = np.random.randint(DATA_PARAMS["operational_income_final_min"], DATA_PARAMS["operational_income_final_max"] + 1)
-                
-                # Вычисляем прирост от базового дохода до 31 июля (финальный)
-                growth_percent_july = ((income_july - base_income) / base_income * 100) if base_income > 0 else 0
-                growth_amount_july = income_july - base_income
-                
-                # Создаем строку данных для 31 июля 2025 года (финальный период)
-                row_july = {
-                    'ТН 10': tn,
-                    'ТБ': tb,
-                    'ГОСБ': gosb,
-                    'КМ': fio,
-                    'Эффективный КМ': effective_status,
-                    '2025, тыс. руб.': income_july,
-                    '2024, тыс. руб. на конец месяца': base_income,
-                    'Прирост, %': round(growth_percent_july, 2),
-                    'Прирост, тыс. руб.': growth_amount_july,
-                    'ОД конец квартала, тыс. руб.': income_july
-                }
-                
-                data1.append(row_july)
-                base_employees.append({
-                    'fio': fio,
-                    'tn': tn,
-                    'tb': tb,
-                    'gosb': gosb,
-                    'effective_status': effective_status,
-                    'income_july': income_july
-                })
-                
-                # Логируем прогресс каждые 100 сотрудников
-                if (i + 1) % 100 == 0:
-                    self.logger.log_debug(LOG_MESSAGES["progress_employees"].format(i + 1))
-            
-            # Теперь создаем данные для 20 августа 2025 года
-            # 90% сотрудников остаются, 5% новых, 5% убираем
-            overlap_count = int(DATA_PARAMS["total_employees"] * DATA_PARAMS["employee_overlap"])
-            new_count = int(DATA_PARAMS["total_employees"] * DATA_PARAMS["new_employees_share"])
-            removed_count = DATA_PARAMS["total_employees"] - overlap_count - new_count
-            
-            # Сотрудники, которые остаются (90%)
-            remaining_employees = np.random.choice(base_employees, overlap_count, replace=False)
-            
-            # Создаем данные для оставшихся сотрудников
-            for emp in remaining_employees:
-                # Генерируем доход на 20 августа (текущий, >= дохода на 31 июля)
-                # Минимальный доход = доход на 31 июля, максимальный = заданный максимум
-                income_august = np.random.randint(emp['income_july'], DATA_PARAMS["operational_income_current_max"] + 1)
-                
-                # Вычисляем прирост от финального до 31 июля до текущего на 20 августа
-                growth_percent = ((income_august - emp['income_july']) / emp['income_july'] * 100) if emp['income_july'] > 0 else 0
-                growth_amount = income_august - emp['income_july']
-                
-                row_august = {
-                    'ТН 10': emp['tn'],
-                    'ТБ': emp['tb'],
-                    'ГОСБ': emp['gosb'],
-                    'КМ': emp['fio'],
-                    'Эффективный КМ': emp['effective_status'],
-                    '2025, тыс. руб.': income_august,
-                    '2024, тыс. руб. на конец месяца': emp['income_july'],
-                    'Прирост, %': round(growth_percent, 2),
-                    'Прирост, тыс. руб.': growth_amount,
-                    'ОД конец квартала, тыс. руб.': income_august
-                }
-                
-                data2.append(row_august)
-            
-            # Добавляем новых сотрудников (5%)
-            for i in range(new_count):
-                # Генерируем уникальный ФИО
-                while True:
-                    fio = self._generate_fio()
-                    if fio not in used_fios:
-                        used_fios.add(fio)
-                        break
-                
-                # Выбираем случайный ТБ и ГОСБ
-                tb = np.random.choice(TERRITORIAL_BANKS)
-                gosb = np.random.choice(self.tb_gosb_mapping[tb])
-                
-                # Генерируем данные для нового сотрудника
-                tn = self._generate_tn()
-                effective_status = self._generate_effective_status()
-                income_data = self._generate_operational_income_data()
-                
-                # Создаем строку данных для нового сотрудника
-                row_august = {
-                    'ТН 10': tn,
-                    'ТБ': tb,
-                    'ГОСБ': gosb,
-                    'КМ': fio,
-                    'Эффективный КМ': effective_status,
-                    '2025, тыс. руб.': income_data['operational_income_august'],
-                    '2024, тыс. руб. на конец месяца': income_data['operational_income_july'],
-                    'Прирост, %': income_data['growth_percent'],
-                    'Прирост, тыс. руб.': income_data['growth_amount'],
-                    'ОД конец квартала, тыс. руб.': income_data['od_quarter']
-                }
-                
-                data2.append(row_august)
-            
-            # Создаем DataFrame'ы
-            df1 = pd.DataFrame(data1)  # Данные на 31 июля 2025 года
-            df2 = pd.DataFrame(data2)  # Данные на 20 августа 2025 года
-            self.employees_created = len(df1) + len(df2)
-            
-            # Анализируем распределение
-            self._analyze_distribution(df1, df2)
-            
-            # Сохраняем файлы
-            self._save_data_files(df1, df2)
-            
-            self.logger.log_info(LOG_MESSAGES["data_generation_end"])
-            
-        except Exception as e:
-            error_msg = LOG_MESSAGES["generation_error"].format(str(e))
-            self.logger.log_error(error_msg)
-            self.logger.log_debug(LOG_MESSAGES["details_error"].format(traceback.format_exc()))
-            self.errors_count += 1
+        # Подсчитываем колонки со специальным форматированием
+        special_formatted = 0
+        for col_name, col_config in COLUMN_SPECIAL_FORMATS.items():
+            if col_config.get('format_type') == 'padded_number':
+                special_formatted += 1
         
-        finally:
-            # Генерируем сводку
-            self._generate_summary()
+        self.logger.log_debug(LOG_MESSAGES["group_formatting_applied"].format(len(COLUMN_FORMAT_GROUPS), formatted_columns))
+        self.logger.log_debug(LOG_MESSAGES["special_formats_applied"].format(len(COLUMN_SPECIAL_FORMATS)))
+        if special_formatted > 0:
+            self.logger.log_debug(LOG_MESSAGES["padded_number_formatted"].format(special_formatted))
+        
+        enabled_rules = [name for name, config in CONDITIONAL_FORMAT_RULES.items() if config.get('enabled', True)]
+        self.logger.log_debug(LOG_MESSAGES["conditional_formats_applied"].format(len(enabled_rules)))
     
-    def _analyze_distribution(self, df1, df2):
-        """Анализ распределения данных по двум файлам"""
-        # Анализ файла 1 (31 июля 2025 года)
-        self.logger.log_info(LOG_MESSAGES["analysis_file1"])
-        tb_distribution_1 = df1['ТБ'].value_counts()
-        self.logger.log_info(LOG_MESSAGES["tb_distribution"].format(dict(tb_distribution_1)))
+    def _use_excel_sharding(self, processed_data):
+        """Нужно ли разбивать Excel результат на части"""
+        if self.plan is not None:
+            return self.plan['excel_parts'] or len(processed_data) > EXCEL_SHARDING["max_rows_per_sheet"]
+        if EXCEL_SHARDING["enabled"] == "auto":
+            return len(processed_data) > EXCEL_SHARDING["max_rows_per_sheet"]
+        return bool(EXCEL_SHARDING["enabled"])
+    
+    def save_sharded_excel(self, processed_data, file_path):
+        """
+        Сохранение результата частями (по ТБ и/или по числу строк)
         
-        effective_distribution_1 = df1['Эффективный КМ'].value_counts()
-        self.logger.log_info(LOG_MESSAGES["effective_distribution"].format(dict(effective_distribution_1)))
+        В режиме 'workbooks' каждая часть пишется в отдельную книгу параллельно
+        в пуле процессов, в режиме 'sheets' - на отдельный лист одной книги
+        с листом-оглавлением. В обоих режимах рядом пишется manifest.json.
         
-        # Анализ файла 2 (20 августа 2025 года)
-        self.logger.log_info(LOG_MESSAGES["analysis_file2"])
-        tb_distribution_2 = df2['ТБ'].value_counts()
-        self.logger.log_info(LOG_MESSAGES["tb_distribution"].format(dict(tb_distribution_2)))
+        Args:
+            processed_data (pd.DataFrame): Обработанные данные
+            file_path (Path): Путь к основному выходному файлу (база для имен частей)
+            
+        Returns:
+            list: Описание частей (содержимое манифеста)
+        """
+        if EXCEL_SHARDING["split_by"] == 'tb':
+            # Части по ТБ - непрерывные диапазоны строк в порядке BANK_STRUCTURE
+            tb_order = np.argsort(BANK_HIERARCHY.encode_tb(processed_data['ТБ']), kind='stable')
+            processed_data = processed_data.take(tb_order)
         
-        effective_distribution_2 = df2['Эффективный КМ'].value_counts()
-        self.logger.log_info(LOG_MESSAGES["effective_distribution"].format(dict(effective_distribution_2)))
+        shards = split_into_shards(processed_data, EXCEL_SHARDING["split_by"], EXCEL_SHARDING["max_rows_per_sheet"])
+        self.logger.log_info(LOG_MESSAGES["shards_planned"].format(len(shards), len(processed_data), EXCEL_SHARDING["target"]))
         
-        # Анализ перекрытия сотрудников
-        self.logger.log_info(LOG_MESSAGES["analysis_overlap"])
-        employees_july = set(df1['КМ'])
-        employees_august = set(df2['КМ'])
+        manifest = []
+        if EXCEL_SHARDING["target"] == 'sheets':
+            # Одна книга: лист-оглавление + лист на каждую часть
+            sheets = [(shard['sheet_name'], processed_data.iloc[shard['start']:shard['stop']]) for shard in shards]
+            index_df = pd.DataFrame([
+                {'Лист': shard['sheet_name'], 'ТБ': shard['tb'], 'Строк': shard['stop'] - shard['start']}
+                for shard in shards
+            ])
+            write_excel_shard({
+                'file_path': str(file_path),
+                'sheets': [(EXCEL_SHARDING["index_sheet_name"], index_df)] + sheets
+            })
+            for shard in shards:
+                manifest.append({'file': file_path.name, 'sheet': shard['sheet_name'], 'tb': shard['tb'], 'rows': shard['stop'] - shard['start']})
+            self.outputs_created += 1
+        else:
+            # Отдельная книга на каждую часть, книги пишутся параллельно
+            tasks = []
+            for number, shard in enumerate(shards, start=1):
+                shard_path = file_path.with_name(f"{file_path.stem}_{number:03d}{file_path.suffix}")
+                tasks.append({
+                    'file_path': str(shard_path),
+                    'sheets': [(shard['sheet_name'], processed_data.iloc[shard['start']:shard['stop']])]
+                })
+                manifest.append({'file': shard_path.name, 'sheet': shard['sheet_name'], 'tb': shard['tb'], 'rows': shard['stop'] - shard['start']})
+            
+            if self.plan is not None:
+                workers = min(len(tasks), self.plan['workers'])
+            else:
+                workers = EXCEL_SHARDING["workers"] or min(len(tasks), os.cpu_count() or 1)
+            if workers > 1 and len(tasks) > 1:
+                with ProcessPoolExecutor(max_workers=workers) as executor:
+                    list(executor.map(write_excel_shard, tasks))
+            else:
+                for task in tasks:
+                    write_excel_shard(task)
+            self.outputs_created += len(tasks)
         
-        overlap_employees = employees_july.intersection(employees_august)
-        new_employees = employees_august - employees_july
-        removed_employees = employees_july - employees_august
+        # Сводные листы - отдельной книгой рядом с частями
+        if SUMMARY_SHEETS["enabled"]:
+            summary_path = file_path.with_name(f"{file_path.stem}_summary{file_path.suffix}")
+            write_excel_shard({
+                'file_path': str(summary_path),
+                'sheets': list(self.build_summary_tables(processed_data).items())
+            })
+            manifest.append({'file': summary_path.name, 'sheet': None, 'tb': None, 'rows': None})
+            self.outputs_created += 1
         
-        self.logger.log_info(LOG_MESSAGES["employees_july_count"].format(len(employees_july)))
-        self.logger.log_info(LOG_MESSAGES["employees_august_count"].format(len(employees_august)))
-        self.logger.log_info(LOG_MESSAGES["overlap_info_detailed"].format(len(overlap_employees), len(overlap_employees)/len(employees_july)*100))
-        self.logger.log_info(LOG_MESSAGES["new_employees_info_detailed"].format(len(new_employees), len(new_employees)/len(employees_august)*100))
-        self.logger.log_info(LOG_MESSAGES["removed_employees_info_detailed"].format(len(removed_employees), len(removed_employees)/len(employees_july)*100))
+        manifest_path = file_path.with_name(f"{file_path.stem}_manifest.json")
+        with open(manifest_path, 'w', encoding='utf-8') as manifest_file:
+            json.dump(manifest, manifest_file, ensure_ascii=False, indent=2)
         
-        # Проверяем уникальность ТН и ФИО в каждом файле
-        unique_tn_1 = df1['ТН 10'].nunique()
-        unique_fio_1 = df1['КМ'].nunique()
-        unique_tn_2 = df2['ТН 10'].nunique()
-        unique_fio_2 = df2['КМ'].nunique()
+        self.logger.log_info(LOG_MESSAGES["shards_saved"].format(len(shards), manifest_path.name))
+        return manifest
+    
+    def save_distribution(self, processed_data):
+        """
+        Книги по подразделениям (ГОСБ или ТБ) для рассылки, параллельно в пуле процессов
         
-        self.logger.log_debug(LOG_MESSAGES["file1_info"].format(unique_tn_1, unique_fio_1))
-        self.logger.log_debug(LOG_MESSAGES["file2_info"].format(unique_tn_2, unique_fio_2))
+        Результат разбивается на группы один раз, план оформления колонок строится
+        один раз и передается в процессы записи вместе с данными группы.
         
-        if unique_tn_1 != len(df1):
-            self.logger.log_error(LOG_MESSAGES["duplicate_tn_error"])
-        if unique_fio_1 != len(df1):
-            self.logger.log_error(LOG_MESSAGES["duplicate_fio_error"])
-        if unique_tn_2 != len(df2):
-            self.logger.log_error(LOG_MESSAGES["duplicate_tn_error"])
-        if unique_fio_2 != len(df2):
-            self.logger.log_error(LOG_MESSAGES["duplicate_tn_error"])
-    
-    def _save_data_files(self, df1, df2):
-        """Сохранение данных в два файла"""
+        Args:
+            processed_data (pd.DataFrame): Обработанные данные
+            
+        Returns:
+            list: Манифест (файл, ТБ, ГОСБ, строк, размер) или None при ошибке
+        """
         try:
-            # Формируем имена файлов с временной меткой
-            timestamp = datetime.now().strftime("_%Y%m%d_%H%M%S")
-            filename1 = f"data1{timestamp}.xlsx"  # Файл на 31 июля 2025 года
-            filename2 = f"data2{timestamp}.xlsx"  # Файл на 20 августа 2025 года
+            split_by = DISTRIBUTION_SETTINGS["split_by"]
+            timestamp = format_timestamp_suffix(DISTRIBUTION_SETTINGS["suffix_format"])
+            distribution_dir = self.work_dir / OUTPUT_FOLDER / f"{DISTRIBUTION_SETTINGS['folder']}{self._label_suffix()}{timestamp}"
             
-            file_path1 = self.work_dir / INPUT_FOLDER / filename1
-            file_path2 = self.work_dir / INPUT_FOLDER / filename2
+            # Группы строк: один проход хэширования по ключу подразделения
+            key_columns = ['ТБ'] if split_by == 'tb' else ['ТБ', 'ГОСБ']
+            keys = [processed_data[column].astype(str) for column in key_columns]
+            groups = processed_data.groupby(keys, sort=True).indices
+            style_plan = build_style_plan(processed_data)
+            
+            tasks = []
+            manifest = []
+            for key, positions in groups.items():
+                key = key if isinstance(key, tuple) else (key,)
+                tb, gosb = key[0], (key[1] if len(key) > 1 else None)
+                if split_by == 'tb_gosb':
+                    file_path = distribution_dir / sanitize_file_name(tb) / f"{sanitize_file_name(gosb)}.xlsx"
+                else:
+                    file_path = distribution_dir / f"{sanitize_file_name(gosb if split_by == 'gosb' else tb)}.xlsx"
+                file_path.parent.mkdir(parents=True, exist_ok=True)
+                tasks.append({
+                    'file_path': str(file_path),
+                    'sheet_name': sanitize_sheet_name(gosb if gosb is not None else tb),
+                    'data': processed_data.take(positions),
+                    'style_plan': style_plan
+                })
+                manifest.append({'file': file_path.relative_to(distribution_dir).as_posix(), 'tb': tb, 'gosb': gosb})
+            
+            if self.plan is not None and DISTRIBUTION_SETTINGS["workers"] is None:
+                workers = self.plan['workers']
+            else:
+                workers = DISTRIBUTION_SETTINGS["workers"] or os.cpu_count() or 1
+            workers = min(workers, len(tasks))
+            self.logger.log_info(LOG_MESSAGES["distribution_planned"].format(len(tasks), split_by, len(processed_data), workers))
+            
+            # Большие книги - первыми, чтобы процессы закончили примерно одновременно
+            order = sorted(range(len(tasks)), key=lambda index: -len(tasks[index]['data']))
+            if workers > 1:
+                with ProcessPoolExecutor(max_workers=workers) as executor:
+                    results = dict(zip(order, executor.map(write_styled_workbook, [tasks[index] for index in order])))
+            else:
+                results = {index: write_styled_workbook(tasks[index]) for index in order}
+            
+            for index, entry in enumerate(manifest):
+                entry['rows'] = results[index]['rows']
+                entry['size_bytes'] = results[index]['size_bytes']
             
-            # Сохраняем файл 1 (31 июля 2025 года)
-            df1.to_excel(file_path1, index=False, engine='openpyxl')
-            self.logger.log_info(LOG_MESSAGES["test_file_created"].format(filename1))
-            self.logger.log_debug(LOG_MESSAGES["file_saved_debug"].format(file_path1))
-            self.logger.log_debug(LOG_MESSAGES["file_size_debug"].format(len(df1), len(df1.columns)))
-            self.files_created += 1
+            manifest_path = distribution_dir / DISTRIBUTION_SETTINGS["manifest_name"]
+            with open(manifest_path, 'w', encoding='utf-8') as manifest_file:
+                json.dump(manifest, manifest_file, ensure_ascii=False, indent=2)
             
-            # Сохраняем файл 2 (20 августа 2025 года)
-            df2.to_excel(file_path2, index=False, engine='openpyxl')
-            self.logger.log_info(LOG_MESSAGES["test_file_created"].format(filename2))
-            self.logger.log_debug(LOG_MESSAGES["file_saved_debug"].format(file_path2))
-            self.logger.log_debug(LOG_MESSAGES["file_size_debug"].format(len(df2), len(df2.columns)))
-            self.files_created += 1
+            self.outputs_created += len(tasks)
+            self.logger.log_info(LOG_MESSAGES["distribution_saved"].format(
+                len(tasks), format_memory_size(sum(entry['size_bytes'] for entry in manifest)),
+                distribution_dir.name, manifest_path.name
+            ))
+            return manifest
             
         except Exception as e:
-            error_msg = LOG_MESSAGES["save_error"].format(str(e))
-            self.logger.log_error(error_msg)
+            self.logger.log_error(LOG_MESSAGES["distribution_error"].format(str(e)))
             self.logger.log_debug(LOG_MESSAGES["details_error"].format(traceback.format_exc()))
             self.errors_count += 1
+            return None
     
-    def _generate_summary(self):
-        """Генерация сводки создания тестовых данных"""
-        end_time = time.time()
-        execution_time = end_time - self.start_time
-        
-        summary = {
-            'execution_time': format_execution_time(execution_time),
-            'employees_created': self.employees_created,
-            'files_created': self.files_created,
-            'errors_count': self.errors_count
-        }
-        
-        # Логируем сводку
-        self.logger.log_info(LOG_MESSAGES["summary"].format(summary))
-        self.logger.log_info(LOG_MESSAGES["time_elapsed"].format(format_execution_time(execution_time)))
-        self.logger.log_info(LOG_MESSAGES["employees_created"].format(self.employees_created))
-        self.logger.log_info(LOG_MESSAGES["outputs_created"].format(self.files_created))
-        self.logger.log_info(LOG_MESSAGES["errors_count"].format(self.errors_count))
-        
-        return summary
-
-# =============================================================================
-# КЛАСС ДЛЯ ОБРАБОТКИ ДАННЫХ
-# =============================================================================
-
-class DataProcessor:
-    """Основной класс для обработки данных"""
-    
-    def __init__(self, work_dir, logger):
+    def evaluate_kod_scenarios(self, processed_data, scenarios):
         """
-        Инициализация процессора данных
+        КОД вывода при каждом наборе порогов за один векторный проход по готовым местам
+        
+        Места по темпу берутся из результата, размеры групп ТБ и ГОСБ - по тем же группам
+        иерархии, что и при расчете (см. _hierarchy_group_sizes).
         
         Args:
-            work_dir (str): Рабочая директория
-            logger (DataProcessorLogger): Объект логгера
+            processed_data (pd.DataFrame): Обработанные данные
+            scenarios (list): Наборы порогов (см. build_threshold_scenarios)
+            
+        Returns:
+            np.ndarray: Коды (сценарии x строки), int8
         """
-        self.work_dir = Path(work_dir)
-        self.logger = logger
-        self.start_time = None
-        self.errors_count = 0
-        self.files_processed = 0
-        self.outputs_created = 0
-        
-        # Создаем необходимые директории
-        self._create_directories()
-    
-    def _create_directories(self):
-        """Создание необходимых директорий"""
-        directories = [
-            self.work_dir / INPUT_FOLDER,
-            self.work_dir / OUTPUT_FOLDER,
-            self.work_dir / LOGS_FOLDER
-        ]
-        
-        for directory in directories:
-            directory.mkdir(parents=True, exist_ok=True)
-            self.logger.log_debug(LOG_MESSAGES["directory_ready"].format(directory))
+        group_sizes = self._hierarchy_group_sizes(processed_data)
+        return kod_vyvoda_grid(
+            processed_data['число страна'], processed_data['число ТБ'], processed_data['число подразделение'],
+            processed_data['ЭФ.КМ'], processed_data['прирост'],
+            group_sizes['__root__'], group_sizes['ТБ'], group_sizes['ГОСБ'],
+            [scenario['thresholds'] for scenario in scenarios], self._effective_places(processed_data)
+        )
     
-    def load_excel_files(self):
+    def build_scenario_tables(self, processed_data, scenarios, codes):
         """
-        Загрузка данных из Excel файлов
+        Таблицы сценариев: итог по стране, распределение кодов по ТБ и (опционально) коды по ТН
         
+        Args:
+            processed_data (pd.DataFrame): Обработанные данные
+            scenarios (list): Наборы порогов
+            codes (np.ndarray): Коды (сценарии x строки)
+            
         Returns:
-            list: Список загруженных DataFrame'ов
+            dict: Имя листа -> DataFrame
         """
-        start_time = time.time()
-        dataframes = []
-        
-        for file_config in INPUT_FILES:
-            try:
-                file_path = self.work_dir / INPUT_FOLDER / f"{file_config['name']}{file_config['extension']}"
-                
-                if file_path.exists():
-                    # Загружаем Excel файл
-                    df = pd.read_excel(file_path)
-                    dataframes.append({
-                        'name': file_config['name'],
-                        'data': df,
-                        'file_path': file_path
-                    })
-                    
-                    self.logger.log_info(LOG_MESSAGES["file_loaded"].format(file_path.name))
-                    self.logger.log_debug(LOG_MESSAGES["rows_columns_loaded"].format(len(df), len(df.columns), file_path.name))
-                    self.files_processed += 1
-                else:
-                    self.logger.log_error(LOG_MESSAGES["file_not_found"].format(file_path))
-                    self.errors_count += 1
-                    
-            except Exception as e:
-                error_msg = LOG_MESSAGES["load_file_error"].format(file_config['name'], str(e))
-                self.logger.log_error(error_msg)
-                self.logger.log_debug(LOG_MESSAGES["details_error"].format(traceback.format_exc()))
-                self.errors_count += 1
+        code_values = sorted(KOD_VYVOD_TEXTS, reverse=True)
+        code_columns = [f"КОД {kod}" for kod in code_values]
+        current_codes = processed_data['КОД вывода'].to_numpy()
+        tb_codes, tb_names = factorize_with_missing(processed_data['ТБ'], sort=True, missing_label=MISSING_GROUP_LABEL)
+        threshold_columns = {'country_top': 'страна топ, %', 'country': 'страна, %', 'tb': 'ТБ, %', 'gosb': 'ГОСБ, %'}
         
-        end_time = time.time()
-        execution_time = end_time - start_time
-        self.logger.log_debug(LOG_MESSAGES["file_loading_time"].format(format_execution_time(execution_time)))
+        summary_rows, tb_frames = [], []
+        for index, scenario in enumerate(scenarios):
+            counts = np.bincount(codes[index], minlength=len(code_values))
+            row = {'сценарий': scenario['name']}
+            row.update({title: scenario['thresholds'][key] * 100 for key, title in threshold_columns.items()})
+            row.update({column: int(counts[kod]) for column, kod in zip(code_columns, code_values)})
+            row['изменился КОД'] = int((codes[index] != current_codes).sum())
+            summary_rows.append(row)
+            
+            # Распределение по ТБ: одна гистограмма пар (ТБ, код)
+            tb_counts = np.bincount(
+                tb_codes * len(code_values) + codes[index], minlength=len(tb_names) * len(code_values)
+            ).reshape(len(tb_names), len(code_values))
+            tb_frame = pd.DataFrame(tb_counts[:, code_values], columns=code_columns)
+            tb_frame.insert(0, 'ТБ', np.asarray(tb_names, dtype=object))
+            tb_frame.insert(0, 'сценарий', scenario['name'])
+            tb_frame['всего'] = tb_counts.sum(axis=1)
+            tb_frames.append(tb_frame)
         
-        return dataframes
+        tables = {
+            'Сценарии': pd.DataFrame(summary_rows),
+            'По ТБ': pd.concat(tb_frames, ignore_index=True)
+        }
+        if SCENARIO_SETTINGS["per_tn_columns"]:
+            per_tn = processed_data[['ТН 10', 'ТБ', 'ГОСБ', 'КОД вывода']].copy()
+            for index, scenario in enumerate(scenarios):
+                per_tn[scenario['name']] = codes[index]
+            tables['По ТН'] = per_tn
+        return tables
     
-    def process_data(self, dataframes):
+    def save_scenarios(self, processed_data):
         """
-        Обработка загруженных данных с объединением и расчетом новых колонок
+        Расчет сценариев порогов КОД вывода и сохранение книги сценариев в папку OUTPUT
         
         Args:
-            dataframes (list): Список загруженных DataFrame'ов
-            
-        Returns:
-            pd.DataFrame: Обработанные данные
+            processed_data (pd.DataFrame): Обработанные данные
         """
         start_time = time.time()
-        self.logger.log_info(LOG_MESSAGES["processing_start"])
-        
-        if not dataframes:
-            self.logger.log_error(LOG_MESSAGES["no_data_to_process"])
-            return pd.DataFrame()
+        if processed_data.empty:
+            self.logger.log_error(LOG_MESSAGES["no_data_to_save"])
+            return
         
         try:
-            # Находим файлы data1 и data2 по именам из INPUT_FILES
-            df1 = None
-            df2 = None
+            scenarios = build_threshold_scenarios(SCENARIO_SETTINGS["grid"], SCENARIO_SETTINGS["scenarios"])
+            codes = self.evaluate_kod_scenarios(processed_data, scenarios)
+            evaluation_time = time.time() - start_time
+            self.metrics.record_stage('scenarios', evaluation_time)
+            self.logger.log_info(LOG_MESSAGES["scenarios_evaluated"].format(
+                len(scenarios), len(processed_data), format_execution_time(evaluation_time)
+            ))
+            tables = self.build_scenario_tables(processed_data, scenarios, codes)
             
-            # Получаем имена файлов из конфигурации (без расширения)
-            file1_name = INPUT_FILES[0]['name']
-            file2_name = INPUT_FILES[1]['name']
+            timestamp = format_timestamp_suffix(SCENARIO_SETTINGS["suffix_format"])
+            filename = f"{SCENARIO_SETTINGS['output_name']}{self._label_suffix()}{timestamp}.xlsx"
+            file_path = self.work_dir / OUTPUT_FOLDER / filename
+            with pd.ExcelWriter(file_path, engine='openpyxl') as writer:
+                for sheet_name, table in tables.items():
+                    if len(table) > EXCEL_SHARDING["max_rows_per_sheet"]:
+                        self.logger.log_info(LOG_MESSAGES["scenarios_tn_sheet_skipped"].format(
+                            len(table), EXCEL_SHARDING["max_rows_per_sheet"]
+                        ))
+                        continue
+                    table.to_excel(writer, sheet_name=sheet_name, index=False)
+                    format_worksheet(writer.sheets[sheet_name], list(table.columns), len(table))
             
-            for df_info in dataframes:
-                if df_info['name'] == file1_name:
-                    df1 = df_info['data']
-                elif df_info['name'] == file2_name:
-                    df2 = df_info['data']
+            self.outputs_created += 1
+            self.metrics.record_stage('save', time.time() - start_time - evaluation_time)
+            self.logger.log_info(LOG_MESSAGES["scenarios_saved"].format(filename))
             
-            if df1 is None or df2 is None:
-                self.logger.log_error(LOG_MESSAGES["files_not_found"].format(file1_name, file2_name))
-                return pd.DataFrame()
-            
-            self.logger.log_debug(LOG_MESSAGES["files_loaded_info"].format(len(df1), len(df2)))
-            
-            # Создаем список уникальных значений ТН 10, ТБ, ГОСБ, ФИО
-            # Объединяем все уникальные ТН из обоих файлов
-            # Очищаем ТН от префикса TN_ для корректного объединения
-            df1_clean = df1.copy()
-            df2_clean = df2.copy()
-            
-            # Очищаем префикс TN_ из ТН 10 в обоих DataFrame
-            df1_clean['ТН 10'] = df1_clean['ТН 10'].astype(str).str.replace('TN_', '')
-            df2_clean['ТН 10'] = df2_clean['ТН 10'].astype(str).str.replace('TN_', '')
-            
-            all_tn = pd.concat([
-                df1_clean[['ТН 10', 'ТБ', 'ГОСБ', 'КМ']].drop_duplicates(),
-                df2_clean[['ТН 10', 'ТБ', 'ГОСБ', 'КМ']].drop_duplicates()
-            ]).drop_duplicates(subset=['ТН 10'], keep='last')
-            
-            self.logger.log_debug(LOG_MESSAGES["unique_tn_list_created"].format(len(all_tn)))
-            
-            # Создаем результирующий DataFrame
-            result_data = []
-            
-            for _, row in all_tn.iterrows():
-                tn = row['ТН 10']
-                tb = row['ТБ']
-                gosb = row['ГОСБ']
-                fio = row['КМ']
-                
-                # Ищем данные в очищенных DataFrame (без префикса TN_)
-                data1_row = df1_clean[df1_clean['ТН 10'] == tn]
-                data2_row = df2_clean[df2_clean['ТН 10'] == tn]
-                
-                # Получаем значения из файла 1
-                od_current = data1_row['2025, тыс. руб.'].iloc[0] if len(data1_row) > 0 else 0
-                od_previous = data1_row['2024, тыс. руб. на конец месяца'].iloc[0] if len(data1_row) > 0 else 0
-                
-                # Получаем эффективность из файла 2, если нет - из файла 1
-                if len(data2_row) > 0:
-                    effectiveness = data2_row['Эффективный КМ'].iloc[0]
-                elif len(data1_row) > 0:
-                    effectiveness = data1_row['Эффективный КМ'].iloc[0]
-                else:
-                    effectiveness = "👎"
-                
-                # Конвертируем эффективность в числовое значение
-                effectiveness_num = 1 if effectiveness == "👍" else 0
-                
-                # Рассчитываем темп ОД
-                if od_previous == 0:
-                    if od_current > 0:
-                        temp_od = 100
-                    elif od_current < 0:
-                        temp_od = -100
-                    else:
-                        temp_od = 0
-                else:
-                    temp_od = (od_current - od_previous) / abs(od_previous) * 100
-                
-                # Очищаем ТН от префикса TN_ для отображения в Excel
-                clean_tn = tn.replace('TN_', '') if isinstance(tn, str) and tn.startswith('TN_') else tn
-                
-                # Создаем строку результата
-                result_row = {
-                    'ТН 10': clean_tn,
-                    'ТБ': tb,
-                    'ГОСБ': gosb,
-                    'ФИО': fio,
-                    'ЭФ.КМ': effectiveness_num,
-                    'ОД ТЕКУЩИЙ': od_current,
-                    'ранг ОД BANK': 0,  # Будет пересчитано позже
-                    'ранг ОД TB': 0,    # Будет пересчитано позже
-                    'ОД ПРОШЛЫЙ': od_previous,
-                    'прирост': od_current - od_previous,
-                    'темп': round(temp_od, 2),
-                    'вып условий': 1 if (od_current - od_previous) > 0 else 0,
-                    'СТРАНА 50': 0,  # Будет заполнено процентилями
-                    'СТРАНА 75': 0,  # Будет заполнено процентилями
-                    'СТРАНА 90': 0,  # Будет заполнено процентилями
-                    'ТБ 25': 0,      # Будет заполнено процентилями
-                    'ТБ 50': 0,      # Будет заполнено процентилями
-                    'ТБ 75': 0,      # Будет заполнено процентилями
-                    'ГОСБ 25': 0,    # Будет заполнено процентилями
-                    'ГОСБ 50': 0,    # Будет заполнено процентилями
-                    'ГОСБ 75': 0,    # Будет заполнено процентилями
-                    'КОД вывода': 0,  # Будет рассчитано позже
-                    'число страна': 0,  # Будет пересчитано позже
-                    'число ТБ': 0,      # Будет пересчитано позже
-                    'число подразделение': 0,  # Будет пересчитано позже
-                    'вывод': '',       # Будет заполнено позже
-                }
-                
-                result_data.append(result_row)
-            
-            # Создаем DataFrame
-            result_df = pd.DataFrame(result_data)
-            
-            # Рассчитываем ранги ОД
-            self.logger.log_debug("Рассчитываем ранги ОД...")
-            
-            # РАНГ ОД ДЛЯ УРОВНЯ BANK - точная реализация Excel формулы
-            # =СЧЁТЕСЛИМН(КМР[ОД ТЕКУЩИЙ];"<"&КМР[[#Эта строка];[ОД ТЕКУЩИЙ]])/СЧЁТ(КМР[ОД ТЕКУЩИЙ])
-            result_df['ранг ОД BANK'] = result_df['ОД ТЕКУЩИЙ'].apply(
-                lambda x: (result_df['ОД ТЕКУЩИЙ'] < x).sum() / len(result_df) * 100
-            ).round(2)
-            
-            # РАНГ ОД ДЛЯ УРОВНЯ TB - точная реализация Excel формулы
-            # =СЧЁТЕСЛИМН(КМР[ОД ТЕКУЩИЙ];"<"&КМР[[#Эта строка];[ОД ТЕКУЩИЙ]];КМР[ТБ];КМР[[#Эта строка];[ТБ]])/СЧЁТЕСЛИМН(КМР[ТБ];КМР[[#Эта строка];[ТБ]])
-            result_df['ранг ОД TB'] = result_df.apply(
-                lambda row: (
-                    (result_df[result_df['ТБ'] == row['ТБ']]['ОД ТЕКУЩИЙ'] < row['ОД ТЕКУЩИЙ']).sum() /
-                    len(result_df[result_df['ТБ'] == row['ТБ']]) * 100
-                ) if len(result_df[result_df['ТБ'] == row['ТБ']]) > 0 else 0, axis=1
-            ).round(2)
-            
-            # Рассчитываем процентили для трех уровней
-            self.logger.log_debug("Рассчитываем процентили...")
-            
-            # Процентили для уровня БАНК (по всем данным)
-            bank_percentiles = result_df['ОД ТЕКУЩИЙ'].quantile([p/100 for p in PERCENTILES])
-            
-            # Процентили для уровня ТБ (по каждому ТБ отдельно)
-            tb_percentiles = {}
-            for tb in result_df['ТБ'].unique():
-                tb_mask = result_df['ТБ'] == tb
-                tb_percentiles[tb] = result_df.loc[tb_mask, 'ОД ТЕКУЩИЙ'].quantile([p/100 for p in PERCENTILES])
-            
-            # Процентили для уровня ГОСБ (по каждому ГОСБ отдельно)
-            gosb_percentiles = {}
-            for gosb in result_df['ГОСБ'].unique():
-                gosb_mask = result_df['ГОСБ'] == gosb
-                gosb_percentiles[gosb] = result_df.loc[gosb_mask, 'ОД ТЕКУЩИЙ'].quantile([p/100 for p in PERCENTILES])
-            
-            # Заполняем колонки с процентилями
-            result_df['СТРАНА 50'] = bank_percentiles[0.50]
-            result_df['СТРАНА 75'] = bank_percentiles[0.75]
-            result_df['СТРАНА 90'] = bank_percentiles[0.90] if 0.90 in bank_percentiles.index else bank_percentiles[0.75]
-            
-            # Процентили ТБ для каждой строки
-            result_df['ТБ 25'] = result_df['ТБ'].map(lambda x: tb_percentiles[x][0.25])
-            result_df['ТБ 50'] = result_df['ТБ'].map(lambda x: tb_percentiles[x][0.50])
-            result_df['ТБ 75'] = result_df['ТБ'].map(lambda x: tb_percentiles[x][0.75])
-            
-            # Процентили ГОСБ для каждой строки
-            result_df['ГОСБ 25'] = result_df['ГОСБ'].map(lambda x: gosb_percentiles[x][0.25])
-            result_df['ГОСБ 50'] = result_df['ГОСБ'].map(lambda x: gosb_percentiles[x][0.50])
-            result_df['ГОСБ 75'] = result_df['ГОСБ'].map(lambda x: gosb_percentiles[x][0.75])
-            
-            # Рассчитываем колонки "число страна", "число ТБ", "число подразделение"
-            self.logger.log_debug("Рассчитываем ранжирование по процентилям...")
-            
-            # число страна - ранжирование по темпу среди всех
-            result_df['число страна'] = result_df['темп'].rank(method='min', ascending=False)
-            
-            # число ТБ - ранжирование по темпу в рамках ТБ
-            result_df['число ТБ'] = result_df.groupby('ТБ')['темп'].rank(method='min', ascending=False)
-            
-            # число подразделение - ранжирование по темпу в рамках ГОСБ
-            result_df['число подразделение'] = result_df.groupby('ГОСБ')['темп'].rank(method='min', ascending=False)
-            
-            # Рассчитываем колонку "КОД вывода" согласно логике из Excel файла
-            def calculate_kod_vyvoda(row):
-                """
-                Расчет кода вывода согласно логике из листа 't' Excel файла:
-                - Код 6: выше, чем у 90% КМ в стране
-                - Код 5: выше, чем у 75% КМ в стране  
-                - Код 4: выше, чем у 75% КМ в тербанке (среди эффективных)
-                - Код 3: выше, чем у 75% КМ в тербанке (среди всех)
-                - Код 2: выше, чем у 75% КМ в ГОСБ/аппарате (среди эффективных, положительный прирост)
-                - Код 1: ниже, чем у 75% КМ в ГОСБ/аппарате (среди всех, положительный прирост)
-                """
-                # Получаем значения для расчета
-                number_strana = row['число страна']
-                number_tb = row['число ТБ']
-                number_gosb = row['число подразделение']
-                effectiveness = row['ЭФ.КМ']  # 1 для эффективных, 0 для неэффективных
-                prir = row['прирост']  # прирост ОД
-                
-                # Код 6: выше, чем у 90% КМ в стране
-                if number_strana <= 0.1 * len(result_df):  # Топ-10% по стране
-                    return 6
-                
-                # Код 5: выше, чем у 75% КМ в стране
-                elif number_strana <= 0.25 * len(result_df):  # Топ-25% по стране
-                    return 5
-                
-                # Код 4: выше, чем у 75% КМ в тербанке (среди эффективных)
-                elif effectiveness == 1 and number_tb <= 0.25 * len(result_df[result_df['ТБ'] == row['ТБ']]):
-                    return 4
-                
-                # Код 3: выше, чем у 75% КМ в тербанке (среди всех)
-                elif number_tb <= 0.25 * len(result_df[result_df['ТБ'] == row['ТБ']]):
-                    return 3
-                
-                # Код 2: выше, чем у 75% КМ в ГОСБ/аппарате (среди эффективных, положительный прирост)
-                elif effectiveness == 1 and prir > 0 and number_gosb <= 0.25 * len(result_df[result_df['ГОСБ'] == row['ГОСБ']]):
-                    return 2
-                
-                # Код 1: ниже, чем у 75% КМ в ГОСБ/аппарате (среди всех, положительный прирост)
-                elif prir > 0 and number_gosb <= 0.25 * len(result_df[result_df['ГОСБ'] == row['ГОСБ']]):
-                    return 1
-                
-                # Если не подходит ни под один код
-                else:
-                    return 0
-            
-            result_df['КОД вывода'] = result_df.apply(calculate_kod_vyvoda, axis=1)
+        except Exception as e:
+            self.logger.log_error(LOG_MESSAGES["scenarios_error"].format(str(e)))
+            self.logger.log_debug(LOG_MESSAGES["details_error"].format(traceback.format_exc()))
+            self.errors_count += 1
+    
+    def run_scenarios(self):
+        """Запуск режима сценариев: загрузка и расчет один раз -> все наборы порогов КОД вывода"""
+        self.start_time = time.time()
+        self.metrics = RunMetrics('scenarios', input_pair_label(self.input_files))
+        
+        try:
+            dataframes = self.load_excel_files()
+            if VALIDATION_SETTINGS["enabled"]:
+                _, passed = self.validate_inputs(dataframes)
+                if not passed:
+                    return
+            processed_data = self.process_data(dataframes)
+            self.save_scenarios(processed_data)
             
-            # Рассчитываем колонку "вывод" на основе кода вывода
-            def calculate_output_by_code(row):
-                """
-                Возвращает текстовое описание результата согласно коду вывода
-                """
-                kod = row['КОД вывода']
-                
-                if kod == 6:
-                    return "выше, чем у 90% КМ в стране"
-                elif kod == 5:
-                    return "выше, чем у 75% КМ в стране"
-                elif kod == 4:
-                    return "выше, чем у 75% КМ в тербанке (среди эффективных)"
-                elif kod == 3:
-                    return "выше, чем у 75% КМ в тербанке"
-                elif kod == 2:
-                    return "выше, чем у 75% КМ в ГОСБ/аппарате (среди эффективных)"
-                elif kod == 1:
-                    return "ниже, чем у 75% КМ в ГОСБ/аппарате"
-                else:
-                    return "обычный результат"
+        except Exception as e:
+            error_msg = LOG_MESSAGES["processing_error"].format(str(e))
+            self.logger.log_error(error_msg)
+            self.logger.log_debug(LOG_MESSAGES["details_error"].format(traceback.format_exc()))
+            self.errors_count += 1
+        
+        finally:
+            # Генерируем сводку
+            self.generate_summary()
+    
+    def run_diff(self):
+        """Запуск режима сравнения: два результата -> поколоночное сравнение по ТН -> книга сравнения"""
+        self.start_time = time.time()
+        output_dir = self.work_dir / OUTPUT_FOLDER
+        self.metrics = RunMetrics('diff', str(output_dir))
+        
+        try:
+            if DIFF_SETTINGS["previous"] and DIFF_SETTINGS["current"]:
+                sources = tuple(output_dir / DIFF_SETTINGS[key] for key in ('previous', 'current'))
+            else:
+                sources = find_result_sources(output_dir)
+            if sources is None:
+                self.logger.log_error(LOG_MESSAGES["diff_no_sources"].format(output_dir))
+                self.errors_count += 1
+                return
+            self.logger.log_info(LOG_MESSAGES["diff_sources"].format(sources[0].name, sources[1].name))
             
-            result_df['вывод'] = result_df.apply(calculate_output_by_code, axis=1)
+            # Загрузка
+            start_time = time.time()
+            previous, current = (read_result_source(source) for source in sources)
+            for source, df in zip(sources, (previous, current)):
+                self.metrics.record_rows_loaded(source.name, len(df))
+            self.files_processed += 2
+            self.metrics.record_stage('load', time.time() - start_time)
+            self.logger.log_info(LOG_MESSAGES["diff_loaded"].format(
+                format_execution_time(time.time() - start_time), len(previous), len(current)
+            ))
             
-            end_time = time.time()
-            execution_time = end_time - start_time
-            self.logger.log_debug(LOG_MESSAGES["data_processing_time"].format(format_execution_time(execution_time)))
-            self.logger.log_debug(LOG_MESSAGES["data_processed_info"].format(len(result_df), len(result_df.columns)))
-            self.logger.log_info(LOG_MESSAGES["processing_end"])
+            # Сравнение
+            start_time = time.time()
+            tables = diff_results(
+                previous, current, DIFF_SETTINGS["tolerance"], DIFF_SETTINGS["column_tolerances"],
+                DIFF_SETTINGS["detail_columns"], DIFF_SETTINGS["max_detail_rows"]
+            )
+            tables['Итог'] = pd.concat([
+                pd.DataFrame([('предыдущий', sources[0].name), ('текущий', sources[1].name)], columns=['показатель', 'значение']),
+                tables['Итог']
+            ], ignore_index=True)
+            totals = dict(zip(tables['Итог']['показатель'], tables['Итог']['значение']))
+            self.metrics.record_stage('process', time.time() - start_time)
+            self.metrics.rows_output = totals['КМ с изменениями']
+            self.logger.log_info(LOG_MESSAGES["diff_done"].format(
+                format_execution_time(time.time() - start_time), totals['добавлены'], totals['удалены'],
+                totals['изменился КОД вывода'], totals['КМ с изменениями']
+            ))
             
-            return result_df
+            # Сохранение
+            start_time = time.time()
+            timestamp = format_timestamp_suffix(DIFF_SETTINGS["suffix_format"])
+            filename = f"{DIFF_SETTINGS['output_name']}{timestamp}.xlsx"
+            with pd.ExcelWriter(output_dir / filename, engine='openpyxl') as writer:
+                for sheet_name, table in tables.items():
+                    table.to_excel(writer, sheet_name=sheet_name, index=False)
+                    if len(table.columns):
+                        format_worksheet(writer.sheets[sheet_name], list(table.columns), len(table))
+            self.outputs_created += 1
+            self.metrics.record_stage('save', time.time() - start_time)
+            self.logger.log_info(LOG_MESSAGES["diff_saved"].format(filename))
             
         except Exception as e:
             error_msg = LOG_MESSAGES["processing_error"].format(str(e))
             self.logger.log_error(error_msg)
             self.logger.log_debug(LOG_MESSAGES["details_error"].format(traceback.format_exc()))
             self.errors_count += 1
-            return pd.DataFrame()
+        
+        finally:
+            # Генерируем сводку
+            self.generate_summary()
     
-    def save_outputs(self, processed_data):
+    def save_snapshot(self, processed_data):
         """
-        Сохранение обработанных данных в выходные файлы
+        Сохранение бинарного memory-mapped снимка результата в папку OUTPUT
         
         Args:
             processed_data (pd.DataFrame): Обработанные данные
+            
+        Returns:
+            Path: Путь к папке снимка или None при ошибке
         """
-        start_time = time.time()
-        if processed_data.empty:
-            self.logger.log_error(LOG_MESSAGES["no_data_to_save"])
-            return
-        
-        for output_config in OUTPUT_FILES:
-            try:
-                # Формируем имя файла с суффиксом
-                timestamp = datetime.now().strftime(
-                    output_config["suffix_format"]
-                    .replace("YYYY", "%Y")
-                    .replace("MM", "%m")
-                    .replace("DD", "%d")
-                    .replace("HH", "%H")
-                    .replace("MM", "%M")
-                    .replace("SS", "%S")
-                )
-                
-                filename = f"{output_config['name']}{timestamp}{output_config['extension']}"
-                file_path = self.work_dir / OUTPUT_FOLDER / filename
-                
-                # Сохраняем файл в зависимости от формата
-                # ЗАКЛАДКА ДЛЯ БУДУЩЕГО CSV:
-                # if output_config['extension'].lower() == '.csv':
-                #     # Сохраняем CSV с разделителем ";"
-                #     processed_data.to_csv(file_path, sep=';', index=False, encoding='utf-8')
-                # if output_config['extension'].lower() == '.xlsx':
-                # 
-                # Текущая реализация - только Excel файл
-                if output_config['extension'].lower() == '.xlsx':
-                    # Сохраняем Excel с автофильтром и форматированием
-                    processed_data.to_excel(file_path, index=False, engine='openpyxl')
-                    
-                    # Открываем файл для добавления автофильтра и форматирования
-                    
-                    # Загружаем сохраненный файл
-                    wb = load_workbook(file_path)
-                    ws = wb.active
-                    
-                    # Добавляем автофильтр начиная с колонки E (5-я колонка) и строки 2
-                    # Определяем диапазон для автофильтра (все данные)
-                    max_row = len(processed_data) + 1  # +1 потому что pandas.to_excel добавляет заголовки
-                    max_col = len(processed_data.columns)
-                    
-                    # Функция для получения буквы колонки по номеру
-                    def get_column_letter(col_num):
-                        """Преобразует номер колонки в букву Excel (A, B, C, ..., Z, AA, AB, ...)"""
-                        result = ""
-                        while col_num > 0:
-                            col_num, remainder = divmod(col_num - 1, 26)
-                            result = chr(65 + remainder) + result
-                        return result
-                    
-                    # Устанавливаем автофильтр на диапазон A1:последняя_колонка_последняя_строка (заголовки + данные)
-                    # A1 = заголовки, A2:последняя_колонка_последняя_строка = данные
-                    last_col_letter = get_column_letter(max_col)
-                    ws.auto_filter.ref = f"A1:{last_col_letter}{max_row}"
-                    
-                    # Фиксируем панели на уровне A2 (колонка A, строка 2) - заголовки остаются видимыми
-                    ws.freeze_panes = "A2"
-                    
-                    # Функция для получения настроек форматирования колонки
-                    def get_column_format_config(column_name):
-                        """Получает настройки форматирования для колонки из групп или специальных настроек"""
-                        # Сначала проверяем специальные настройки (переопределяют групповые)
-                        if column_name in COLUMN_SPECIAL_FORMATS:
-                            special_config = COLUMN_SPECIAL_FORMATS[column_name].copy()
-                            
-                            # Ищем группу для этой колонки
-                            for group_name, group_config in COLUMN_FORMAT_GROUPS.items():
-                                if column_name in group_config['columns']:
-                                    # Объединяем групповые настройки со специальными
-                                    format_config = group_config.copy()
-                                    format_config.update(special_config)  # Специальные переопределяют групповые
-                                    return format_config
-                            
-                            # Если колонка не найдена в группах, возвращаем только специальные
-                            return special_config
-                        
-                        # Если нет специальных настроек, ищем в группах
-                        for group_name, group_config in COLUMN_FORMAT_GROUPS.items():
-                            if column_name in group_config['columns']:
-                                return group_config.copy()
-                        
-                        # Если колонка не найдена нигде, возвращаем None
-                        return None
-                    
-                    # Применяем форматирование колонок согласно групповой системе
-                    for col in range(1, max_col + 1):
-                        column_letter = get_column_letter(col)
-                        column_name = processed_data.columns[col - 1]  # Получаем название колонки
-                        
-                        # Получаем настройки форматирования для колонки
-                        format_config = get_column_format_config(column_name)
-                        
-                        if format_config:
-                            # Устанавливаем ширину колонки
-                            ws.column_dimensions[column_letter].width = format_config.get('width', 15)
-                            
-                            # Применяем форматирование ко всем ячейкам в колонке (кроме заголовка)
-                            for row in range(2, max_row + 1):  # Начинаем со 2-й строки (после заголовка)
-                                cell = ws[f"{column_letter}{row}"]
-                                
-                                # Применяем специальное форматирование для padded_number
-                                if format_config.get('format_type') == 'padded_number':
-                                    # Для чисел с лидирующими нулями устанавливаем текстовый формат
-                                    cell.number_format = '@'  # Текстовый формат Excel
-                                    # Применяем выравнивание по левому краю для лучшей читаемости
-                                    cell.alignment = Alignment(horizontal='left', vertical='center')
-                                else:
-                                    # Применяем числовой формат
-                                    if format_config.get('format') == 'number' and 'number_format' in format_config:
-                                        cell.number_format = format_config['number_format']
-                                    
-                                    # Применяем выравнивание
-                                    alignment = format_config.get('alignment', 'left')
-                                    if alignment == 'center':
-                                        cell.alignment = Alignment(horizontal='center', vertical='center')
-                                    elif alignment == 'right':
-                                        cell.alignment = Alignment(horizontal='right', vertical='center')
-                                    elif alignment == 'left':
-                                        cell.alignment = Alignment(horizontal='left', vertical='center')
-                        else:
-                            # Для колонок без настроек - форматируем по содержимому
-                            max_width = 0
-                            for row in range(1, max_row + 1):
-                                cell_value = ws[f"{column_letter}{row}"].value
-                                if cell_value is not None:
-                                    if isinstance(cell_value, (int, float)):
-                                        width = len(str(cell_value)) + 2
-                                    else:
-                                        width = len(str(cell_value)) + 1
-                                    max_width = max(max_width, width)
-                            
-                            ws.column_dimensions[column_letter].width = min(max_width + 2, 50)
-                    
-                    # Сохраняем изменения
-                    wb.save(file_path)
-                    wb.close()
-                    
-                    self.logger.log_debug(LOG_MESSAGES["autofilter_added"].format(f"A1:{last_col_letter}{max_row}"))
-                    self.logger.log_debug(LOG_MESSAGES["panes_frozen"])
-                    # Логируем информацию о примененном форматировании
-                    formatted_columns = 0
-                    for group_name, group_config in COLUMN_FORMAT_GROUPS.items():
-                        formatted_columns += len(group_config['columns'])
-                    
-                    # Логируем информацию о примененном форматировании
-                    formatted_columns = 0
-                    for group_name, group_config in COLUMN_FORMAT_GROUPS.items():
-                        formatted_columns += len(group_config['columns'])
-                    
-                    # Подсчитываем колонки со специальным форматированием
-                    special_formatted = 0
-                    for col_name, col_config in COLUMN_SPECIAL_FORMATS.items():
-                        if col_config.get('format_type') == 'padded_number':
-                            special_formatted += 1
-                    
-                    self.logger.log_debug(LOG_MESSAGES["group_formatting_applied"].format(len(COLUMN_FORMAT_GROUPS), formatted_columns))
-                    self.logger.log_debug(LOG_MESSAGES["special_formats_applied"].format(len(COLUMN_SPECIAL_FORMATS)))
-                    if special_formatted > 0:
-                        self.logger.log_debug(LOG_MESSAGES["padded_number_formatted"].format(special_formatted))
-                
-                self.logger.log_info(LOG_MESSAGES["file_saved"].format(filename))
-                self.logger.log_debug(LOG_MESSAGES["file_saved_debug_old"].format(file_path))
-                self.outputs_created += 1
-                
-            except Exception as e:
-                error_msg = LOG_MESSAGES["save_error"].format(f"{output_config['name']}: {str(e)}")
-                self.logger.log_error(error_msg)
-                self.logger.log_debug(LOG_MESSAGES["details_error"].format(traceback.format_exc()))
-                self.errors_count += 1
-        
-        end_time = time.time()
-        execution_time = end_time - start_time
-        self.logger.log_debug(LOG_MESSAGES["file_saving_time"].format(format_execution_time(execution_time)))
+        try:
+            timestamp = format_timestamp_suffix(SNAPSHOT_SETTINGS["suffix_format"])
+            snapshot_dir = self.work_dir / OUTPUT_FOLDER / f"{SNAPSHOT_SETTINGS['name']}{self._label_suffix()}{timestamp}"
+            manifest = write_result_snapshot(processed_data, snapshot_dir)
+            
+            self.logger.log_info(LOG_MESSAGES["snapshot_saved"].format(snapshot_dir.name, manifest['rows'], len(manifest['columns'])))
+            self.outputs_created += 1
+            return snapshot_dir
+            
+        except Exception as e:
+            self.logger.log_error(LOG_MESSAGES["snapshot_error"].format(str(e)))
+            self.logger.log_debug(LOG_MESSAGES["details_error"].format(traceback.format_exc()))
+            self.errors_count += 1
+            return None
     
     def generate_summary(self):
         """Генерация сводки выполнения программы"""
@@ -1521,26 +5043,141 @@ class DataProcessor:
             'outputs_created': self.outputs_created,
             'errors_count': self.errors_count
         }
+        if self.text_memory['before'] > 0:
+            summary['text_memory_before'] = self.text_memory['before']
+            summary['text_memory_after'] = self.text_memory['after']
         
         # Логируем сводку
         self.logger.log_info(LOG_MESSAGES["summary"].format(summary))
         self.logger.log_info(LOG_MESSAGES["time_elapsed"].format(format_execution_time(execution_time)))
+        if self.text_memory['before'] > 0:
+            self.logger.log_info(LOG_MESSAGES["text_memory_saved"].format(
+                format_memory_size(self.text_memory['before']),
+                format_memory_size(self.text_memory['after']),
+                (1 - self.text_memory['after'] / self.text_memory['before']) * 100
+            ))
         self.logger.log_info(LOG_MESSAGES["files_processed"].format(self.files_processed))
         self.logger.log_info(LOG_MESSAGES["outputs_created"].format(self.outputs_created))
         self.logger.log_info(LOG_MESSAGES["errors_count"].format(self.errors_count))
         
+        # Метрики для мониторинга
+        if METRICS_SETTINGS["enabled"]:
+            try:
+                metrics_path = self.metrics.write(self.work_dir, execution_time, self.errors_count, self.outputs_created)
+                self.logger.log_debug(LOG_MESSAGES["metrics_written"].format(metrics_path))
+            except Exception as e:
+                self.logger.log_error(LOG_MESSAGES["metrics_error"].format(str(e)))
+        
         return summary
     
-    def run(self):
-        """Основной метод запуска обработки данных"""
+    def _checkpoint_keys(self):
+        """
+        Ключи контрольных точек этапов
+        
+        Ключ 'load' зависит от входных файлов (имя, размер, время изменения) и настроек
+        CHECKPOINT_KEY_SETTINGS['load'], ключ 'process' - дополнительно от настроек
+        CHECKPOINT_KEY_SETTINGS['process'].
+        
+        Returns:
+            dict: Этап -> ключ
+        """
+        input_files = []
+        for file_config in self.input_files:
+            file_path = self.work_dir / INPUT_FOLDER / f"{file_config['name']}{file_config['extension']}"
+            paths = [file_path] if file_path.exists() else sorted(
+                file_path.parent.glob(f"{file_config['name']}_part*{file_config['extension']}")
+            )
+            input_files.append([(path.name, path.stat().st_size, path.stat().st_mtime_ns) for path in paths])
+        
+        settings = globals()
+        load_key = settings_hash(
+            input_files, self.input_files, {name: settings[name] for name in CHECKPOINT_KEY_SETTINGS['load']}
+        )
+        process_key = settings_hash(load_key, {name: settings[name] for name in CHECKPOINT_KEY_SETTINGS['process']})
+        return {'load': load_key, 'process': process_key}
+    
+    def _start_stage(self, store, keys, from_stage):
+        """
+        Этап, с которого начинается обработка
+        
+        Явно заданный этап используется, если есть контрольные точки всех предыдущих
+        этапов; иначе - последний этап, для которого они есть.
+        """
+        if from_stage is not None:
+            stage_index = PIPELINE_STAGES.index(from_stage)
+            previous_stage = PIPELINE_STAGES[stage_index - 1] if stage_index > 0 else None
+            if previous_stage is None or store.exists(previous_stage, keys[previous_stage]):
+                return from_stage
+            self.logger.log_info(LOG_MESSAGES["checkpoint_missing"].format(previous_stage))
+        
+        if store.exists('process', keys['process']):
+            return 'save'
+        if store.exists('load', keys['load']):
+            return 'process'
+        return 'load'
+    
+    def _save_checkpoint(self, store, stage, key, frames):
+        """Сохранение контрольной точки этапа (ошибка не прерывает обработку)"""
+        try:
+            checkpoint_dir = store.save(stage, key, frames)
+            store.prune(stage, CHECKPOINT_SETTINGS["keep"])
+            self.logger.log_info(LOG_MESSAGES["checkpoint_saved"].format(stage, checkpoint_dir.name))
+        except Exception as e:
+            self.logger.log_error(LOG_MESSAGES["checkpoint_error"].format(stage, str(e)))
+            self.logger.log_debug(LOG_MESSAGES["details_error"].format(traceback.format_exc()))
+    
+    def run(self, from_stage=None):
+        """
+        Основной метод запуска обработки данных
+        
+        Args:
+            from_stage (str): Этап, с которого начать ('load', 'process', 'save'),
+                None - CHECKPOINT_SETTINGS['from_stage'] или автоматически по контрольным точкам
+        """
         self.start_time = time.time()
         
         try:
-            # Загружаем данные
-            dataframes = self.load_excel_files()
+            if PLANNER_SETTINGS["enabled"]:
+                self.plan_run()
             
-            # Обрабатываем данные
-            processed_data = self.process_data(dataframes)
+            store = None
+            start_stage = 'load'
+            if CHECKPOINT_SETTINGS["enabled"]:
+                store = StageCheckpointStore(self.work_dir / CHECKPOINT_SETTINGS["folder"], CHECKPOINT_SETTINGS["format"])
+                keys = self._checkpoint_keys()
+                start_stage = self._start_stage(store, keys, from_stage or CHECKPOINT_SETTINGS["from_stage"])
+                self.logger.log_info(LOG_MESSAGES["pipeline_start_stage"].format(start_stage))
+            
+            if start_stage == 'save':
+                # Результат расчета из контрольной точки - только сохранение
+                processed_data = store.load('process', keys['process'])[0]['data']
+                self.metrics.rows_output = len(processed_data)
+                self.metrics.unique_tn = int(processed_data['ТН 10'].nunique())
+                self.logger.log_info(LOG_MESSAGES["checkpoint_loaded"].format(
+                    'process', store.path('process', keys['process']).name, keys['process']
+                ))
+            else:
+                if start_stage == 'process':
+                    dataframes = store.load('load', keys['load'])
+                    self.logger.log_info(LOG_MESSAGES["checkpoint_loaded"].format(
+                        'load', store.path('load', keys['load']).name, keys['load']
+                    ))
+                else:
+                    # Загружаем данные
+                    dataframes = self.load_excel_files()
+                    if store is not None and len(dataframes) == len(self.input_files):
+                        self._save_checkpoint(store, 'load', keys['load'], dataframes)
+                
+                # Проверяем входные данные
+                if VALIDATION_SETTINGS["enabled"]:
+                    _, passed = self.validate_inputs(dataframes)
+                    if not passed:
+                        return
+                
+                # Обрабатываем данные
+                processed_data = self.process_data(dataframes)
+                if store is not None and not processed_data.empty:
+                    self._save_checkpoint(store, 'process', keys['process'], [{'name': 'result', 'data': processed_data}])
             
             # Сохраняем результаты
             self.save_outputs(processed_data)
@@ -1555,14 +5192,314 @@ class DataProcessor:
             # Генерируем сводку
             self.generate_summary()
 
+# =============================================================================
+# СРАВНЕНИЕ РЕЗУЛЬТАТОВ
+# =============================================================================
+
+def result_name_pattern(output_config):
+    """
+    Шаблон имени (без расширения) основного выходного файла: имя, ключ пары
+    пакетного режима (необязателен) и временная метка по 'suffix_format'
+    
+    Части Excel (_001, ...), сводная книга (_summary) и манифест частей под шаблон не подходят.
+    """
+    timestamp = re.escape(output_config['suffix_format'])
+    for token, digits in (('YYYY', 4), ('MM', 2), ('DD', 2), ('HH', 2), ('SS', 2)):
+        timestamp = timestamp.replace(token, rf"\d{{{digits}}}")
+    return re.compile(rf"{re.escape(output_config['name'])}(?:_.+)?{timestamp}")
+
+def find_result_sources(output_dir):
+    """
+    Два последних результата в папке OUTPUT самого быстрого для чтения формата
+    
+    Порядок форматов: папка снимка (SNAPSHOT_SETTINGS) -> .parquet -> .csv -> .xlsx;
+    берется первый формат, для которого есть хотя бы два результата. Результат,
+    записанный частями (EXCEL_SHARDING), представлен своим manifest.json.
+    
+    Args:
+        output_dir (Path): Папка OUTPUT
+        
+    Returns:
+        tuple: (предыдущий, текущий) по времени изменения или None
+    """
+    output_dir = Path(output_dir)
+    candidates = [[
+        path for path in output_dir.glob(f"{SNAPSHOT_SETTINGS['name']}*")
+        if (path / SNAPSHOT_SETTINGS["manifest_name"]).exists()
+    ]]
+    for extension in ('.parquet', '.csv', '.xlsx'):
+        paths = []
+        for output_config in OUTPUT_FILES:
+            pattern = result_name_pattern(output_config)
+            paths += [
+                path for path in output_dir.glob(f"{output_config['name']}*{extension}")
+                if pattern.fullmatch(path.stem) and not path.with_name(f"{path.stem}_manifest.json").exists()
+            ]
+            if extension == '.xlsx':
+                paths += [
+                    path for path in output_dir.glob(f"{output_config['name']}*_manifest.json")
+                    if pattern.fullmatch(path.stem[:-len('_manifest')])
+                ]
+        candidates.append(paths)
+    
+    for paths in candidates:
+        if len(set(paths)) >= 2:
+            paths = sorted(set(paths), key=lambda path: path.stat().st_mtime)
+            return paths[-2], paths[-1]
+    return None
+
+def read_result_source(path):
+    """
+    Чтение результата: папка снимка (numpy.memmap), .parquet, .csv или .xlsx (calamine, если установлен)
+    
+    Для результата, записанного частями, передается его manifest.json: листы частей
+    читаются и объединяются в порядке манифеста.
+    
+    Args:
+        path (Path): Файл результата, манифест частей Excel или папка снимка
+        
+    Returns:
+        pd.DataFrame: Результат
+    """
+    path = Path(path)
+    if path.is_dir():
+        return ResultSnapshotReader(path).to_dataframe()
+    if path.suffix.lower() == '.json':
+        with open(path, 'r', encoding='utf-8') as manifest_file:
+            manifest = json.load(manifest_file)
+        return pd.concat([
+            pd.read_excel(path.with_name(part['file']), sheet_name=part['sheet'], engine=EXCEL_READ_ENGINE, dtype={'ТН 10': str})
+            for part in manifest if part['sheet'] is not None
+        ], ignore_index=True)
+    if path.suffix.lower() == '.xlsx':
+        # Первый лист - результат (остальные - сводные листы)
+        return pd.read_excel(path, engine=EXCEL_READ_ENGINE, dtype={'ТН 10': str})
+    return read_table_file(path)
+
+def diff_results(previous, current, tolerance=0.005, column_tolerances=None, detail_columns=None, max_detail_rows=None):
+    """
+    Сравнение двух результатов по ТН 10 векторными операциями над колонками
+    
+    Строки сопоставляются один раз по целочисленному ключу ТН (хэш-индекс),
+    затем каждая общая колонка сравнивается целиком: числовые - с допуском,
+    текстовые - на равенство (пустые значения с обеих сторон равны).
+    
+    Args:
+        previous (pd.DataFrame): Предыдущий результат
+        current (pd.DataFrame): Текущий результат
+        tolerance (float): Допуск числовых колонок
+        column_tolerances (dict): Допуски отдельных колонок
+        detail_columns (list): Колонки для построчного листа изменений (None - все общие)
+        max_detail_rows (int): Ограничение строк листа изменений
+        
+    Returns:
+        dict: Имя листа -> DataFrame ('Итог', 'По колонкам', 'Переходы КОД', 'Добавлены', 'Удалены', 'Изменения')
+    """
+    column_tolerances = column_tolerances or {}
+    # Первое вхождение ТН (в результате ТН уникальны)
+    previous_keys = parse_tn_keys(previous['ТН 10'])
+    current_keys = parse_tn_keys(current['ТН 10'])
+    previous_first = ~pd.Series(previous_keys).duplicated().to_numpy()
+    previous_index = pd.Index(previous_keys[previous_first])
+    positions = previous_index.get_indexer(current_keys)
+    matched = positions >= 0
+    current_positions = np.flatnonzero(matched)
+    previous_positions = np.flatnonzero(previous_first)[positions[matched]]
+    removed = previous_first.copy()
+    removed[previous_positions] = False
+    
+    identity_columns = ['ТН 10', 'ТБ', 'ГОСБ', 'ФИО', 'КОД вывода']
+    added_df = current.loc[~matched, [column for column in identity_columns if column in current.columns]]
+    removed_df = previous.loc[removed, [column for column in identity_columns if column in previous.columns]]
+    
+    # Поколоночное сравнение общих КМ
+    tn_values = format_tn_keys(current_keys[current_positions])
+    columns = [column for column in current.columns if column in previous.columns and column != 'ТН 10']
+    detail_columns = columns if detail_columns is None else [column for column in detail_columns if column in columns]
+    changed_any = np.zeros(len(current_positions), dtype=bool)
+    column_rows, detail_frames = [], []
+    
+    for column in columns:
+        numeric = pd.api.types.is_numeric_dtype(previous[column]) or pd.api.types.is_numeric_dtype(current[column])
+        if numeric:
+            before = pd.to_numeric(previous[column], errors='coerce').to_numpy(dtype=np.float64)[previous_positions]
+            after = pd.to_numeric(current[column], errors='coerce').to_numpy(dtype=np.float64)[current_positions]
+            delta = np.abs(after - before)
+            changed = ~(np.isnan(before) & np.isnan(after)) & ~(delta <= column_tolerances.get(column, tolerance))
+            finite_delta = delta[changed & np.isfinite(delta)]
+            max_change = float(finite_delta.max()) if len(finite_delta) else None
+        else:
+            before = previous[column].to_numpy(dtype=object)[previous_positions]
+            after = current[column].to_numpy(dtype=object)[current_positions]
+            changed = (before != after) & ~(pd.isna(before) & pd.isna(after))
+            max_change = None
+        
+        changed_any |= changed
+        column_rows.append({
+            'колонка': column,
+            'тип': 'число' if numeric else 'текст',
+            'изменено КМ': int(changed.sum()),
+            'макс. изменение': max_change
+        })
+        if column in detail_columns and changed.any():
+            changed_positions = np.flatnonzero(changed)
+            detail_frames.append(pd.DataFrame({
+                'ТН 10': tn_values[changed_positions],
+                'колонка': column,
+                'было': before[changed_positions],
+                'стало': after[changed_positions]
+            }))
+    
+    details = pd.concat(detail_frames, ignore_index=True) if detail_frames else pd.DataFrame(columns=['ТН 10', 'колонка', 'было', 'стало'])
+    truncated = max_detail_rows is not None and len(details) > max_detail_rows
+    if truncated:
+        details = details.iloc[:max_detail_rows]
+    
+    # Переходы КОД вывода: одна гистограмма троек (ТБ, было, стало)
+    transitions = pd.DataFrame()
+    kod_changed = 0
+    if 'КОД вывода' in columns:
+        kod_count = len(KOD_VYVOD_TEXTS)
+        kod_before = np.clip(pd.to_numeric(previous['КОД вывода'], errors='coerce').fillna(0).to_numpy(dtype=np.int64)[previous_positions], 0, kod_count - 1)
+        kod_after = np.clip(pd.to_numeric(current['КОД вывода'], errors='coerce').fillna(0).to_numpy(dtype=np.int64)[current_positions], 0, kod_count - 1)
+        kod_changed = int((kod_before != kod_after).sum())
+        tb_codes, tb_names = factorize_with_missing(
+            current['ТБ'].to_numpy(dtype=object)[current_positions], sort=True, missing_label=MISSING_GROUP_LABEL
+        )
+        counts = np.bincount(
+            (tb_codes * kod_count + kod_before) * kod_count + kod_after, minlength=len(tb_names) * kod_count * kod_count
+        ).reshape(len(tb_names), kod_count, kod_count)
+        
+        kod_values = sorted(KOD_VYVOD_TEXTS, reverse=True)
+        rows = []
+        for tb_name, matrix in [('Все ТБ', counts.sum(axis=0))] + list(zip(tb_names, counts)):
+            for kod in kod_values:
+                if matrix[kod].sum() == 0:
+                    continue
+                row = {'ТБ': tb_name, 'КОД было': kod}
+                row.update({f"стало {target}": int(matrix[kod, target]) for target in kod_values})
+                row['всего'] = int(matrix[kod].sum())
+                row['изменился'] = int(matrix[kod].sum() - matrix[kod, kod])
+                rows.append(row)
+        transitions = pd.DataFrame(rows)
+    
+    summary = pd.DataFrame([
+        ('КМ в предыдущем', len(previous)),
+        ('КМ в текущем', len(current)),
+        ('общие КМ', len(current_positions)),
+        ('добавлены', len(added_df)),
+        ('удалены', len(removed_df)),
+        ('изменился КОД вывода', kod_changed),
+        ('КМ с изменениями', int(changed_any.sum())),
+        ('лист "Изменения" обрезан', 'да' if truncated else 'нет')
+    ], columns=['показатель', 'значение'])
+    
+    return {
+        'Итог': summary,
+        'По колонкам': pd.DataFrame(column_rows, columns=['колонка', 'тип', 'изменено КМ', 'макс. изменение']),
+        'Переходы КОД': transitions,
+        'Добавлены': added_df.reset_index(drop=True),
+        'Удалены': removed_df.reset_index(drop=True),
+        'Изменения': details
+    }
+
+# =============================================================================
+# РАСЧЕТ В ПАМЯТИ (БИБЛИОТЕЧНЫЙ API)
+# =============================================================================
+
+# Колонки входных данных, нужные для расчета
+API_REQUIRED_COLUMNS = {
+    'df1': ['ТН 10', 'ТБ', 'ГОСБ', 'КМ', '2025, тыс. руб.', '2024, тыс. руб. на конец месяца', 'Эффективный КМ'],
+    'df2': ['ТН 10', 'ТБ', 'ГОСБ', 'КМ', 'Эффективный КМ']
+}
+
+def compute_effectiveness(df1, df2, logger=None, validate=False):
+    """
+    Расчет результата по двум DataFrame в памяти - без чтения и записи файлов
+    
+    Каждый вызов создает собственный DataProcessor без рабочей папки. Входные
+    DataFrame не изменяются, общие объекты модуля (BANK_HIERARCHY,
+    HIERARCHY_STATS_ENGINE, настройки) только читаются, поэтому функцию можно
+    вызывать одновременно из нескольких потоков.
+    
+    Args:
+        df1 (pd.DataFrame): Данные файла 1 (ТН 10, ТБ, ГОСБ, КМ, ОД за 2025 и 2024, Эффективный КМ)
+        df2 (pd.DataFrame): Данные файла 2 (ТН 10, ТБ, ГОСБ, КМ, Эффективный КМ)
+        logger: Логгер с интерфейсом DataProcessorLogger (None - без логирования)
+        validate (bool): Проверить входные данные по VALIDATION_SETTINGS до расчета
+        
+    Returns:
+        pd.DataFrame: Результат (колонки и порядок - как в выходном файле)
+        
+    Raises:
+        ValueError: Нет нужных колонок или данные не прошли проверку
+    """
+    for label, df in (('df1', df1), ('df2', df2)):
+        missing = [column for column in API_REQUIRED_COLUMNS[label] if column not in df.columns]
+        if missing:
+            raise ValueError(LOG_MESSAGES["api_missing_columns"].format(label, ', '.join(missing)))
+    
+    processor = DataProcessor(None, logger or NullLogger())
+    processor.raise_errors = True
+    dataframes = [
+        {'name': file_config['name'], 'data': df}
+        for file_config, df in zip(processor.input_files, (df1, df2))
+    ]
+    
+    if validate:
+        report, passed = processor.validate_inputs(dataframes)
+        if not passed:
+            issues = report[report['строк'] > 0]
+            raise ValueError(LOG_MESSAGES["api_validation_failed"].format(
+                '; '.join(f"{row['проверка']} (файл {row['файл']}): {row['строк']}" for _, row in issues.iterrows())
+            ))
+    
+    return processor.process_data(dataframes)
+
 # =============================================================================
 # ГЛАВНАЯ ФУНКЦИЯ
 # =============================================================================
 
+def parse_arguments(argv=None):
+    """
+    Аргументы командной строки
+    
+    Returns:
+        argparse.Namespace: from_stage - этап, с которого начать обработку,
+            plan - явно заданные пункты плана выполнения {ключ: значение}
+    """
+    def plan_item(text):
+        key, separator, value = text.partition('=')
+        if not separator:
+            raise argparse.ArgumentTypeError("ожидается ключ=значение")
+        try:
+            return key, parse_plan_value(key, value)
+        except ValueError as e:
+            raise argparse.ArgumentTypeError(str(e))
+    
+    parser = argparse.ArgumentParser(description="Анализ эффективности КМ")
+    parser.add_argument(
+        "--from-stage", choices=PIPELINE_STAGES, default=None,
+        help="Начать обработку с этапа (предыдущие этапы берутся из контрольных точек)"
+    )
+    parser.add_argument(
+        "--plan", type=plan_item, action="append", default=[], metavar="КЛЮЧ=ЗНАЧЕНИЕ",
+        help=f"Задать пункт плана выполнения явно ({', '.join(PLAN_KEYS)}), например --plan workers=2"
+    )
+    arguments = parser.parse_args(argv)
+    arguments.plan = dict(arguments.plan)
+    return arguments
+
 def main():
     """Главная функция программы"""
     
     try:
+        arguments = parse_arguments()
+        if arguments.from_stage is not None:
+            # Запуск с этапа возможен только по контрольным точкам
+            CHECKPOINT_SETTINGS["enabled"] = True
+        PLANNER_SETTINGS["override"].update(arguments.plan)
+        
         # Создаем логгер
         logger = DataProcessorLogger(
             log_dir=Path(WORK_DIR) / LOGS_FOLDER,
@@ -1582,11 +5519,39 @@ def main():
             generator.create_sample_data()
             print(LOG_MESSAGES["test_data_success"])
             
+        elif PROGRAM_MODE == 'batch':
+            # Режим пакетной обработки пар входных файлов
+            logger.log_info(LOG_MESSAGES["mode_batch"])
+            processor = DataProcessor(WORK_DIR, logger)
+            processor.run_batch()
+            print(LOG_MESSAGES["process_success"])
+            
+        elif PROGRAM_MODE == 'scenarios':
+            # Режим сценариев порогов КОД вывода
+            logger.log_info(LOG_MESSAGES["mode_scenarios"])
+            processor = DataProcessor(WORK_DIR, logger)
+            processor.run_scenarios()
+            print(LOG_MESSAGES["process_success"])
+            
+        elif PROGRAM_MODE == 'diff':
+            # Режим сравнения двух результатов
+            logger.log_info(LOG_MESSAGES["mode_diff"])
+            processor = DataProcessor(WORK_DIR, logger)
+            processor.run_diff()
+            print(LOG_MESSAGES["process_success"])
+            
+        elif PROGRAM_MODE == 'panel':
+            # Режим обработки истории выгрузок
+            logger.log_info(LOG_MESSAGES["mode_panel"])
+            processor = DataProcessor(WORK_DIR, logger)
+            processor.run_panel()
+            print(LOG_MESSAGES["process_success"])
+            
         else:
             # Режим обработки данных (по умолчанию)
             logger.log_info(LOG_MESSAGES["mode_process"])
             processor = DataProcessor(WORK_DIR, logger)
-            processor.run()
+            processor.run(from_stage=arguments.from_stage)
             print(LOG_MESSAGES["process_success"])
         
         # Логируем завершение работы
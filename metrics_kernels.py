@@ -0,0 +1,490 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Векторные функции расчета показателей КМ (темп, прирост, вып условий, ЭФ.КМ, КОД вывода)
+
+Функции принимают массивы (numpy / pandas) и считают показатели для всех
+строк сразу через np.where / np.divide с масками. Используются генератором
+тестовых данных и процессором. Скалярные эталоны (_reference_*) повторяют
+исходную построчную логику; запуск модуля сверяет с ними векторные функции.
+
+Ядро статистик групп (fused_segment_stats) за один проход по каждой группе
+считает ранг ОД, процентили ОД и места по темпу; при установленном numba
+оно компилируется JIT, иначе используется та же функция на Python.
+"""
+
+import numpy as np
+
+# JIT-компиляция ядра статистик групп - только при установленном numba
+try:
+    import numba
+    prange = numba.prange
+except ImportError:
+    numba = None
+    prange = range
+
+# Значение статуса эффективного КМ во входных файлах
+EFFECTIVE_MARK = "👍"
+
+# Пороги КОД вывода (доля группы по месту по темпу):
+# 'country_top' - код 6, 'country' - код 5, 'tb' - коды 4/3, 'gosb' - коды 2/1
+KOD_THRESHOLDS = {"country_top": 0.1, "country": 0.25, "tb": 0.25, "gosb": 0.25}
+
+# Число элементов (сценарии x строки) в одном блоке расчета сетки порогов
+GRID_BLOCK_ELEMENTS = 1 << 22
+
+def growth(od_current, od_previous):
+    """
+    Прирост ОД
+    
+    Args:
+        od_current (array-like): Текущий ОД
+        od_previous (array-like): Прошлый ОД
+    
+    Returns:
+        np.ndarray: od_current - od_previous
+    """
+    return np.asarray(od_current) - np.asarray(od_previous)
+
+def tempo(od_current, od_previous, decimals=2):
+    """
+    Темп ОД, %
+    
+    При od_previous == 0 темп равен 100 / -100 / 0 по знаку текущего ОД,
+    иначе (od_current - od_previous) / |od_previous| * 100.
+    
+    Args:
+        od_current (array-like): Текущий ОД
+        od_previous (array-like): Прошлый ОД
+        decimals (int): Знаков после запятой
+    
+    Returns:
+        np.ndarray: Темп (float64)
+    """
+    od_current = np.asarray(od_current, dtype=np.float64)
+    od_previous = np.asarray(od_previous, dtype=np.float64)
+    zero_previous = od_previous == 0
+    
+    result = np.divide(
+        od_current - od_previous, np.abs(od_previous),
+        out=np.zeros_like(od_current), where=~zero_previous
+    ) * 100
+    result = np.where(zero_previous, np.sign(od_current) * 100, result)
+    return np.round(result, decimals)
+
+def growth_percent(income_current, income_base, decimals=2):
+    """
+    Прирост, % для тестовых данных (0, если базовый доход не положителен)
+    
+    Args:
+        income_current (array-like): Доход на конец периода
+        income_base (array-like): Базовый доход
+        decimals (int): Знаков после запятой
+    
+    Returns:
+        np.ndarray: Прирост в процентах (float64)
+    """
+    income_current = np.asarray(income_current, dtype=np.float64)
+    income_base = np.asarray(income_base, dtype=np.float64)
+    positive_base = income_base > 0
+    
+    result = np.divide(
+        income_current - income_base, income_base,
+        out=np.zeros_like(income_current), where=positive_base
+    ) * 100
+    return np.round(result, decimals)
+
+def conditions_met(od_current, od_previous):
+    """
+    Выполнение условий: 1 при положительном приросте ОД, иначе 0
+    
+    Returns:
+        np.ndarray: int64
+    """
+    return (growth(od_current, od_previous) > 0).astype(np.int64)
+
+def effectiveness_flag(marks):
+    """
+    Числовой признак эффективности: 1 для 👍, иначе 0
+    
+    Args:
+        marks (array-like): Статусы "Эффективный КМ"
+    
+    Returns:
+        np.ndarray: int64
+    """
+    return (np.asarray(marks, dtype=object) == EFFECTIVE_MARK).astype(np.int64)
+
+def kod_vyvoda(country_place, tb_place, gosb_place, effective, growth_values, country_size, tb_size, gosb_size,
+               effective_places=None, thresholds=None):
+    """
+    КОД вывода по местам КМ по темпу (логика листа 't' Excel файла)
+    
+    - 6: топ-10% страны, 5: топ-25% страны
+    - 4 / 3: топ-25% ТБ (эффективный / любой)
+    - 2 / 1: топ-25% ГОСБ при положительном приросте (эффективный / любой)
+    - 0: обычный результат
+    
+    Место NaN не попадает ни в одно условие (как и в построчной логике).
+    
+    Args:
+        country_place, tb_place, gosb_place (array-like): Места по темпу в стране, ТБ, ГОСБ
+        effective (array-like): ЭФ.КМ (1 - эффективный)
+        growth_values (array-like): Прирост ОД
+        country_size, tb_size, gosb_size (array-like): Число КМ в стране, ТБ, ГОСБ строки
+        effective_places (tuple): (место в ТБ, место в ГОСБ, КМ в ТБ, КМ в ГОСБ) среди эффективных;
+            если задано, коды 4 и 2 считаются по ним, иначе - по местам среди всех КМ
+        thresholds (dict): Пороги (см. KOD_THRESHOLDS), None - пороги по умолчанию
+    
+    Returns:
+        np.ndarray: Коды 0..6 (int64)
+    """
+    return kod_vyvoda_grid(
+        country_place, tb_place, gosb_place, effective, growth_values, country_size, tb_size, gosb_size,
+        [thresholds or KOD_THRESHOLDS], effective_places
+    )[0].astype(np.int64)
+
+def kod_vyvoda_grid(country_place, tb_place, gosb_place, effective, growth_values, country_size, tb_size, gosb_size,
+                    scenarios, effective_places=None):
+    """
+    КОД вывода для сетки наборов порогов за один проход по местам и размерам групп
+    
+    Условия всех сценариев считаются одной матричной операцией (сценарии x строки)
+    блоками по GRID_BLOCK_ELEMENTS элементов. Коды присваиваются от младшего
+    к старшему, поэтому старший выполненный код перекрывает младшие
+    (тот же результат, что и цепочка условий построчной логики).
+    
+    Args:
+        country_place ... gosb_size: Как в kod_vyvoda
+        scenarios (list): Наборы порогов; недостающие ключи берутся из KOD_THRESHOLDS
+        effective_places (tuple): Как в kod_vyvoda
+    
+    Returns:
+        np.ndarray: Коды 0..6 (int8), форма (сценарии, строки)
+    """
+    columns = {
+        'country_place': country_place, 'tb_place': tb_place, 'gosb_place': gosb_place,
+        'country_size': country_size, 'tb_size': tb_size, 'gosb_size': gosb_size
+    }
+    if effective_places is None:
+        effective_places = (tb_place, gosb_place, tb_size, gosb_size)
+    columns.update(zip(('tb_place_effective', 'gosb_place_effective', 'tb_size_effective', 'gosb_size_effective'),
+                       effective_places))
+    columns = {name: np.asarray(values, dtype=np.float64).reshape(-1) for name, values in columns.items()}
+    rows = len(columns['country_place'])
+    for name, values in columns.items():
+        if values.shape[0] == 1 and rows != 1:
+            columns[name] = np.broadcast_to(values, rows)
+    is_effective = np.asarray(effective).reshape(-1) == 1
+    positive_growth = np.asarray(growth_values).reshape(-1) > 0
+    
+    limits = {
+        key: np.array([scenario.get(key, KOD_THRESHOLDS[key]) for scenario in scenarios], dtype=np.float64)[:, None]
+        for key in KOD_THRESHOLDS
+    }
+    codes = np.zeros((len(scenarios), rows), dtype=np.int8)
+    block_rows = max(1, GRID_BLOCK_ELEMENTS // max(len(scenarios), 1))
+    
+    for start in range(0, rows, block_rows):
+        block = slice(start, start + block_rows)
+        values = {name: column[block][None, :] for name, column in columns.items()}
+        effective_block = is_effective[block][None, :]
+        positive_block = positive_growth[block][None, :]
+        block_codes = codes[:, block]
+        
+        def top(place, size, key):
+            return values[place] <= limits[key] * values[size]
+        
+        block_codes[positive_block & top('gosb_place', 'gosb_size', 'gosb')] = 1
+        block_codes[effective_block & positive_block & top('gosb_place_effective', 'gosb_size_effective', 'gosb')] = 2
+        block_codes[top('tb_place', 'tb_size', 'tb')] = 3
+        block_codes[effective_block & top('tb_place_effective', 'tb_size_effective', 'tb')] = 4
+        block_codes[top('country_place', 'country_size', 'country')] = 5
+        block_codes[top('country_place', 'country_size', 'country_top')] = 6
+    
+    return codes
+
+# =============================================================================
+# ЯДРО СТАТИСТИК ГРУПП (ОДИН ПРОХОД ПО ГРУППЕ)
+# =============================================================================
+
+def _segment_stats_loop(offsets, od_values, rank_keys, quantiles, od_rank_out, rank_out, quantiles_out):
+    """
+    Статистики непрерывных групп: ранг ОД, квантили ОД и min-ранги по ключам
+    
+    Группа читается один раз: ОД сортируется внутри группы, и ранг и квантили
+    берутся из одного отсортированного массива; ключи мест сортируются так же.
+    Результаты пишутся в выходные массивы без промежуточных массивов на всю таблицу.
+    
+    Args:
+        offsets (np.ndarray): Начала групп + число строк в конце (int64)
+        od_values (np.ndarray): ОД (float64)
+        rank_keys (np.ndarray): Ключи мест [ключи x строки], +inf - место не присваивается
+        quantiles (np.ndarray): Квантили в долях
+        od_rank_out (np.ndarray): Ранг ОД, % (пустой массив - не считать)
+        rank_out (np.ndarray): Места [ключи x строки]
+        quantiles_out (np.ndarray): Квантили [группы x квантили]
+    """
+    for segment in prange(len(offsets) - 1):
+        start = offsets[segment]
+        size = offsets[segment + 1] - start
+        
+        if od_rank_out.shape[0] > 0 or quantiles.shape[0] > 0:
+            segment_od = od_values[start:start + size]
+            od_order = np.argsort(segment_od, kind='mergesort')
+            sorted_od = segment_od[od_order]
+            if od_rank_out.shape[0] > 0:
+                # Число КМ группы со строго меньшим ОД = начало серии равных значений
+                run_start = 0
+                for i in range(size):
+                    if i > 0 and sorted_od[i] != sorted_od[i - 1]:
+                        run_start = i
+                    od_rank_out[start + od_order[i]] = run_start / size * 100
+            for j in range(quantiles.shape[0]):
+                # Линейная интерполяция, как pandas.quantile
+                position = (size - 1) * quantiles[j]
+                lower = int(np.floor(position))
+                upper = min(lower + 1, size - 1)
+                fraction = position - lower
+                quantiles_out[segment, j] = sorted_od[lower] + (sorted_od[upper] - sorted_od[lower]) * fraction
+        
+        for k in range(rank_keys.shape[0]):
+            segment_keys = rank_keys[k, start:start + size]
+            key_order = np.argsort(segment_keys, kind='mergesort')
+            run_start = 0
+            for i in range(size):
+                key = segment_keys[key_order[i]]
+                if i > 0 and key != segment_keys[key_order[i - 1]]:
+                    run_start = i
+                rank_out[k, start + key_order[i]] = np.nan if np.isinf(key) else float(run_start + 1)
+
+if numba is not None:
+    _segment_stats_kernel = numba.njit(parallel=True, cache=True)(_segment_stats_loop)
+else:
+    _segment_stats_kernel = _segment_stats_loop
+
+# True - ядро скомпилировано numba (без numba ядро работает как обычная функция Python)
+FUSED_KERNEL_JIT = numba is not None
+
+def fused_segment_stats(starts, od_values, rank_keys, quantiles, with_od_rank=True):
+    """
+    Ранг ОД, квантили ОД и места по ключам для всех групп уровня за один проход
+    
+    Строки должны быть упорядочены так, что группы уровня непрерывны
+    (см. main.SortedPartitionLayout); порядок внутри группы не важен.
+    
+    Args:
+        starts (np.ndarray): Начала групп
+        od_values (np.ndarray): ОД в порядке строк
+        rank_keys (array-like): Ключи мест [ключи x строки] по возрастанию (min-ранг),
+            +inf - место не присваивается (NaN)
+        quantiles (list): Квантили в долях (0.25, 0.5, ...)
+        with_od_rank (bool): Считать ранг ОД (доля КМ группы со строго меньшим ОД, %)
+    
+    Returns:
+        tuple: (ранг ОД или None, квантили [группы x квантили], места [ключи x строки])
+    """
+    return _run_segment_stats(_segment_stats_kernel, starts, od_values, rank_keys, quantiles, with_od_rank)
+
+def _run_segment_stats(kernel, starts, od_values, rank_keys, quantiles, with_od_rank):
+    """Подготовка массивов и запуск ядра статистик групп (JIT или Python)"""
+    od_values = np.ascontiguousarray(od_values, dtype=np.float64)
+    rows = len(od_values)
+    offsets = np.append(np.asarray(starts, dtype=np.int64), rows)
+    rank_keys = np.ascontiguousarray(np.asarray(rank_keys, dtype=np.float64).reshape(-1, rows))
+    quantiles = np.asarray(quantiles, dtype=np.float64).reshape(-1)
+    
+    od_rank = np.empty(rows if with_od_rank else 0, dtype=np.float64)
+    ranks = np.empty(rank_keys.shape, dtype=np.float64)
+    quantile_values = np.empty((len(offsets) - 1, len(quantiles)), dtype=np.float64)
+    kernel(offsets, od_values, rank_keys, quantiles, od_rank, ranks, quantile_values)
+    return (od_rank if with_od_rank else None), quantile_values, ranks
+
+# =============================================================================
+# СКАЛЯРНЫЕ ЭТАЛОНЫ (исходная построчная логика)
+# =============================================================================
+
+def _reference_tempo(od_current, od_previous):
+    """Темп ОД для одной строки (исходная логика process_data)"""
+    if od_previous == 0:
+        if od_current > 0:
+            temp_od = 100
+        elif od_current < 0:
+            temp_od = -100
+        else:
+            temp_od = 0
+    else:
+        temp_od = (od_current - od_previous) / abs(od_previous) * 100
+    return round(temp_od, 2)
+
+def _reference_growth_percent(income_current, income_base):
+    """Прирост, % для одной строки (исходная логика генератора)"""
+    return round(((income_current - income_base) / income_base * 100) if income_base > 0 else 0, 2)
+
+def _reference_conditions_met(od_current, od_previous):
+    """Выполнение условий для одной строки"""
+    return 1 if (od_current - od_previous) > 0 else 0
+
+def _reference_effectiveness_flag(mark):
+    """Признак эффективности для одной строки"""
+    return 1 if mark == EFFECTIVE_MARK else 0
+
+def _reference_kod_vyvoda(number_strana, number_tb, number_gosb, effectiveness, prir, country_size, tb_size, gosb_size,
+                          effective_places=None, thresholds=None):
+    """КОД вывода для одной строки (исходная логика calculate_kod_vyvoda)"""
+    # Места и численность для кодов 4 и 2: среди эффективных, если заданы
+    number_tb_eff, number_gosb_eff, tb_size_eff, gosb_size_eff = (
+        effective_places if effective_places is not None else (number_tb, number_gosb, tb_size, gosb_size)
+    )
+    limits = dict(KOD_THRESHOLDS, **(thresholds or {}))
+    if number_strana <= limits['country_top'] * country_size:
+        return 6
+    elif number_strana <= limits['country'] * country_size:
+        return 5
+    elif effectiveness == 1 and number_tb_eff <= limits['tb'] * tb_size_eff:
+        return 4
+    elif number_tb <= limits['tb'] * tb_size:
+        return 3
+    elif effectiveness == 1 and prir > 0 and number_gosb_eff <= limits['gosb'] * gosb_size_eff:
+        return 2
+    elif prir > 0 and number_gosb <= limits['gosb'] * gosb_size:
+        return 1
+    else:
+        return 0
+
+def _reference_segment_stats(values, keys, quantiles):
+    """Ранг ОД, квантили и места для одной группы (сравнение со всеми строками группы)"""
+    size = len(values)
+    sorted_values = sorted(values)
+    od_rank = [sum(other < value for other in values) / size * 100 for value in values]
+    quantile_values = []
+    for q in quantiles:
+        position = (size - 1) * q
+        lower = int(position // 1)
+        upper = min(lower + 1, size - 1)
+        quantile_values.append(sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (position - lower))
+    places = [
+        [float('nan') if key == float('inf') else sum(other < key for other in row_keys) + 1 for key in row_keys]
+        for row_keys in keys
+    ]
+    return od_rank, quantile_values, places
+
+def _segment_stats_sample(rng, size):
+    """Случайные группы, ОД и ключи мест (с совпадениями и +inf) для сверки ядра"""
+    starts = np.flatnonzero(np.r_[True, rng.random(size - 1) < 0.02])
+    od_values = rng.integers(-5, 200, size).astype(np.float64)
+    tempo_key = -rng.integers(-100, 100, size).astype(np.float64)
+    masked_key = np.where(rng.random(size) < 0.5, tempo_key, np.inf)
+    return starts, od_values, tempo_key, masked_key, [0.25, 0.5, 0.9]
+
+def _check_fused_segment_stats(rng, size=5000):
+    """Сверка fused_segment_stats с построчным эталоном (количество расхождений)"""
+    starts, od_values, tempo_key, masked_key, quantiles = _segment_stats_sample(rng, size)
+    od_rank, quantile_values, ranks = fused_segment_stats(starts, od_values, [tempo_key, masked_key], quantiles)
+    
+    mismatches = 0
+    for segment, (start, end) in enumerate(zip(starts, np.r_[starts[1:], size])):
+        reference = _reference_segment_stats(
+            od_values[start:end].tolist(), [tempo_key[start:end].tolist(), masked_key[start:end].tolist()], quantiles
+        )
+        actual = (od_rank[start:end], quantile_values[segment], ranks[:, start:end].reshape(-1))
+        for values, expected in zip(actual, (reference[0], reference[1], sum(reference[2], []))):
+            expected = np.asarray(expected, dtype=np.float64)
+            mismatches += int((~((values == expected) | (np.isnan(values) & np.isnan(expected)))).sum())
+    return mismatches
+
+def _check_fused_segment_stats_jit(rng, size=100000):
+    """
+    Сверка скомпилированного numba ядра с тем же ядром на Python (количество
+    несовпадающих значений; результаты должны совпадать побитово)
+    """
+    starts, od_values, tempo_key, masked_key, quantiles = _segment_stats_sample(rng, size)
+    arguments = (starts, od_values, [tempo_key, masked_key], quantiles, True)
+    compiled = _run_segment_stats(_segment_stats_kernel, *arguments)
+    interpreted = _run_segment_stats(_segment_stats_loop, *arguments)
+    return sum(
+        int((~((values == expected) | (np.isnan(values) & np.isnan(expected)))).sum())
+        for values, expected in zip(compiled, interpreted)
+    )
+
+def check_against_reference(size=100000, seed=0):
+    """
+    Сверка векторных функций со скалярными эталонами на случайных данных
+    
+    В данные намеренно добавляются нули, отрицательные значения и совпадения.
+    При установленном numba скомпилированное ядро статистик групп дополнительно
+    сверяется с тем же ядром на Python ('fused_segment_stats_jit').
+    
+    Args:
+        size (int): Количество строк
+        seed (int): Зерно генератора
+    
+    Returns:
+        dict: Имя функции -> количество расхождений
+    """
+    rng = np.random.default_rng(seed)
+    od_current = rng.integers(-1000, 220000000, size)
+    od_previous = rng.integers(-1000, 220000000, size)
+    od_previous[rng.random(size) < 0.05] = 0
+    od_current[rng.random(size) < 0.05] = 0
+    same = rng.random(size) < 0.05
+    od_current[same] = od_previous[same]
+    marks = rng.choice([EFFECTIVE_MARK, "👎", None], size)
+    
+    # Места и размеры групп для КОД вывода (с NaN мест)
+    country_size = np.full(size, size)
+    tb_size = rng.integers(1, 5000, size)
+    gosb_size = rng.integers(1, 300, size)
+    places = [rng.integers(1, group_size + 1).astype(np.float64) for group_size in (country_size, tb_size, gosb_size)]
+    places[0][rng.random(size) < 0.01] = np.nan
+    effective = rng.integers(0, 2, size)
+    growth_values = growth(od_current, od_previous)
+    
+    # Места среди эффективных (у неэффективных - NaN)
+    effective_sizes = [np.maximum(group_size // 2, 1) for group_size in (tb_size, gosb_size)]
+    effective_places = [rng.integers(1, group_size + 1).astype(np.float64) for group_size in effective_sizes]
+    for place in effective_places:
+        place[effective == 0] = np.nan
+    effective_places = tuple(effective_places) + tuple(effective_sizes)
+    
+    checks = {
+        'tempo': (tempo(od_current, od_previous),
+                  [_reference_tempo(c, p) for c, p in zip(od_current.tolist(), od_previous.tolist())]),
+        'growth_percent': (growth_percent(od_current, od_previous),
+                           [_reference_growth_percent(c, p) for c, p in zip(od_current.tolist(), od_previous.tolist())]),
+        'conditions_met': (conditions_met(od_current, od_previous),
+                           [_reference_conditions_met(c, p) for c, p in zip(od_current.tolist(), od_previous.tolist())]),
+        'effectiveness_flag': (effectiveness_flag(marks),
+                               [_reference_effectiveness_flag(m) for m in marks.tolist()]),
+        'kod_vyvoda': (kod_vyvoda(*places, effective, growth_values, country_size, tb_size, gosb_size),
+                       [_reference_kod_vyvoda(*row) for row in zip(*[p.tolist() for p in places], effective.tolist(),
+                                                                   growth_values.tolist(), country_size.tolist(),
+                                                                   tb_size.tolist(), gosb_size.tolist())]),
+        'kod_vyvoda_effective': (kod_vyvoda(*places, effective, growth_values, country_size, tb_size, gosb_size, effective_places),
+                                 [_reference_kod_vyvoda(*row[:8], effective_places=row[8:])
+                                  for row in zip(*[p.tolist() for p in places], effective.tolist(), growth_values.tolist(),
+                                                 country_size.tolist(), tb_size.tolist(), gosb_size.tolist(),
+                                                 *[values.tolist() for values in effective_places])])
+    }
+    
+    # Сетка порогов: каждый сценарий сверяется с построчной логикой
+    scenarios = [{'country_top': 0.05, 'tb': 0.15}, {}, {'country': 0.3, 'tb': 0.3, 'gosb': 0.3}]
+    grid = kod_vyvoda_grid(*places, effective, growth_values, country_size, tb_size, gosb_size, scenarios)
+    rows = list(zip(*[p.tolist() for p in places], effective.tolist(), growth_values.tolist(),
+                    country_size.tolist(), tb_size.tolist(), gosb_size.tolist()))
+    checks['kod_vyvoda_grid'] = (
+        grid.reshape(-1),
+        [_reference_kod_vyvoda(*row, thresholds=scenario) for scenario in scenarios for row in rows]
+    )
+    
+    results = {
+        name: int((vectorized != np.asarray(reference, dtype=np.float64)).sum())
+        for name, (vectorized, reference) in checks.items()
+    }
+    results['fused_segment_stats'] = _check_fused_segment_stats(rng)
+    if FUSED_KERNEL_JIT:
+        results['fused_segment_stats_jit'] = _check_fused_segment_stats_jit(rng)
+    return results
+
+if __name__ == "__main__":
+    print(check_against_reference())
@@ -0,0 +1,27 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import main
+
+
+@pytest.fixture(scope="session")
+def sample_inputs(tmp_path_factory):
+    """Небольшая пара входных файлов тестового генератора: (рабочая папка, INPUT_FILES)"""
+    work_dir = tmp_path_factory.mktemp("work")
+    total_employees = main.DATA_PARAMS["total_employees"]
+    seed = main.GENERATION_SETTINGS["seed"]
+    main.DATA_PARAMS["total_employees"] = 400
+    main.GENERATION_SETTINGS["seed"] = 1
+    try:
+        main.TestDataGenerator(str(work_dir), main.NullLogger()).create_sample_data()
+    finally:
+        main.DATA_PARAMS["total_employees"] = total_employees
+        main.GENERATION_SETTINGS["seed"] = seed
+    
+    files = sorted((work_dir / main.INPUT_FOLDER).iterdir())
+    input_files = [{"name": path.stem, "extension": path.suffix} for path in files]
+    return work_dir, input_files
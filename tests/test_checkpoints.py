@@ -0,0 +1,64 @@
+import shutil
+
+import main
+
+
+def _processor(work_dir, input_files):
+    return main.DataProcessor(str(work_dir), main.NullLogger(), input_files)
+
+
+def test_keys_follow_registry_settings(sample_inputs, monkeypatch):
+    work_dir, input_files = sample_inputs
+    keys = _processor(work_dir, input_files)._checkpoint_keys()
+    
+    monkeypatch.setitem(main.KOD_VYVODA_THRESHOLDS, "country", 0.3)
+    changed = _processor(work_dir, input_files)._checkpoint_keys()
+    assert changed['load'] == keys['load']
+    assert changed['process'] != keys['process']
+    
+    monkeypatch.setitem(main.CSV_SETTINGS, "encoding", "cp1251")
+    assert _processor(work_dir, input_files)._checkpoint_keys()['load'] != keys['load']
+
+
+def test_every_registry_setting_exists():
+    for names in main.CHECKPOINT_KEY_SETTINGS.values():
+        for name in names:
+            assert hasattr(main, name), name
+
+
+def test_settings_change_invalidates_process_checkpoint(sample_inputs, tmp_path, monkeypatch):
+    source_dir, input_files = sample_inputs
+    shutil.copytree(source_dir / main.INPUT_FOLDER, tmp_path / main.INPUT_FOLDER)
+    monkeypatch.setitem(main.CHECKPOINT_SETTINGS, "enabled", True)
+    monkeypatch.setitem(main.CHECKPOINT_SETTINGS, "format", "pickle")
+    monkeypatch.setitem(main.PLANNER_SETTINGS, "enabled", False)
+    
+    processor = _processor(tmp_path, input_files)
+    processor.run()
+    store = main.StageCheckpointStore(tmp_path / main.CHECKPOINT_SETTINGS["folder"], "pickle")
+    keys = processor._checkpoint_keys()
+    assert store.exists('process', keys['process'])
+    assert processor._start_stage(store, keys, None) == 'save'
+    
+    monkeypatch.setitem(main.KOD_VYVODA_THRESHOLDS, "country", 0.3)
+    processor = _processor(tmp_path, input_files)
+    new_keys = processor._checkpoint_keys()
+    assert not store.exists('process', new_keys['process'])
+    assert processor._start_stage(store, new_keys, None) == 'process'
+
+
+def test_resume_from_save_keeps_output_metrics(sample_inputs, tmp_path, monkeypatch):
+    source_dir, input_files = sample_inputs
+    shutil.copytree(source_dir / main.INPUT_FOLDER, tmp_path / main.INPUT_FOLDER)
+    monkeypatch.setitem(main.CHECKPOINT_SETTINGS, "enabled", True)
+    monkeypatch.setitem(main.CHECKPOINT_SETTINGS, "format", "pickle")
+    monkeypatch.setitem(main.PLANNER_SETTINGS, "enabled", False)
+    
+    first = _processor(tmp_path, input_files)
+    first.run()
+    resumed = _processor(tmp_path, input_files)
+    resumed.run()
+    
+    assert first.metrics.rows_output > 0
+    assert resumed.metrics.rows_output == first.metrics.rows_output
+    assert resumed.metrics.unique_tn == first.metrics.unique_tn
@@ -0,0 +1,73 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+import main
+
+
+def _result(rows):
+    return pd.DataFrame(rows, columns=['ТН 10', 'ТБ', 'ГОСБ', 'темп', 'КОД вывода'])
+
+
+def test_diff_results_counts_changes_and_missing_tb():
+    previous = _result([
+        ('0000000001', 'Байкальский банк', 'Бурятское ГОСБ №8601', 1.0, 3),
+        ('0000000002', np.nan, np.nan, 2.0, 0),
+        ('0000000003', 'Байкальский банк', 'Бурятское ГОСБ №8601', 3.0, 1)
+    ])
+    current = _result([
+        ('0000000001', 'Байкальский банк', 'Бурятское ГОСБ №8601', 1.001, 3),
+        ('0000000002', np.nan, np.nan, 2.5, 5),
+        ('0000000004', 'Байкальский банк', 'Бурятское ГОСБ №8601', 4.0, 0)
+    ])
+    
+    tables = main.diff_results(previous, current, tolerance=0.005)
+    summary = dict(zip(tables['Итог']['показатель'], tables['Итог']['значение']))
+    
+    assert summary['общие КМ'] == 2
+    assert summary['добавлены'] == 1
+    assert summary['удалены'] == 1
+    assert summary['изменился КОД вывода'] == 1
+    assert summary['КМ с изменениями'] == 1
+    transitions = tables['Переходы КОД']
+    missing_row = transitions[(transitions['ТБ'] == main.MISSING_GROUP_LABEL) & (transitions['КОД было'] == 0)]
+    assert missing_row['стало 5'].tolist() == [1]
+
+
+def _touch(path, mtime):
+    path.write_bytes(b'')
+    os.utime(path, (mtime, mtime))
+    return path
+
+
+def test_find_result_sources_skips_shards_and_summaries(tmp_path):
+    previous = _touch(tmp_path / 'processed_data_20261018-090000.xlsx', 1000)
+    current = _touch(tmp_path / 'processed_data_20261019-090000.xlsx', 2000)
+    _touch(tmp_path / 'processed_data_20261019-090000_summary.xlsx', 3000)
+    _touch(tmp_path / 'processed_data_20261019-090000_001.xlsx', 3000)
+    _touch(tmp_path / 'processed_diff_20261019-100000.xlsx', 4000)
+    
+    assert main.find_result_sources(tmp_path) == (previous, current)
+
+
+def test_sharded_result_is_read_through_its_manifest(tmp_path):
+    previous = _touch(tmp_path / 'processed_data_20261018-090000.xlsx', 1000)
+    stem = 'processed_data_20261019-090000'
+    parts = [_result([('0000000001', 'Байкальский банк', 'Бурятское ГОСБ №8601', 1.0, 3)]),
+             _result([('0000000002', 'Уральский банк', 'Курганское ГОСБ №8599', 2.0, 5)])]
+    manifest = []
+    for number, part in enumerate(parts, start=1):
+        part.to_excel(tmp_path / f"{stem}_{number:03d}.xlsx", sheet_name=f"Данные_{number:03d}", index=False)
+        manifest.append({'file': f"{stem}_{number:03d}.xlsx", 'sheet': f"Данные_{number:03d}", 'tb': None, 'rows': 1})
+    pd.DataFrame({'ТБ': []}).to_excel(tmp_path / f"{stem}_summary.xlsx", index=False)
+    manifest.append({'file': f"{stem}_summary.xlsx", 'sheet': None, 'tb': None, 'rows': None})
+    manifest_path = tmp_path / f"{stem}_manifest.json"
+    manifest_path.write_text(json.dumps(manifest, ensure_ascii=False), encoding='utf-8')
+    os.utime(manifest_path, (2000, 2000))
+    
+    assert main.find_result_sources(tmp_path) == (previous, manifest_path)
+    result = main.read_result_source(manifest_path)
+    assert result['ТН 10'].tolist() == ['0000000001', '0000000002']
+    assert result['КОД вывода'].tolist() == [3, 5]
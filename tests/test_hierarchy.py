@@ -0,0 +1,65 @@
+import numpy as np
+import pandas as pd
+
+import main
+import metrics_kernels
+
+TB_COLUMNS = ['ранг ОД TB', 'ТБ 25', 'ТБ 50', 'ТБ 75', 'число ТБ']
+GOSB_COLUMNS = ['ГОСБ 25', 'ГОСБ 50', 'ГОСБ 75', 'число подразделение']
+
+
+def _input_frames(sample_inputs):
+    work_dir, input_files = sample_inputs
+    dataframes = main.DataProcessor(str(work_dir), main.NullLogger(), input_files).load_excel_files()
+    return [frame['data'].astype({'ТБ': object, 'ГОСБ': object}) for frame in dataframes]
+
+
+def _frames(rows):
+    """Пара входных DataFrame из строк (ТН, ТБ, ГОСБ, ОД текущий, ОД прошлый)"""
+    df1 = pd.DataFrame(rows, columns=['ТН 10', 'ТБ', 'ГОСБ', '2025, тыс. руб.', '2024, тыс. руб. на конец месяца'])
+    df1['КМ'] = 'Иванов Иван Иванович'
+    df1['Эффективный КМ'] = metrics_kernels.EFFECTIVE_MARK
+    return df1, df1[['ТН 10', 'ТБ', 'ГОСБ', 'КМ', 'Эффективный КМ']].copy()
+
+
+def test_missing_values_get_codes_outside_directory():
+    tb = main.TERRITORIAL_BANKS[0]
+    gosb = main.BANK_STRUCTURE[tb][0]
+    tb_codes = main.BANK_HIERARCHY.encode_tb(pd.Series([tb, np.nan, None]))
+    gosb_codes = main.BANK_HIERARCHY.encode_gosb(pd.Series([gosb, np.nan, gosb]))
+    
+    assert tb_codes[0] == 0
+    assert (tb_codes[1:] >= len(main.BANK_HIERARCHY.tb_names)).all()
+    assert gosb_codes[1] >= len(main.BANK_HIERARCHY.gosb_names)
+    assert main.BANK_HIERARCHY.unknown_mask(tb_codes, gosb_codes).tolist() == [False, True, True]
+
+
+def test_missing_hierarchy_rows_do_not_change_unit_statistics(sample_inputs):
+    df1, df2 = _input_frames(sample_inputs)
+    missing_tn = df1['ТН 10'].iloc[:3].tolist()
+    
+    expected = main.compute_effectiveness(df1[~df1['ТН 10'].isin(missing_tn)], df2[~df2['ТН 10'].isin(missing_tn)])
+    for df in (df1, df2):
+        df.loc[df['ТН 10'].isin(missing_tn), ['ТБ', 'ГОСБ']] = np.nan
+    actual = main.compute_effectiveness(df1, df2)
+    
+    assert actual.loc[actual['ТН 10'].isin(missing_tn), 'ТБ'].isna().all()
+    actual = actual[~actual['ТН 10'].isin(missing_tn)].set_index('ТН 10').loc[expected['ТН 10']]
+    pd.testing.assert_frame_equal(
+        actual[TB_COLUMNS + GOSB_COLUMNS].reset_index(drop=True), expected[TB_COLUMNS + GOSB_COLUMNS]
+    )
+
+
+def test_gosb_under_two_adjacent_tb_forms_two_groups():
+    gosb = main.BANK_STRUCTURE['Байкальский банк'][-1]
+    df1, df2 = _frames([
+        ('TN_0000000001', 'Байкальский банк', gosb, 10, 5),
+        ('TN_0000000002', 'Байкальский банк', gosb, 20, 5),
+        ('TN_0000000003', 'Волго-Вятский банк', gosb, 50, 5),
+        ('TN_0000000004', 'Волго-Вятский банк', gosb, 60, 5)
+    ])
+    
+    result = main.compute_effectiveness(df1, df2).set_index('ТН 10').sort_index()
+    
+    assert result['ГОСБ 50'].tolist() == [15.0, 15.0, 55.0, 55.0]
+    assert result['число подразделение'].tolist() == [2, 1, 2, 1]
@@ -0,0 +1,34 @@
+import numpy as np
+import pandas as pd
+
+import main
+import metrics_kernels
+
+
+def test_vectorized_functions_match_reference():
+    results = metrics_kernels.check_against_reference(size=20000)
+    assert 'fused_segment_stats' in results
+    assert results == {name: 0 for name in results}
+
+
+def test_fused_segment_stats_returns_float_places():
+    od_rank, quantile_values, ranks = metrics_kernels.fused_segment_stats(
+        np.array([0, 3]), [3.0, 1.0, 1.0, 5.0, 2.0], [[2.0, np.inf, 1.0, 1.0, 1.0]], [0.5]
+    )
+    assert ranks.dtype == np.float64
+    np.testing.assert_array_equal(ranks[0], [2.0, np.nan, 1.0, 1.0, 1.0])
+    np.testing.assert_array_equal(od_rank, [2 / 3 * 100, 0.0, 0.0, 50.0, 0.0])
+    np.testing.assert_array_equal(quantile_values[:, 0], [1.0, 3.5])
+
+
+def test_fused_kernel_matches_numpy_path(sample_inputs, monkeypatch):
+    work_dir, input_files = sample_inputs
+    dataframes = main.DataProcessor(str(work_dir), main.NullLogger(), input_files).load_excel_files()
+    df1, df2 = dataframes[0]['data'], dataframes[1]['data']
+    
+    monkeypatch.setitem(main.HIERARCHY_STATS_KERNEL, "fused", False)
+    expected = main.compute_effectiveness(df1, df2)
+    monkeypatch.setitem(main.HIERARCHY_STATS_KERNEL, "fused", True)
+    actual = main.compute_effectiveness(df1, df2)
+    
+    pd.testing.assert_frame_equal(actual, expected)
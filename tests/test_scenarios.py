@@ -0,0 +1,29 @@
+import numpy as np
+
+import main
+
+
+def _processed(sample_inputs):
+    work_dir, input_files = sample_inputs
+    dataframes = main.DataProcessor(str(work_dir), main.NullLogger(), input_files).load_excel_files()
+    df1, df2 = [frame['data'].astype({'ТБ': object, 'ГОСБ': object}) for frame in dataframes]
+    missing_tn = df1['ТН 10'].iloc[:4].tolist()
+    for df in (df1, df2):
+        df.loc[df['ТН 10'].isin(missing_tn[:2]), 'ТБ'] = np.nan
+        df.loc[df['ТН 10'].isin(missing_tn[2:]), 'ГОСБ'] = np.nan
+    return main.compute_effectiveness(df1, df2)
+
+
+def test_current_thresholds_reproduce_kod_vyvoda(sample_inputs):
+    processed = _processed(sample_inputs)
+    processor = main.DataProcessor(None, main.NullLogger())
+    scenarios = main.build_threshold_scenarios({'tb': [0.1, 0.5]})
+    
+    codes = processor.evaluate_kod_scenarios(processed, scenarios)
+    tables = processor.build_scenario_tables(processed, scenarios, codes)
+    
+    assert scenarios[0]['thresholds'] == main.KOD_VYVODA_THRESHOLDS
+    np.testing.assert_array_equal(codes[0], processed['КОД вывода'].to_numpy())
+    assert tables['Сценарии']['изменился КОД'].iloc[0] == 0
+    assert main.MISSING_GROUP_LABEL in set(tables['По ТБ']['ТБ'])
+    assert tables['По ТБ'].groupby('сценарий')['всего'].sum().eq(len(processed)).all()
@@ -0,0 +1,48 @@
+import numpy as np
+import pandas as pd
+
+import main
+
+
+def test_round_trip_keeps_missing_values(tmp_path):
+    df = pd.DataFrame({
+        'ТН 10': ['0000000001', None, '0000000003', 'x'],
+        'ФИО': [np.nan, 'Ан', 'Иванов Иван', 'Б'],
+        'ТБ': ['Байкальский', np.nan, 'Байкальский', 'Уральский'],
+        'ОД': [1.5, np.nan, 3.0, 4.0],
+        'число страна': np.array([1, 2, 3, 4], dtype=np.int64)
+    })
+    manifest = main.write_result_snapshot(df, tmp_path / 'snap', dictionary_columns=['ТБ'])
+    
+    restored = main.ResultSnapshotReader(tmp_path / 'snap').to_dataframe()
+    
+    assert [meta['kind'] for meta in manifest['columns']] == ['fixed_bytes', 'fixed_bytes', 'dictionary', 'numeric', 'numeric']
+    assert restored['ТН 10'].isna().tolist() == [False, True, False, False]
+    assert restored['ФИО'].isna().tolist() == [True, False, False, False]
+    assert restored['ТБ'].isna().tolist() == [False, True, False, False]
+    assert list(restored['ТБ'].cat.categories) == ['Байкальский', 'Уральский']
+    assert restored.astype(object).where(restored.notna(), None).values.tolist() == \
+        df.astype(object).where(df.notna(), None).values.tolist()
+
+
+def test_short_text_column_with_missing_values(tmp_path):
+    df = pd.DataFrame({'код': ['a', None, 'b']})
+    manifest = main.write_result_snapshot(df, tmp_path / 'snap', dictionary_columns=[])
+    
+    reader = main.ResultSnapshotReader(tmp_path / 'snap')
+    
+    assert manifest['columns'][0]['width'] == 1
+    assert reader.masks['код'].tolist() == [True, False, True]
+    assert reader.to_dataframe()['код'].tolist()[::2] == ['a', 'b']
+    assert reader.to_dataframe(decode_text=False)['код'].tolist() == [b'a', b'', b'b']
+
+
+def test_numeric_and_dictionary_columns_are_memory_mapped(tmp_path):
+    df = pd.DataFrame({'ТБ': ['Б', 'А', 'Б'], 'ОД': [1.0, 2.0, 3.0]})
+    main.write_result_snapshot(df, tmp_path / 'snap', dictionary_columns=['ТБ'])
+    
+    reader = main.ResultSnapshotReader(tmp_path / 'snap')
+    restored = reader.to_dataframe()
+    
+    assert np.shares_memory(restored['ТБ'].array.codes, reader.columns['ТБ'])
+    assert np.shares_memory(restored['ОД'].to_numpy(), reader.columns['ОД'])
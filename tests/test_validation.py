@@ -0,0 +1,43 @@
+import numpy as np
+
+import main
+
+
+def _moved_rows(report):
+    rows = report.loc[report['проверка'] == 'ТБ/ГОСБ различаются между файлами', 'строк']
+    return int(rows.sum())
+
+
+def test_missing_hierarchy_in_both_files_is_not_a_move(sample_inputs):
+    work_dir, input_files = sample_inputs
+    processor = main.DataProcessor(None, main.NullLogger(), input_files)
+    dataframes = main.DataProcessor(str(work_dir), main.NullLogger(), input_files).load_excel_files()
+    df1, df2 = dataframes[0]['data'], dataframes[1]['data']
+    assert _moved_rows(processor.validate_inputs(dataframes)[0]) == 0
+    
+    tn = df1['ТН 10'].iloc[0]
+    for df in (df1, df2):
+        df['ГОСБ'] = df['ГОСБ'].astype(object)
+        df.loc[df['ТН 10'] == tn, 'ГОСБ'] = np.nan
+    assert _moved_rows(processor.validate_inputs(dataframes)[0]) == 0
+    
+    df2.loc[df2['ТН 10'] == tn, 'ГОСБ'] = 'другой ГОСБ'
+    assert _moved_rows(processor.validate_inputs(dataframes)[0]) == 1
+
+
+def test_missing_hierarchy_is_reported_as_missing(sample_inputs):
+    work_dir, input_files = sample_inputs
+    processor = main.DataProcessor(None, main.NullLogger(), input_files)
+    dataframes = main.DataProcessor(str(work_dir), main.NullLogger(), input_files).load_excel_files()
+    df1 = dataframes[0]['data']
+    df1['ТБ'] = df1['ТБ'].astype(object)
+    df1['ГОСБ'] = df1['ГОСБ'].astype(object)
+    df1.loc[df1.index[:5], 'ТБ'] = np.nan
+    df1.loc[df1.index[5:10], 'ГОСБ'] = np.nan
+    
+    report = processor.validate_inputs(dataframes)[0].set_index(['проверка', 'файл'])['строк']
+    
+    assert report[('пропущен ТБ/ГОСБ', '1')] == 10
+    assert report[('пропущен ТБ/ГОСБ', '2')] == 0
+    assert report[('неизвестный ТБ/ГОСБ', '1')] == 0
+    assert report[('ГОСБ вне указанного ТБ', '1')] == 0